@@ -71,6 +71,12 @@ def stop_recognition():
     return jsonify({"status": "stopped"})
 
 
+# API: statistiche della pipeline audio (finestre saltate dal gate, ecc.)
+@app.route("/api/recognition_stats", methods=["GET"])
+def recognition_stats():
+    return jsonify(audio_bot.get_pipeline_stats())
+
+
 # API: recupera la lista brani attuale
 @app.route("/api/get_playlist", methods=["GET"])
 def get_playlist():
@@ -0,0 +1,86 @@
+import numpy as np
+
+
+class AudioRingBuffer:
+    """
+    Buffer circolare preallocato per la cattura audio.
+    Il callback scrive i blocchi in place sul cursore di scrittura (nessuna allocazione),
+    la finestra di analisi viene restituita come vista dell'array (al massimo una copia
+    se la finestra attraversa la fine del buffer).
+    """
+    def __init__(self, capacity, channels=1, dtype=np.float32):
+        self.capacity = int(capacity)
+        self.channels = channels
+        self._data = np.zeros((self.capacity, channels), dtype=dtype)
+        self._write_pos = 0       # Indice del prossimo campione da scrivere
+        self._total_written = 0   # Contatore monotono dei campioni scritti (pubblicato DOPO la scrittura)
+
+    # Numero totale di campioni ricevuti dall'ultimo reset
+    @property
+    def total_written(self):
+        return self._total_written
+
+    # Campioni effettivamente disponibili nel buffer
+    def __len__(self):
+        return min(self._total_written, self.capacity)
+
+    # Scrittura (chiamata dal solo thread del callback audio: singolo produttore, nessun lock)
+    def write(self, block):
+        frames = len(block)
+        if frames == 0: return
+
+        # Se il blocco è più grande del buffer teniamo solo la coda
+        if frames > self.capacity:
+            skipped = frames - self.capacity
+            block = block[skipped:]
+            frames = self.capacity
+            self._write_pos = (self._write_pos + skipped) % self.capacity
+            self._total_written += skipped
+
+        end = self._write_pos + frames
+        if end <= self.capacity:
+            self._data[self._write_pos:end] = block
+        else:
+            first = self.capacity - self._write_pos
+            self._data[self._write_pos:] = block[:first]
+            self._data[:frames - first] = block[first:]
+
+        self._write_pos = end % self.capacity
+        self._total_written += frames
+
+    # Restituisce gli ultimi num_samples campioni (o meno, se il buffer non è ancora pieno)
+    def get_window(self, num_samples):
+        """
+        Vista sugli ultimi campioni acquisiti. Se la finestra è contigua non viene copiato nulla,
+        altrimenti si effettua un'unica concatenazione dei due segmenti.
+        La vista va consumata subito: il callback continua a scrivere sullo stesso array.
+        """
+        return self._slice(self._total_written, num_samples)
+
+    # Estrae i campioni che terminano alla posizione assoluta 'total' (snapshot del cursore)
+    def _slice(self, total, num_samples):
+        available = min(total, self.capacity, int(num_samples))
+        if available <= 0: return None
+
+        end = total % self.capacity
+        start = end - available
+        if start >= 0:
+            return self._data[start:end]
+        return np.concatenate((self._data[start:], self._data[:end]))
+
+    # Restituisce i campioni scritti dopo la posizione assoluta 'position' (per elaborazioni incrementali)
+    def read_since(self, position):
+        """
+        Ritorna (campioni_nuovi, nuova_posizione). Se il lettore è rimasto indietro
+        oltre la capacità del buffer, i campioni persi vengono saltati.
+        """
+        total = self._total_written
+        pending = total - position
+        if pending <= 0:
+            return None, total
+        return self._slice(total, pending), total
+
+    # Reset del buffer (all'avvio di una nuova sessione)
+    def clear(self):
+        self._write_pos = 0
+        self._total_written = 0
@@ -0,0 +1,372 @@
+import numpy as np
+from collections import deque
+from functools import lru_cache
+from math import gcd
+from scipy import signal
+
+from audio_buffer import AudioRingBuffer
+
+# Granularità del massimo scorrevole (campioni): i picchi sono tenuti per sotto-blocchi allineati
+PEAK_BLOCK = 4096
+
+
+# Progettazione filtro passa-alto: calcolata una sola volta per ogni combinazione (sample rate, taglio, ordine)
+@lru_cache(maxsize=8)
+def design_highpass_sos(sample_rate, cutoff=80, order=10):
+    return signal.butter(order, cutoff, "hp", fs=sample_rate, output="sos")
+
+
+# Coefficienti FIR per il ricampionamento polifase (stessa progettazione di signal.resample_poly)
+@lru_cache(maxsize=8)
+def design_resample_taps(up, down):
+    max_rate = max(up, down)
+    half_len = 10 * max_rate
+    return signal.firwin(2 * half_len + 1, 1.0 / max_rate, window=("kaiser", 5.0))
+
+
+class StreamingResampler:
+    """
+    Ricampionamento razionale polifase (es. 44.1kHz -> 8kHz = 80/441) eseguito a blocchi.
+    I coefficienti sono precalcolati; tra un blocco e l'altro si conserva solo la coda di input
+    necessaria al filtro, allineata a multipli di 'down' così che l'uscita resti in fase.
+    """
+    def __init__(self, rate_in, rate_out, channels=1):
+        g = gcd(int(rate_in), int(rate_out))
+        self.rate_in = rate_in
+        self.rate_out = rate_out
+        self.up = int(rate_out) // g
+        self.down = int(rate_in) // g
+        self.channels = channels
+        self.taps = design_resample_taps(self.up, self.down)
+        self._stream_taps = self.taps * self.up
+
+        # Storico minimo (in campioni di input, multiplo di 'down') per coprire la lunghezza del filtro
+        taps_per_phase = -(-len(self._stream_taps) // self.up)
+        self._history_len = (taps_per_phase // self.down + 2) * self.down
+        self.reset()
+
+    def reset(self):
+        self._history = np.zeros((0, self.channels), dtype=np.float32)
+        self._history_start = 0   # Posizione assoluta (input) del primo campione dello storico
+        self._next_output = 0     # Prossimo campione di output (assoluto) da emettere
+
+    # Elabora un blocco nuovo e restituisce i soli campioni di output completi
+    def process(self, block):
+        buf = np.concatenate((self._history, block)) if len(self._history) else block
+        start = self._history_start
+        end = start + len(buf)
+
+        out = signal.upfirdn(self._stream_taps, buf, self.up, self.down, axis=0)
+
+        # Indici di output validi: tutti gli input necessari sono già arrivati
+        first_out = start // self.down * self.up
+        last_out = (end * self.up - 1) // self.down
+        lo = self._next_output - first_out
+        hi = last_out - first_out + 1
+        result = out[lo:hi].astype(np.float32)
+        self._next_output = last_out + 1
+
+        # Conserviamo la coda di input allineata a 'down'
+        new_start = max(start, (end - self._history_len) // self.down * self.down)
+        self._history = buf[new_start - start:]
+        self._history_start = new_start
+        return result
+
+    # Ricampionamento one-shot di una finestra intera (usato finché lo stream non è a regime)
+    def resample_window(self, window):
+        return signal.resample_poly(window, self.up, self.down, axis=0, window=self.taps)
+
+
+class StreamingPreprocessor:
+    """
+    Pre-processamento incrementale dell'audio catturato.
+    Filtra solo i campioni nuovi (mantenendo lo stato 'zi' del filtro tra un blocco e l'altro),
+    li salva in un buffer circolare già filtrato e tiene il picco corrente della finestra,
+    così la normalizzazione non richiede di riscansionare tutti i 12 secondi.
+    """
+    def __init__(self, sample_rate, capacity, channels=1, cutoff=80, order=10, low_rate=8000, gate=None):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.sos = design_highpass_sos(sample_rate, cutoff, order)
+        self.filtered = AudioRingBuffer(capacity, channels=channels)
+
+        # Ramo a bassa qualità (rete lenta): ricampionato in streaming solo quando attivo
+        self.low_rate = low_rate
+        self.resampler = StreamingResampler(sample_rate, low_rate, channels=channels)
+        self.filtered_low = AudioRingBuffer(int(capacity * low_rate / sample_rate) + 1, channels=channels)
+        self.downsampling = False
+        self.gate = gate                  # AudioGate opzionale, alimentato con l'audio già filtrato
+        self.reset()
+
+    # Reset dello stato (nuova sessione o cambio sorgente)
+    def reset(self):
+        self.zi = np.zeros((self.sos.shape[0], 2, self.channels))
+        self.read_position = 0           # Posizione assoluta già consumata dal buffer grezzo
+        self.filtered.clear()
+        self._peaks = deque()             # Coda monotona (inizio_sotto_blocco, picco) per il massimo scorrevole
+        self._reset_low_branch()
+        if self.gate: self.gate.reset()
+
+    def _reset_low_branch(self):
+        self.resampler.reset()
+        self.filtered_low.clear()
+
+    # Attiva/disattiva il ramo a bassa frequenza. All'attivazione lo stream riparte da zero.
+    def set_downsampling(self, enabled):
+        if enabled != self.downsampling:
+            self.downsampling = enabled
+            self._reset_low_branch()
+
+    # Frequenza di uscita della finestra (livello di qualità): sample_rate = ramo ricampionato disattivato
+    def set_output_rate(self, rate):
+        if rate >= self.sample_rate:
+            self.set_downsampling(False)
+            return
+        if rate != self.low_rate:
+            self.low_rate = rate
+            self.resampler = StreamingResampler(self.sample_rate, rate, channels=self.channels)
+            self.filtered_low = AudioRingBuffer(int(self.filtered.capacity * rate / self.sample_rate) + 1, channels=self.channels)
+            self.downsampling = True
+            self._reset_low_branch()
+            return
+        self.set_downsampling(True)
+
+    # Filtra un blocco nuovo e aggiorna le statistiche di picco
+    def process_block(self, block):
+        if block is None or len(block) == 0: return
+        filtered, self.zi = signal.sosfilt(self.sos, block, axis=0, zi=self.zi)
+        self.filtered.write(filtered)
+        if self.downsampling:
+            self.filtered_low.write(self.resampler.process(filtered))
+        if self.gate:
+            self.gate.process(filtered)
+
+        # Picchi per sotto-blocchi allineati a multipli di PEAK_BLOCK (posizione assoluta), non per blocco ricevuto
+        magnitude = np.abs(filtered)
+        if magnitude.ndim > 1: magnitude = magnitude.max(axis=1)
+        end_pos = self.filtered.total_written
+        start_pos = end_pos - len(magnitude)
+        bounds = np.arange((-start_pos) % PEAK_BLOCK, len(magnitude), PEAK_BLOCK)
+        if not len(bounds) or bounds[0] != 0: bounds = np.concatenate(([0], bounds))
+        for offset, peak in zip(bounds.tolist(), np.maximum.reduceat(magnitude, bounds).tolist()):
+            while self._peaks and self._peaks[-1][1] <= peak:
+                self._peaks.pop()
+            self._peaks.append((start_pos + offset, peak))
+
+        # Scartiamo i picchi ormai usciti dal buffer
+        oldest = end_pos - self.filtered.capacity
+        while self._peaks and self._peaks[0][0] < oldest:
+            self._peaks.popleft()
+
+    # Recupera dal buffer grezzo solo i campioni arrivati dall'ultima chiamata
+    def catch_up(self, raw_buffer):
+        new_samples, self.read_position = raw_buffer.read_since(self.read_position)
+        if new_samples is not None:
+            self.process_block(new_samples.astype(np.float32, copy=False))
+
+    # Picco massimo (in valore assoluto) degli ultimi num_samples campioni filtrati
+    def window_peak(self, num_samples, window=None):
+        """
+        Esatto: i sotto-blocchi che iniziano dentro la finestra vengono dalla coda monotona,
+        il tratto iniziale fino al primo confine di sotto-blocco (< PEAK_BLOCK campioni) si misura sulla finestra.
+        """
+        total = self.filtered.total_written
+        window_start = total - num_samples
+        # Coda a picchi decrescenti: il primo sotto-blocco dentro la finestra ne è il massimo (la coda non si modifica,
+        # finestre di durata diversa restano esatte)
+        peak = next((p for start, p in self._peaks if start >= window_start), 0.0)
+
+        head = min(total, -(-window_start // PEAK_BLOCK) * PEAK_BLOCK) - window_start
+        if head > 0:
+            if window is None: window = self.filtered.get_window(num_samples)
+            if window is not None and len(window):
+                peak = max(peak, float(np.max(np.abs(window[:head]))))
+        return peak
+
+    # Finestra finale normalizzata e convertita a 16-bit PCM
+    def get_window_int16(self, num_samples):
+        window = self.filtered.get_window(num_samples)
+        if window is None: return None
+
+        return self._to_int16(window, self.window_peak(len(window), window))
+
+    # Finestra a bassa frequenza di campionamento (stessa durata, stesso guadagno della finestra piena)
+    def get_low_window_int16(self, num_samples):
+        """
+        Se il ramo streaming copre già tutta la finestra la usiamo direttamente,
+        altrimenti (appena attivato) ricampioniamo la finestra filtrata con i coefficienti in cache.
+        """
+        window = self.filtered.get_window(num_samples)
+        if window is None: return None
+        peak = self.window_peak(len(window), window)
+
+        num_low = len(window) * self.low_rate // self.sample_rate
+        if self.downsampling and len(self.filtered_low) >= num_low:
+            low_window = self.filtered_low.get_window(num_low)
+        else:
+            low_window = self.resampler.resample_window(window)
+        return self._to_int16(low_window, peak)
+
+    def _to_int16(self, window, peak):
+        scale = (0.95 * 32767 / peak) if peak > 0 else 32767
+        # Il ricampionamento può superare di poco il picco originale: clip di sicurezza
+        return np.clip(window * scale, -32768, 32767).astype(np.int16)
+
+
+# Matrice (bin FFT -> classe di altezza) per il cromagramma grossolano
+@lru_cache(maxsize=8)
+def chroma_matrix(sample_rate, frame_size, fmin=55.0, fmax=5000.0):
+    freqs = np.fft.rfftfreq(frame_size, 1.0 / sample_rate)
+    matrix = np.zeros((len(freqs), 12), dtype=np.float32)
+    valid = (freqs >= fmin) & (freqs <= fmax)
+    pitch_class = (np.round(12 * np.log2(freqs[valid] / 440.0)).astype(int) + 9) % 12
+    matrix[np.nonzero(valid)[0], pitch_class] = 1.0
+    return matrix
+
+
+# Matrice (bin FFT -> banda logaritmica) per l'inviluppo spettrale grossolano
+@lru_cache(maxsize=8)
+def band_matrix(sample_rate, frame_size, bands=53, fmin=100.0, fmax=5000.0):
+    freqs = np.fft.rfftfreq(frame_size, 1.0 / sample_rate)
+    band = np.digitize(freqs, np.geomspace(fmin, fmax, bands + 1)) - 1
+    matrix = np.zeros((len(freqs), bands), dtype=np.float32)
+    valid = (band >= 0) & (band < bands)
+    matrix[np.nonzero(valid)[0], band[valid]] = 1.0
+    return matrix
+
+
+# Hash percettivo a 64 bit: forma dell'inviluppo (52 bit, banda più forte della precedente) + cromagramma (12 bit)
+def perceptual_hash(band_energy, chroma):
+    log_bands = np.log(np.asarray(band_energy, dtype=np.float64) + 1e-12)
+    chroma = np.asarray(chroma, dtype=np.float64)
+    bits = np.concatenate((log_bands[1:] > log_bands[:-1], chroma > chroma.mean()))
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+class AudioGate:
+    """
+    Decide se una finestra merita di essere inviata ad ACR/Scribe.
+    Le feature (energia RMS, flusso spettrale, cromagramma a 12 classi) sono calcolate una volta sola
+    per frame, man mano che l'audio filtrato arriva; la decisione sulla finestra è poi solo una media.
+    Motivi di scarto: silenzio, rumore non tonale (applausi), brano invariato rispetto all'ultimo identificato.
+    """
+    def __init__(self, sample_rate, capacity, frame_size=4096,
+                 silence_db=-50.0, tonal_flatness=0.9, same_song_similarity=0.97,
+                 novelty_ratio=2.5, max_consecutive_skips=5):
+        self.sample_rate = sample_rate
+        self.frame_size = frame_size
+        self.silence_db = silence_db
+        self.tonal_flatness = tonal_flatness
+        self.same_song_similarity = same_song_similarity
+        self.novelty_ratio = novelty_ratio
+        self.max_consecutive_skips = max_consecutive_skips
+
+        self._window_fn = np.hanning(frame_size).astype(np.float32)
+        self._chroma = chroma_matrix(sample_rate, frame_size)
+        self._bands = band_matrix(sample_rate, frame_size)
+        self._max_frames = capacity // frame_size + 1
+        self.stats = {"evaluated": 0, "sent": 0, "skipped_silence": 0,
+                      "skipped_non_tonal": 0, "skipped_unchanged": 0, "forced": 0}
+        self.reset()
+
+    def reset(self):
+        self._pending = np.zeros(0, dtype=np.float32)   # Campioni che non completano ancora un frame
+        self._prev_spec = None
+        self._rms = deque(maxlen=self._max_frames)
+        self._flux = deque(maxlen=self._max_frames)
+        self._chromas = deque(maxlen=self._max_frames)
+        self._band_energy = deque(maxlen=self._max_frames)
+        self._frames_total = 0
+        self._frames_at_last_eval = 0
+        self._last_signature = None
+        self._identified_signature = None
+        self._consecutive_skips = 0
+
+    # Calcolo vettoriale delle feature su tutti i frame completi del blocco
+    def process(self, block):
+        mono = block[:, 0] if block.ndim > 1 else block
+        data = np.concatenate((self._pending, mono.astype(np.float32, copy=False)))
+        n_frames = len(data) // self.frame_size
+        self._pending = data[n_frames * self.frame_size:]
+        if n_frames == 0: return
+
+        frames = data[:n_frames * self.frame_size].reshape(n_frames, self.frame_size)
+        rms = np.sqrt(np.mean(frames ** 2, axis=1))
+        magnitude = np.abs(np.fft.rfft(frames * self._window_fn, axis=1))
+        spec = np.log1p(magnitude)
+
+        first_prev = self._prev_spec if self._prev_spec is not None else spec[0]
+        prev = np.vstack((first_prev[None, :], spec[:-1]))
+        flux = np.sum(np.maximum(spec - prev, 0), axis=1) / (np.sum(prev, axis=1) + 1e-9)
+        power = magnitude ** 2
+        chroma = power @ self._chroma
+
+        self._prev_spec = spec[-1]
+        self._rms.extend(rms.tolist())
+        self._flux.extend(flux.tolist())
+        self._chromas.extend(chroma)
+        self._band_energy.extend(power @ self._bands)
+        self._frames_total += n_frames
+
+    # Valuta la finestra corrente (ultimi window_seconds secondi)
+    def evaluate(self, window_seconds):
+        """
+        Ritorna (invia, motivo). Dopo max_consecutive_skips scarti di fila la finestra viene
+        comunque inviata, così un errore del gate non blocca il riconoscimento a lungo.
+        """
+        self.stats["evaluated"] += 1
+        n = min(len(self._rms), max(1, int(window_seconds * self.sample_rate / self.frame_size)))
+        if n == 0:
+            return self._send("no_features")
+
+        rms = np.array(self._rms)[-n:]
+        flux = np.array(self._flux)[-n:]
+        chroma = np.array(self._chromas)[-n:].mean(axis=0)
+        new_frames = min(n, self._frames_total - self._frames_at_last_eval)
+        self._frames_at_last_eval = self._frames_total
+
+        signature = chroma / (np.linalg.norm(chroma) + 1e-9)
+        self._last_signature = signature
+
+        reason = None
+        level_db = 20 * np.log10(np.sqrt(np.mean(rms ** 2)) + 1e-12)
+        if level_db < self.silence_db:
+            reason = "silence"
+        else:
+            flatness = np.exp(np.mean(np.log(chroma + 1e-9))) / (np.mean(chroma) + 1e-9)
+            if flatness > self.tonal_flatness:
+                reason = "non_tonal"
+            elif self._identified_signature is not None:
+                similarity = float(signature @ self._identified_signature)
+                recent_flux = flux[-new_frames:] if new_frames > 0 else flux[-1:]
+                novelty = float(np.max(recent_flux) / (np.median(flux) + 1e-9))
+                if similarity > self.same_song_similarity and novelty < self.novelty_ratio:
+                    reason = "unchanged"
+
+        if reason is None:
+            return self._send("changed")
+
+        if self._consecutive_skips >= self.max_consecutive_skips:
+            self.stats["forced"] += 1
+            return self._send(f"forced ({reason})")
+
+        self._consecutive_skips += 1
+        self.stats[f"skipped_{reason}"] += 1
+        return False, reason
+
+    def _send(self, reason):
+        self._consecutive_skips = 0
+        self.stats["sent"] += 1
+        return True, reason
+
+    # Hash percettivo della finestra (ultimi window_seconds secondi) dalle feature già calcolate per frame
+    def window_hash(self, window_seconds):
+        n = min(len(self._chromas), max(1, int(window_seconds * self.sample_rate / self.frame_size)))
+        if n == 0: return None
+        bands = np.array(self._band_energy)[-n:].mean(axis=0)
+        chroma = np.array(self._chromas)[-n:].mean(axis=0)
+        return perceptual_hash(bands, chroma)
+
+    # Chiamato quando la finestra appena valutata ha portato a un brano confermato
+    def mark_identified(self):
+        self._identified_signature = self._last_signature
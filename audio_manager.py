@@ -4,26 +4,37 @@ import hmac
 import hashlib
 import base64
 import json
-import requests
-import sounddevice as sd
-import scipy.io.wavfile as wav
-from scipy import signal
-import numpy as np
 from dotenv import load_dotenv
 import threading
-import io
-import re
-import unicodedata
 from collections import deque
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-from difflib import SequenceMatcher
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from functools import partial
+
+# Cattura live opzionale: senza PortAudio resta disponibile la modalità replay da file
+try:
+    import sounddevice as sd
+except (ImportError, OSError):
+    sd = None
+
+from audio_buffer import AudioRingBuffer
+from audio_dsp import StreamingPreprocessor, AudioGate
+from window_scheduler import WindowScheduler
+from replay_source import AudioFileSource, list_audio_files
+from wav_payload import WavPayload
+from quality_controller import QualityController
+from recognition_cache import RecognitionCache
+from http_client import get_http_client, SPOTIFY_URLS
+from scribe_scheduler import ScribeScheduler
+from stability_tracker import StabilityTracker, group_tracks
+from fuzzy_match import ratio
+from context_store import get_context_store
+from text_normalize import normalize_title, normalize_for_match, clean_for_display, is_placeholder_title, cache_stats
 
 # Import bot managers
 from spotify_manager import SpotifyManager
 from setlist_manager import SetlistManager
 from lyrics_manager import LyricsManager
+from fingerprint_manager import FingerprintManager
 
 load_dotenv()
 
@@ -36,31 +47,34 @@ class AudioManager:
         self.host = os.getenv("ACRCLOUD_HOST") or os.getenv("ACR_HOST")
         self.access_key = os.getenv("ACRCLOUD_ACCESS_KEY") or os.getenv("ACR_ACCESS_KEY")
         self.access_secret = os.getenv("ACRCLOUD_SECRET_KEY") or os.getenv("ACR_ACCESS_SECRET")
+        # Endpoint completo opzionale (es. stand-in locale dei benchmark), altrimenti https://<host>/v1/identify
+        self.acr_endpoint = os.getenv("ACRCLOUD_ENDPOINT")
         
         # --- 2. CONFIGURAZIONE SESSIONE HTTP ---
-        self.session = requests.Session()
-        retry_strategy = Retry(
-            total=2,
-            backoff_factor=0.5,
-            status_forcelist=[429, 500, 502, 503, 504],
-            allowed_methods=["POST"],
-        )
-        adapter = HTTPAdapter(max_retries=retry_strategy)
-        self.session.mount("https://", adapter)
-        self.session.mount("http://", adapter)
+        # Client condiviso con gli altri manager (pool di connessioni per host, retry su 429/5xx)
+        self.http = get_http_client()
 
         # --- 3. CONFIGURAZIONE STREAMING AUDIO ---
         self.sample_rate = 44100
-        self.window_duration = 12  # Secondi di audio da inviare
         self.block_size = 4096
-        
-        # Velocità di invio dinamica: 6s, scala a 10s se rete lenta, torna a 6s se veloce
-        self.overlap_interval = 6 
 
-        self.audio_buffer = deque(
-            maxlen=int((self.sample_rate * self.window_duration) / self.block_size) + 10
-        )
-        self.history_buffer = deque(maxlen=10)
+        # Qualità adattiva: frequenza di invio, durata finestra e intervallo seguono il livello corrente
+        # (EWMA della latenza ACR + budget di errori, con isteresi)
+        self.quality = QualityController()
+        self._apply_quality_level()
+
+        # Buffer circolare preallocato (finestra più lunga della scala + 10 blocchi di margine per il callback)
+        max_window = max(level["window_s"] for level in self.quality.ladder)
+        buffer_capacity = self.sample_rate * max_window + self.block_size * 10
+        self.audio_buffer = AudioRingBuffer(capacity=buffer_capacity)
+        # Gate sul flusso audio: evita chiamate API su silenzio, applausi o brano già identificato
+        self.audio_gate = AudioGate(self.sample_rate, capacity=buffer_capacity)
+        # Pre-processamento incrementale (filtro passa-alto con stato + picco scorrevole)
+        self.preprocessor = StreamingPreprocessor(self.sample_rate, capacity=buffer_capacity, gate=self.audio_gate)
+        # Conferma di stabilità a voti decrescenti per chiave canonica (titolo|artista o ISRC/acrid)
+        self.stability = StabilityTracker(self._normalize_text, self._are_tracks_equivalent)
+        # Cache dei risultati per hash percettivo: finestre quasi identiche non richiedono nuove chiamate
+        self.recognition_cache = RecognitionCache()
 
         # --- 4. STATO E VARIABILI ---
         self.is_running = False
@@ -68,104 +82,178 @@ class AudioManager:
         self.monitor_thread = None
         self.result_callback = callback_function 
         self.target_artist_bias = None
-        self.low_quality_mode = False
         self.upload_lock = threading.Lock()
+        self.arbitration_lock = threading.Lock() # Arbitraggio della finestra corrente e risultati tardivi
+        self.acr_confident_score = 90            # Sopra questa soglia ACR decide senza attendere Scribe
+        self.arbitration_stats = {"early": 0, "complete": 0, "deadline": 0, "late_acr": 0, "late_scribe": 0}
         self.context_lock = threading.Lock()
         
         self.context_ready = False 
-        self.predicted_next_song = None
-        self.cycle_counter = 0
+        # Veggente: prossimi brani previsti {id canonico: (titolo, peso relativo al più probabile)}
+        self.predicted_next_songs = {}
+        self.recent_titles = deque(maxlen=2)    # Ultimi due brani confermati (distinti), contesto del secondo ordine
+        # Scribe solo dove ACR è incerto, entro un budget per sessione
+        self.scribe_scheduler = ScribeScheduler()
 
         # --- 5. INIZIALIZZAZIONE BOT ---
         print("🤖 Inizializzazione Bot...")
         self.executor = ThreadPoolExecutor(max_workers=4) # 4 workers per gestire ACR + Scribe
+        # Prefetch del contesto su un pool separato (non occupa i worker di riconoscimento)
+        self.context_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="context")
+        self.context_stages = {}
+        # Job di contesto versionati: una nuova richiesta annulla la precedente, i risultati superati vengono scartati
+        self.context_version = 0
+        self.context_debounce_s = 0.4
+        self.context_jobs = {"started": 0, "coalesced": 0, "superseded": 0, "discarded": 0}
+        self._context_cancel = threading.Event()
+        self._context_inflight = False
+        # Dispatcher unico delle finestre (sostituisce un thread nuovo per ogni ciclo)
+        self.window_scheduler = WindowScheduler(self._process_window)
         
         self.setlist_bot = SetlistManager()
         self.spotify_bot = SpotifyManager()
         self.lyrics_bot = LyricsManager()
+        self.fingerprint_bot = FingerprintManager() # Indice locale consultato prima di ACRCloud
 
         print("🎤 Audio Manager Pronto. Modalità: Ibrida (ACRCloud + Scribe).")
 
     def update_target_artist(self, artist_name):
         """
         Scarica il contesto completo: Setlist.fm + Spotify + Genius.
-        Thread-safe version.
+        Thread-safe version: ogni richiesta con un nuovo artista crea un job con versione propria,
+        annulla quello precedente (i suoi risultati vengono scartati) e parte dopo un breve debounce;
+        richieste per lo stesso artista vengono accorpate al job già in corso o concluso.
         """
+        # La sessione sta per partire: apriamo subito le connessioni verso i servizi di riconoscimento
+        self.prewarm_connections()
+
         # Acquisiamo il lock per evitare che 3 richieste simultanee passino tutte il controllo iniziale
         with self.context_lock:
             # Normalizziamo le stringhe per sicurezza
             curr_artist_norm = (self.target_artist_bias or "").strip().lower()
             new_artist_norm = (artist_name or "").strip().lower()
 
-            # Se l'artista richiesto è lo stesso che abbiamo già in memoria...
+            # Se l'artista richiesto è lo stesso che abbiamo già in memoria (o in download)...
             if new_artist_norm and new_artist_norm == curr_artist_norm:
-                # ...e se abbiamo effettivamente dei dati caricati
-                if self.context_ready or len(self.setlist_bot.cached_songs) > 0:
-                    print(f"✅ [Context] Dati per '{artist_name}' già in memoria. Skip download.")
+                if self._context_inflight or self.context_ready or len(self.setlist_bot.cached_songs) > 0:
+                    self.context_jobs["coalesced"] += 1
+                    print(f"✅ [Context] Dati per '{artist_name}' già in memoria o in download. Skip download.")
                     return
 
+            # Nuova versione del contesto: il job precedente (se in corso) viene annullato
+            self._context_cancel.set()
+            if self._context_inflight: self.context_jobs["superseded"] += 1
+            self.context_version += 1
+            version = self.context_version
+            cancel = self._context_cancel = threading.Event()
+            self._context_inflight = bool(artist_name)
+
             # Aggiornamento immediato Bias e Reset stato
             self.target_artist_bias = artist_name
             self.context_ready = False 
-            self.predicted_next_song = None
+            self.context_stages = {}
+            self.predicted_next_songs = {}
+            self.recent_titles.clear()
             
             # Pulizia cache
             self.setlist_bot.cached_songs = []
             self.setlist_bot.concert_sequences = []
+            self.recognition_cache.clear() # I punteggi in cache dipendono dal contesto dell'artista
             print(f"🧹 [Context] Cache precedente svuotata per nuovo artista.")
 
         if artist_name:
-            def fetch_full_context():
-                print(f"\n🎸 [Context] Avvio scansione completa per: {artist_name}")
-                
-                # 1. SETLIST.FM (download scaletta concerti più recenti e frequenti)
-                songs_setlist = self.setlist_bot.get_likely_songs(artist_name)
-                
-                # 2. SPOTIFY (download brani più popolari e recenti)
-                songs_spotify = self.spotify_bot.get_artist_complete_data(artist_name)
-                
-                # 3. FUSIONE LISTE
-                merged_songs = set(songs_setlist + songs_spotify)
-                
-                if merged_songs:
-                    self.setlist_bot.cached_songs = list(merged_songs)
-                    print(f"✅ [Context] White List audio pronta: {len(merged_songs)} brani.")
-                else:
-                    print("⚠️ [Context] Nessun brano trovato per Audio Fingerprint.")
-                
-                # 4. GENIUS / SCRIBE (Download testi dei brani per utilizzo in Scribe)
-                self.lyrics_bot.update_artist_context(artist_name)
-                
-                self.context_ready = True
-
-            self.executor.submit(fetch_full_context)
+            self._prefetch_context(artist_name, version, cancel)
         else:
             print("⚪ [Context] Nessun artista target. Modalità generica attiva.")
 
+    # Prefetch del contesto: scalette e Spotify in parallelo, testi appena Spotify risponde (stesso risultato, nessuna seconda chiamata)
+    def _prefetch_context(self, artist_name, version, cancel):
+        """
+        Ogni fase pubblica subito la sua parte di contesto: whitelist (unione scalette + Spotify,
+        aggiornata da chi arriva prima), poi transizioni della scaletta, poi testi.
+        Ogni pubblicazione avviene solo se il job è ancora la versione corrente (altrimenti viene scartata).
+        I tempi di ogni fase (ms dalla richiesta, debounce incluso) sono in self.context_stages.
+        """
+        start = time.time()
+        stages = self.context_stages
+        whitelist_sources = {}
+        pending = ["setlist", "spotify"]
+
+        def mark(stage, status="done"):
+            stages[stage] = {"status": status, "ms": round((time.time() - start) * 1000)}
+
+        # Pubblicazione atomica rispetto al cambio di artista: False se il job è stato superato
+        def publish(apply):
+            with self.context_lock:
+                if version != self.context_version:
+                    self.context_jobs["discarded"] += 1
+                    return False
+                apply()
+                return True
+
+        def run_stage(name, fn):
+            try:
+                if not cancel.is_set(): fn()
+            except Exception as e:
+                mark(name, "error")
+                print(f"❌ [Context] Errore fase {name}: {e}")
+            finally:
+                finish_stage(name)
+
+        def finish_stage(name):
+            with self.context_lock:
+                pending.remove(name)
+                if pending or version != self.context_version: return
+                self.context_ready = True
+                self._context_inflight = False
+            mark("ready")
+            print(f"⚡ [Context] Contesto pronto in {stages['ready']['ms']} ms (testi in background).")
+
+        # 1. WHITELIST (fusione delle liste man mano che arrivano)
+        def publish_whitelist(source, songs):
+            def apply():
+                whitelist_sources[source] = songs or []
+                merged = set().union(*whitelist_sources.values())
+                if merged: self.setlist_bot.cached_songs = list(merged)
+            if not publish(apply): return False
+            mark(f"whitelist_{source}", "done" if songs else "empty")
+            print(f"✅ [Context] White List audio aggiornata ({source}) in {stages[f'whitelist_{source}']['ms']} ms.")
+            return True
+
+        # 2. SETLIST.FM (scalette recenti -> whitelist, poi modello delle transizioni)
+        def setlist_stage():
+            context = self.setlist_bot.fetch_context(artist_name)
+            if not publish_whitelist("setlist", context["songs"] if context else []): return
+            if context and not publish(lambda: setattr(self.setlist_bot, "concert_sequences", context["sequences"])): return
+            mark("transitions", "done" if context else "empty")
+
+        # 3. SPOTIFY (hit e ultimo album -> whitelist) e GENIUS / SCRIBE (testi sugli stessi brani)
+        def spotify_stage():
+            songs = self.spotify_bot.get_artist_complete_data(artist_name) if self.spotify_bot else None
+            if not publish_whitelist("spotify", songs): return
+            lyrics_future = self.lyrics_bot.update_artist_context(artist_name, songs=songs)
+            if lyrics_future is None: mark("lyrics")
+            else: lyrics_future.add_done_callback(lambda _: mark("lyrics"))
+
+        # Debounce: richieste ravvicinate (artista digitato/corretto) non avviano download inutili
+        def launch():
+            if cancel.is_set():
+                with self.context_lock: self.context_jobs["discarded"] += 1
+                return
+            print(f"\n🎸 [Context] Avvio scansione completa per: {artist_name} (v{version})")
+            self.context_jobs["started"] += 1
+            self.context_executor.submit(run_stage, "setlist", setlist_stage)
+            self.context_executor.submit(run_stage, "spotify", spotify_stage)
+
+        timer = threading.Timer(self.context_debounce_s, launch)
+        timer.daemon = True
+        timer.start()
+
     # Callback del flusso audio: acquisisce i dati e li mette in un buffer per l'elaborazione
     def _audio_callback(self, indata, frames, time, status):
         if status and "overflow" not in str(status):
             print(f"⚠️ Audio Status: {status}")
-        self.audio_buffer.append(indata.copy())
-
-    # Preprocessamento audio: filtro passa-alto, normalizzazione e conversione a 16-bit PCM
-    def _preprocess_audio_chunk(self, full_audio_data):
-        if full_audio_data.dtype != np.float32:
-            data = full_audio_data.astype(np.float32)
-        else:
-            data = full_audio_data
-
-        # Filtro passa-alto (80Hz)
-        sos = signal.butter(10, 80, "hp", fs=self.sample_rate, output="sos")
-        filtered = signal.sosfilt(sos, data, axis=0)
-
-        max_val = np.max(np.abs(filtered))
-        if max_val > 0:
-            normalized = filtered / max_val * 0.95
-        else:
-            normalized = filtered
-
-        return (normalized * 32767).astype(np.int16)
+        self.audio_buffer.write(indata)
 
     # Metodo principale di processamento: gestisce la logica di invio ad ACRCloud e Scribe, arbitraggio e callback
     def _process_window(self):
@@ -174,188 +262,404 @@ class AudioManager:
             return
 
         try:
-            if not self.audio_buffer: return
-            try:
-                full_recording = np.concatenate(list(self.audio_buffer))
-            except ValueError: return
+            job = self._prepare_window()
+            if not job: return
+            self._recognize_and_arbitrate(job)
+        except Exception as e:
+            print(f"❌ Errore processamento window: {e}")
+        finally:
+            self.upload_lock.release()
 
-            if len(full_recording) < self.sample_rate * (self.window_duration - 1):
-                return
+    # Parametri di invio del livello di qualità corrente (letti una volta per ciclo)
+    def _apply_quality_level(self):
+        level = self.quality.current
+        self.upload_rate = level["sample_rate"]
+        self.window_duration = level["window_s"]
+        self.overlap_interval = level["interval_s"]
+
+    # FASE 1: pre-processamento, gate e preparazione del payload (sequenziale, aggiorna lo stato dei buffer)
+    def _prepare_window(self):
+        self._apply_quality_level()
+        # Filtriamo solo i campioni arrivati dall'ultimo ciclo (ed eventualmente li ricampioniamo alla frequenza del livello)
+        self.preprocessor.set_output_rate(self.upload_rate)
+        self.preprocessor.catch_up(self.audio_buffer)
+
+        window_samples = self.sample_rate * self.window_duration
+        if self.preprocessor.filtered.total_written < self.sample_rate * (self.window_duration - 1):
+            return None
+
+        # Gate: la finestra è cambiata abbastanza da meritare una chiamata API?
+        should_send, gate_reason = self.audio_gate.evaluate(self.window_duration)
+        if not should_send:
+            print(f"🔇 [Gate] Finestra saltata ({gate_reason}).")
+            return None
+        
+        # Livelli ridotti (rete lenta): frequenza e bitrate più bassi (ricampionamento polifase)
+        if self.upload_rate < self.sample_rate:
+            final_audio = self.preprocessor.get_low_window_int16(window_samples)
+            write_rate = self.preprocessor.low_rate
+        else:
+            final_audio = self.preprocessor.get_window_int16(window_samples)
+            write_rate = self.sample_rate
+
+        # Payload immutabile condiviso da ACR e Scribe (header precalcolato + memoryview dei campioni)
+        payload = WavPayload(final_audio, write_rate)
+        audio_clock = self.audio_buffer.total_written / self.sample_rate
+
+        # Scribe ha senso con un artista target e i suoi testi scaricati, oppure (modalità generica) col catalogo locale dei testi.
+        # In parallelo ad ACR solo se la finestra precedente era incerta o lo storico è in conflitto;
+        # altrimenti viene deciso dopo la risposta di ACR (_scribe_after_acr)
+        if self.target_artist_bias is not None: scribe_context = bool(self.lyrics_bot.lyrics_cache)
+        else: scribe_context = self.lyrics_bot.catalog.enabled
+        run_scribe = False
+        if scribe_context:
+            reason = self.scribe_scheduler.plan(self._history_conflict())
+            run_scribe = bool(reason) and self.scribe_scheduler.acquire(audio_clock, payload.duration_s, reason)
+
+        # 0a. Cache dei risultati: finestra quasi identica a una già riconosciuta di recente
+        phash = self.audio_gate.window_hash(self.window_duration)
+        cached = self.recognition_cache.lookup(phash, audio_clock) or {}
+
+        # 0b. Pre-filtro locale: se il brano è nell'indice fingerprint con match sicuro, ACRCloud non serve
+        local_result = None
+        if self.fingerprint_bot.enabled and not cached.get("acr"):
+            local_result = self.fingerprint_bot.identify(
+                self.preprocessor.filtered.get_window(window_samples), self.sample_rate
+            )
+
+        if cached.get("acr"): status_msg = "📡 Analisi [CACHE"
+        elif local_result: status_msg = "📡 Analisi [LOCALE"
+        else: status_msg = "📡 Analisi [ACR"
+        if run_scribe: status_msg += " + SCRIBE"
+        status_msg += f"] ({self.overlap_interval}s)..."
+        print(status_msg)
+
+        return {
+            "payload": payload, "local_result": local_result,
+            "run_scribe": run_scribe, "scribe_context": scribe_context, "bias_artist": self.target_artist_bias,
+            "phash": phash, "audio_clock": audio_clock, "cached": cached,
+        }
 
-            processed_audio = self._preprocess_audio_chunk(full_recording)
-            
-            # Gestione Low Quality (Rete lenta): riduzione a 8kHz e bitrate più basso
-            if self.low_quality_mode:
-                TARGET_RATE = 8000
-                num_samples = int(len(processed_audio) * TARGET_RATE / self.sample_rate)
-                final_audio = signal.resample(processed_audio, num_samples).astype(np.int16)
-                write_rate = TARGET_RATE
-            else:
-                final_audio = processed_audio
-                write_rate = self.sample_rate
+    # FASE 2: avvio delle chiamate ai servizi di riconoscimento (nessuno stato condiviso, parallelizzabile)
+    def _start_recognition(self, job):
+        payload = job["payload"]
+        cached = job["cached"]
 
-            wav_buffer = io.BytesIO()
-            wav.write(wav_buffer, write_rate, final_audio)
-            wav_buffer.seek(0)
-            
-            # Incremento contatore cicli per gestione Scribe ogni 3 cicli
-            self.cycle_counter += 1
-            # Esegui Scribe solo se c'è un artista target E siamo ogni 3 cicli
-            run_scribe = (self.target_artist_bias is not None) and (self.cycle_counter % 3 == 0)
-
-            status_msg = f"📡 Analisi [ACR"
-            if run_scribe: status_msg += " + SCRIBE"
-            status_msg += f"] ({self.overlap_interval}s)..."
-            print(status_msg)
-
-            # 1. Lancia ACRCloud (Sempre)
-            future_acr = self.executor.submit(self._call_acr_api, wav_buffer, self.target_artist_bias)
-            
-            # 2. Lancia Scribe (ogni 3 cicli))
-            future_scribe = None
-            if run_scribe:
-                scribe_buffer = io.BytesIO(wav_buffer.getvalue())
-                future_scribe = self.executor.submit(self.lyrics_bot.transcribe_and_match, scribe_buffer)
-
-            # Raccolta Risultati
-            acr_result = future_acr.result() 
-            scribe_result = future_scribe.result() if future_scribe else None
-            
-            final_track = None
-            is_fast_track = False 
-            
-            # Parsing ACR
-            acr_best = None
-            acr_score = 0
-            if acr_result.get("status") == "multiple_results":
-                acr_best = acr_result["tracks"][0]
-                acr_score = acr_best.get("score", 0)
-
-            scribe_score = scribe_result.get("score", 0) if scribe_result else 0
-
-            # DECISIONE FINALE: ARBITRAGGIO TRA ACR E SCRIBE
-
-            # A. FAST TRACK (Conferma Reciproca Assoluta)
-            if scribe_result and acr_best:
-                if scribe_score > 75 and acr_score > 98:
-                    if self._are_tracks_equivalent(scribe_result, acr_best):
-                        print(f"⚡ [FAST TRACK] Match Assoluto! Scribe ({scribe_score}%) + ACR ({acr_score}%)")
-                        final_track = scribe_result
-                        final_track["external_metadata"] = acr_best.get("external_metadata")
-                        final_track["cover"] = acr_best.get("cover")
-                        is_fast_track = True
-
-            # B. STANDARD (Scribe affidabile o ACR come backup)
-            if not final_track:
-                # Caso 1: Scribe è molto affidabile (>65%). VINCE LUI.
-                if scribe_result and scribe_score > 65:
-                    print(f"🥇 [SCRIBE WIN] Analisi Testuale ({scribe_score}%) ha priorità.")
-                    final_track = scribe_result
-                    # Arricchimento dati da ACR se disponibile
-                    if acr_best and self._are_tracks_equivalent(scribe_result, acr_best):
-                        final_track["external_metadata"] = acr_best.get("external_metadata")
-                        final_track["cover"] = acr_best.get("cover")
-
-                # Caso 2: Scribe assente, usiamo ACRCloud classico
-                elif acr_best:
-                    print(f"🔊 [ACR WIN] Audio Fingerprint: {acr_best['title']} ({acr_score}%)")
-                    final_track = acr_best
-
-            # --- INVIO DATI E STABILITÀ ---
-            if final_track:
-                # Filtro Latin (I brani con titoli non Latin rsono spesso falsi positivi, meglio scartarli per stabilità)
-                if not self._is_mostly_latin(final_track["title"]):
-                    print(f"🐉 Scartato brano non-Latin: {final_track['title']}")
-                    return
+        # 1. Lancia ACRCloud (solo se né la cache né il match locale rispondono)
+        acr_result = cached.get("acr") or job["local_result"]
+        future_acr = None
+        if not acr_result:
+            future_acr = self.executor.submit(self._call_acr_api, payload, job["bias_artist"])
+        
+        # 2. Lancia Scribe (se pianificato in anticipo), sullo stesso payload, se la cache non ha già la trascrizione
+        future_scribe = None
+        scribe_result = cached.get("scribe") if job["run_scribe"] else None
+        if job["run_scribe"] and not scribe_result:
+            future_scribe = self.executor.submit(self.lyrics_bot.transcribe_and_match, payload, job["bias_artist"] is not None)
+
+        # Ogni risposta nuova entra in cache appena arriva, anche se l'arbitraggio è già avvenuto
+        if future_acr: future_acr.add_done_callback(partial(self._cache_result, job, "acr"))
+        if future_scribe: future_scribe.add_done_callback(partial(self._cache_result, job, "scribe"))
+        return acr_result, scribe_result, future_acr, future_scribe
+
+    # Dopo la risposta di ACR: Scribe solo se l'audio non basta (non trovato, margine basso, humming)
+    def _scribe_after_acr(self, job, acr_result):
+        reason = self.scribe_scheduler.observe(acr_result)
+        if job["run_scribe"] or not job["scribe_context"]: return None
+        if not reason:
+            self.scribe_scheduler.skip_confident()
+            return None
+        if not self.scribe_scheduler.acquire(job["audio_clock"], job["payload"].duration_s, reason): return None
+
+        job["run_scribe"] = True
+        print(f"📝 [Scribe] Attivato ({reason}).")
+        future = self.executor.submit(self.lyrics_bot.transcribe_and_match, job["payload"], job["bias_artist"] is not None)
+        future.add_done_callback(partial(self._cache_result, job, "scribe"))
+        return future
+
+    # Storico recente in conflitto: brani diversi tra le ultime rilevazioni
+    def _history_conflict(self):
+        return self.stability.has_conflict()
+
+    def _cache_result(self, job, kind, future):
+        if future.cancelled() or future.exception(): return
+        if kind == "acr": self.recognition_cache.store(job["phash"], job["audio_clock"], acr_result=future.result())
+        else: self.recognition_cache.store(job["phash"], job["audio_clock"], scribe_result=future.result())
+
+    # FASE 2 (replay): attende ACR e l'eventuale Scribe pianificato. Lo Scribe deciso dopo ACR
+    # (observe/acquire dello scheduler) viene valutato dal chiamante nell'ordine delle finestre
+    def _recognize_window(self, job):
+        acr_result, scribe_result, future_acr, future_scribe = self._start_recognition(job)
+        if future_acr: acr_result = future_acr.result()
+        if future_scribe: scribe_result = future_scribe.result()
+        return acr_result, scribe_result
+
+    # FASE 2+3 (live): arbitraggio guidato dall'ordine di arrivo e da una scadenza per finestra
+    def _recognize_and_arbitrate(self, job):
+        """
+        - ACR arriva sopra 'acr_confident_score' -> si decide subito, Scribe arriverà come conferma o correzione
+        - altrimenti si attendono entrambe le risposte, ma non oltre la scadenza (il ciclo successivo)
+        Le risposte arrivate dopo la decisione vengono arbitrate a parte (_on_late_result),
+        così upload_lock viene rilasciato senza attendere l'upload più lento.
+        """
+        acr_result, scribe_result, future_acr, future_scribe = self._start_recognition(job)
+        deadline = time.monotonic() + self.overlap_interval
+        pending = {f for f in (future_acr, future_scribe) if f}
+        outcome = "complete"
+        acr_checked = False
+
+        while True:
+            # Risposta ACR disponibile (anche da cache o indice locale): serve anche Scribe?
+            if acr_result is not None and not acr_checked:
+                acr_checked = True
+                late_scribe = self._scribe_after_acr(job, acr_result)
+                if late_scribe:
+                    future_scribe = late_scribe
+                    pending.add(late_scribe)
+            if not pending: break
+
+            # ACR già sicuro: Scribe non va atteso
+            if future_scribe in pending and self._is_acr_confident(acr_result):
+                outcome = "early"
+                break
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                outcome = "deadline"
+                break
+            if future_acr in done: acr_result = self._future_value(future_acr, {"status": "error"})
+            if future_scribe in done: scribe_result = self._future_value(future_scribe, None)
+
+        self.arbitration_stats[outcome] += 1
+        if outcome == "early":
+            print(f"⚡ [Arbitraggio] ACR sicuro ({acr_result['tracks'][0].get('score')}%): decido senza attendere Scribe.")
+        elif outcome == "deadline":
+            print(f"⏱️ [Arbitraggio] Scadenza di {self.overlap_interval}s: decido con le risposte disponibili.")
+
+        # Stato del voto della finestra: le risposte tardive possono solo confermare (fast track) o correggere
+        window = {"vote": None}
+        self._decide(acr_result or {"status": "pending"}, scribe_result, window)
+
+        for future in pending:
+            kind = "acr" if future is future_acr else "scribe"
+            future.add_done_callback(partial(self._on_late_result, kind, acr_result, scribe_result, window))
+
+    # Risposta arrivata dopo la decisione: conferma o correzione della finestra (mai un secondo voto di stabilità)
+    def _on_late_result(self, kind, acr_result, scribe_result, window, future):
+        if not self.is_running: return
+        if kind == "scribe":
+            late_scribe = self._future_value(future, None)
+            # Solo una trascrizione affidabile può confermare o correggere la decisione di ACR
+            if not late_scribe or late_scribe.get("score", 0) <= 65: return
+            self.arbitration_stats["late_scribe"] += 1
+            print(f"📝 [Scribe tardivo] {late_scribe['title']} ({late_scribe['score']}%): ri-arbitraggio.")
+            self._decide(acr_result or {"status": "pending"}, late_scribe, window)
+        else:
+            late_acr = self._future_value(future, {"status": "error"})
+            if late_acr.get("status") != "multiple_results": return
+            self.arbitration_stats["late_acr"] += 1
+            self._decide(late_acr, scribe_result, window)
 
-                display_title = self._clean_title_for_display(final_track["title"])
-                
-                # CASO FAST TRACK: INVIO IMMEDIATO SENZA CONTROLLO STABILITÀ (conferma reciproca molto forte)
-                if is_fast_track:
-                      if self.result_callback:
-                        final_data = final_track.copy()
-                        final_data["title"] = display_title
-                        final_data["artist"] = self._get_artist_name(final_track)
-                        self.result_callback(final_data, target_artist=self.target_artist_bias)
-                        self.history_buffer.clear() # Reset stabilità
-                        
-                        # Veggente (prevede il prossimo brano basato su scaletta e contesto)
-                        self._update_prediction(display_title)
-                        return
-
-                # CASO NORMALE: CONTROLLO DI STABILITÀ (Ho bisognp di un'ulteriore conferma per evitare falsi positivi)
-                current_obj = {
-                    "title": final_track["title"],
-                    "artist": self._get_artist_name(final_track),
-                    "duration_ms": final_track.get("duration_ms", 0),
-                }
-                
-                self.history_buffer.append(current_obj)
-                
-                stability_count = 0
-                for historical_item in self.history_buffer:
-                    if self._are_tracks_equivalent(current_obj, historical_item):
-                        stability_count += 1
-                
-                # Soglia standard di stabilità (2 conferme nelle ultime 10 rilevazioni)
-                threshold = 2
-
-                if stability_count >= threshold:
-                    print(f"🛡️ Conferma stabilità ({stability_count}/{threshold}): {display_title}")
-                    if self.result_callback:
-                        final_data = final_track.copy()
-                        final_data["title"] = display_title
-                        final_data["artist"] = self._get_artist_name(final_track)
-                        
-                        if not final_data.get("cover"):
-                            final_data["cover"] = self._extract_best_cover(final_data)
+    def _is_acr_confident(self, acr_result):
+        if not acr_result or acr_result.get("status") != "multiple_results": return False
+        return acr_result["tracks"][0].get("score", 0) >= self.acr_confident_score
 
-                        self.result_callback(final_data, target_artist=self.target_artist_bias)
-                        
-                        # Veggente (aggiorno predizione)
-                        self._update_prediction(display_title)
-                        
+    def _future_value(self, future, default):
+        try:
+            return future.result()
         except Exception as e:
-            print(f"❌ Errore processamento window: {e}")
-        finally:
-            self.upload_lock.release()
+            print(f"❌ Errore riconoscimento: {e}")
+            return default
+
+    # Arbitraggio serializzato (la finestra corrente e i risultati tardivi possono arrivare insieme)
+    def _decide(self, acr_result, scribe_result, window=None):
+        with self.arbitration_lock:
+            self._arbitrate_window(acr_result, scribe_result, window)
+
+    # FASE 3: arbitraggio, stabilità e callback (sequenziale, nell'ordine delle finestre)
+    # 'window' = stato del voto della finestra ({"vote": None}), condiviso con le sue risposte tardive
+    def _arbitrate_window(self, acr_result, scribe_result, window=None):
+        vote = window["vote"] if window is not None else None
+        if vote == "fast": return # Finestra già confermata in fast track
+        final_track = None
+        is_fast_track = False 
+        
+        # Parsing ACR
+        acr_best = None
+        acr_score = 0
+        if acr_result.get("status") == "multiple_results":
+            acr_best = acr_result["tracks"][0]
+            acr_score = acr_best.get("score", 0)
+
+        scribe_score = scribe_result.get("score", 0) if scribe_result else 0
+
+        # DECISIONE FINALE: ARBITRAGGIO TRA ACR E SCRIBE
+
+        # A. FAST TRACK (Conferma Reciproca Assoluta)
+        if scribe_result and acr_best:
+            if scribe_score > 75 and acr_score > 98:
+                if self._are_tracks_equivalent(scribe_result, acr_best):
+                    print(f"⚡ [FAST TRACK] Match Assoluto! Scribe ({scribe_score}%) + ACR ({acr_score}%)")
+                    final_track = scribe_result
+                    final_track["external_metadata"] = acr_best.get("external_metadata")
+                    final_track["cover"] = acr_best.get("cover")
+                    is_fast_track = True
+
+        # B. STANDARD (Scribe affidabile o ACR come backup)
+        if not final_track:
+            # Caso 1: Scribe è molto affidabile (>65%). VINCE LUI.
+            if scribe_result and scribe_score > 65:
+                print(f"🥇 [SCRIBE WIN] Analisi Testuale ({scribe_score}%) ha priorità.")
+                final_track = scribe_result
+                # Arricchimento dati da ACR se disponibile
+                if acr_best and self._are_tracks_equivalent(scribe_result, acr_best):
+                    final_track["external_metadata"] = acr_best.get("external_metadata")
+                    final_track["cover"] = acr_best.get("cover")
+
+            # Caso 2: Scribe assente, usiamo ACRCloud classico
+            elif acr_best:
+                print(f"🔊 [ACR WIN] Audio Fingerprint: {acr_best['title']} ({acr_score}%)")
+                final_track = acr_best
+
+        # --- INVIO DATI E STABILITÀ ---
+        if final_track:
+            # Filtro Latin (I brani con titoli non Latin rsono spesso falsi positivi, meglio scartarli per stabilità)
+            if not self._is_mostly_latin(final_track["title"]):
+                print(f"🐉 Scartato brano non-Latin: {final_track['title']}")
+                return
+
+            display_title = self._clean_title_for_display(final_track["title"])
+            
+            # CASO FAST TRACK: INVIO IMMEDIATO SENZA CONTROLLO STABILITÀ (conferma reciproca molto forte)
+            if is_fast_track:
+                  if self.result_callback:
+                    final_data = final_track.copy()
+                    final_data["title"] = display_title
+                    final_data["artist"] = self._get_artist_name(final_track)
+                    self.result_callback(final_data, target_artist=self.target_artist_bias)
+                    self.stability.reset() # Reset stabilità
+                    if window is not None: window["vote"] = "fast"
+                    self.audio_gate.mark_identified()
+                    
+                    # Veggente (prevede il prossimo brano basato su scaletta e contesto)
+                    self._update_prediction(display_title)
+                    return
+
+            # CASO NORMALE: CONTROLLO DI STABILITÀ (Ho bisognp di un'ulteriore conferma per evitare falsi positivi)
+            current_obj = {
+                "title": final_track["title"],
+                "artist": self._get_artist_name(final_track),
+                "duration_ms": final_track.get("duration_ms", 0),
+                "acrid": final_track.get("acrid"),
+                "isrc": final_track.get("isrc"),
+            }
+            
+            # Voto alla chiave canonica (equivale a 2 conferme nelle ultime 10 rilevazioni).
+            # Finestra che ha già votato (risposta tardiva): stesso brano -> nessun nuovo voto, brano diverso -> il voto si sposta
+            if vote and vote["key"] == self.stability.canonical_key(current_obj): return
+            if vote:
+                key, stability_score = self.stability.move_vote(vote["key"], vote["step"], current_obj)
+                print(f"🔁 [Stabilità] Voto della finestra corretto: {display_title}")
+            else:
+                key, stability_score = self.stability.add(current_obj)
+            if window is not None: window["vote"] = {"key": key, "step": vote["step"] if vote else self.stability.step}
+
+            if self.stability.is_stable(stability_score):
+                print(f"🛡️ Conferma stabilità ({stability_score:.2f}/{self.stability.threshold}): {display_title}")
+                if self.result_callback:
+                    final_data = final_track.copy()
+                    final_data["title"] = display_title
+                    final_data["artist"] = self._get_artist_name(final_track)
+                    
+                    if not final_data.get("cover"):
+                        final_data["cover"] = self._extract_best_cover(final_data)
+
+                    self.result_callback(final_data, target_artist=self.target_artist_bias)
+                    self.audio_gate.mark_identified()
+                    
+                    # Veggente (aggiorno predizione)
+                    self._update_prediction(display_title)
 
     # LOGICA VEGGENTE (PREDIZIONE PROSSIMO BRANO IN BASE A SCALETTA E CONTESTO)
     def _update_prediction(self, current_title):
         """Helper per aggiornare il Veggente"""
         clean_title_pred = self._clean_title_for_display(current_title)
-        next_prediction = self.setlist_bot.predict_next(clean_title_pred)
-        if next_prediction:
-            self.predicted_next_song = next_prediction
-            print(f"🔮 [VEGGENTE] Riconosciuto '{current_title}'. Mi aspetto '{next_prediction}' tra poco!")
+        if not self.recent_titles or self.recent_titles[-1] != clean_title_pred:
+            self.recent_titles.append(clean_title_pred)
+        previous_title = self.recent_titles[0] if len(self.recent_titles) == 2 else None
+
+        predictions = self.setlist_bot.predict_next(clean_title_pred, previous_title)
+        if predictions:
+            top_probability = predictions[0][2]
+            self.predicted_next_songs = {sid: (title, p / top_probability) for title, sid, p in predictions}
+            print(f"🔮 [VEGGENTE] Riconosciuto '{current_title}'. Mi aspetto '{predictions[0][0]}' tra poco!")
         else:
-            self.predicted_next_song = None
+            self.predicted_next_songs = {}
+
+    # Pre-riscaldamento delle connessioni (ACR, ElevenLabs, Spotify) nel pool HTTP condiviso
+    def prewarm_connections(self):
+        urls = [self.acr_endpoint or (f"https://{self.host}" if self.host else None)]
+        if self.lyrics_bot.elevenlabs_key: urls.append(self.lyrics_bot.scribe_url)
+        if self.spotify_bot and self.spotify_bot.sp: urls.extend(SPOTIFY_URLS)
+        return self.http.prewarm(urls)
+
+    # Statistiche della pipeline di riconoscimento (per monitoraggio e debug)
+    def get_pipeline_stats(self):
+        return {
+            "gate": dict(self.audio_gate.stats),
+            "scheduler": dict(self.window_scheduler.stats),
+            "quality": self.quality.stats(),
+            "cache": self.recognition_cache.get_stats(),
+            "http": self.http.get_stats(),
+            "arbitration": dict(self.arbitration_stats),
+            "scribe": self.scribe_scheduler.get_stats(),
+            "stability": {**self.stability.stats, "top": self.stability.explain()},
+            "normalize": cache_stats(),
+            "whitelist": dict(self.setlist_bot.whitelist.stats),
+            "context_store": get_context_store().get_stats(),
+            "lyrics_catalog": self.lyrics_bot.catalog.get_stats(),
+            "genius": self.lyrics_bot.genius_limiter.get_stats(),
+            "context": {"ready": self.context_ready, "version": self.context_version,
+                        "stages": dict(self.context_stages), "jobs": dict(self.context_jobs)},
+        }
 
     # Logica del ciclo di monitoraggio: ogni X secondi (con dinamica di rete) processa una finestra di audio e lancia l'analisi
     def _loop_logic(self):
         print("⏱️ Avvio ciclo di monitoraggio dinamico...")
         time.sleep(self.window_duration)
         while self.is_running:
-            threading.Thread(target=self._process_window).start()
+            # La finestra scade se non parte entro il ciclo successivo (sarebbe comunque superata)
+            self.window_scheduler.submit(deadline_s=self.overlap_interval)
             time.sleep(self.overlap_interval)
 
+    # Reset dello stato della pipeline (buffer, stabilità, qualità) all'avvio di una sessione
+    def _reset_pipeline_state(self, callback_function, target_artist):
+        self.result_callback = callback_function
+        self.target_artist_bias = target_artist
+        self.audio_buffer.clear()
+        self.preprocessor.reset()
+        self.stability.reset()
+        self.recent_titles.clear()
+        self.recognition_cache.clear() # L'orologio audio riparte da zero
+        self.quality.reset()
+        self._apply_quality_level()
+        self.scribe_scheduler.reset()
+
     # Avvio del monitoraggio
     def start_continuous_recognition(self, callback_function, target_artist=None):
         if self.is_running: return False
+        if sd is None:
+            print("❌ sounddevice/PortAudio non disponibile: cattura live impossibile.")
+            return False
         self.is_running = True
-        self.result_callback = callback_function
-        self.target_artist_bias = target_artist
-        self.audio_buffer.clear()
-        self.history_buffer.clear()
-        self.low_quality_mode = False
-        self.overlap_interval = 6
-        self.cycle_counter = 0
+        self._reset_pipeline_state(callback_function, target_artist)
+        self.prewarm_connections()
 
         self.stream = sd.InputStream(
             samplerate=self.sample_rate, channels=1,
             blocksize=self.block_size, callback=self._audio_callback,
         )
         self.stream.start()
+        self.window_scheduler.start()
         self.monitor_thread = threading.Thread(target=self._loop_logic)
         self.monitor_thread.daemon = True
         self.monitor_thread.start()
@@ -364,53 +668,113 @@ class AudioManager:
     # Metodo per fermare il monitoraggio continuo e liberare risorse
     def stop_continuous_recognition(self):
         self.is_running = False
+        self.window_scheduler.stop()
         if self.stream:
             self.stream.stop()
             self.stream.close()
         print("🛑 Monitoraggio Fermato.")
         return True
 
+    # MODALITÀ REPLAY: analisi offline di registrazioni (stessa pipeline, orologio simulato)
+    def run_offline_replay(self, path, callback_function, target_artist=None, parallelism=1, context_timeout=120):
+        """
+        Fa scorrere uno o più file audio (WAV/FLAC) attraverso buffer, gate, riconoscimento e arbitraggio
+        senza attendere il tempo reale: una finestra ogni 'overlap_interval' secondi di AUDIO.
+        Fino a 'parallelism' finestre possono avere le chiamate API in volo contemporaneamente,
+        mentre l'arbitraggio resta sequenziale e nell'ordine delle finestre.
+        Anche le decisioni su Scribe (observe/plan/acquire dello scheduler) avvengono nel thread principale
+        in ordine di finestra: a parità di 'parallelism' il replay è deterministico. Con parallelism > 1
+        il piano della finestra N vede l'esito ACR delle finestre già arbitrate (fino a N - parallelism),
+        quindi le scelte possono differire da quelle con parallelism 1.
+        Ogni risultato passato alla callback contiene 'replay_file' e 'replay_offset_s'.
+        """
+        if self.is_running: return None
+        files = list_audio_files(path)
+
+        # Con un artista target attendiamo il contesto (whitelist/scalette), come farebbe il prefetch live
+        if target_artist:
+            self.update_target_artist(target_artist)
+            waited = 0.0
+            while not self.context_ready and waited < context_timeout:
+                time.sleep(0.5)
+                waited += 0.5
+
+        summary = {"files": 0, "windows": 0, "callbacks": 0, "audio_seconds": 0.0, "elapsed_seconds": 0.0}
+        position = {"file": None, "offset_s": None}
+        start_time = time.time()
+
+        def annotated_callback(data, target_artist=None):
+            data["replay_file"] = position["file"]
+            data["replay_offset_s"] = position["offset_s"]
+            summary["callbacks"] += 1
+            callback_function(data, target_artist=target_artist)
+
+        # Arbitraggio in ordine delle finestre completate, lasciandone al massimo 'limit' in volo
+        def drain(in_flight, limit):
+            while len(in_flight) > limit:
+                offset_s, job, future = in_flight.popleft()
+                position["offset_s"] = offset_s
+                try:
+                    acr_result, scribe_result = future.result()
+                    # Scribe dopo ACR deciso qui, nell'ordine delle finestre (scheduler deterministico)
+                    late_scribe = self._scribe_after_acr(job, acr_result)
+                    if late_scribe: scribe_result = self._future_value(late_scribe, None)
+                    self._arbitrate_window(acr_result, scribe_result)
+                except Exception as e:
+                    print(f"❌ [Replay] Errore finestra a {offset_s}s: {e}")
+
+        self.is_running = True
+        replay_pool = ThreadPoolExecutor(max_workers=max(1, parallelism))
+        try:
+            for file_path in files:
+                try:
+                    source = AudioFileSource(file_path, self.sample_rate, self.block_size)
+                except Exception as e:
+                    print(f"⚠️ [Replay] File ignorato {file_path}: {e}")
+                    continue
+
+                print(f"🎞️ [Replay] {os.path.basename(file_path)} ({source.duration_s / 60:.1f} min)")
+                self._reset_pipeline_state(annotated_callback, target_artist)
+                position["file"] = file_path
+                in_flight = deque()
+                next_window_at = self.sample_rate * self.window_duration
+
+                for block in source:
+                    self.audio_buffer.write(block)
+                    if self.audio_buffer.total_written < next_window_at: continue
+
+                    # Orologio simulato: l'intervallo segue comunque l'adattamento di rete
+                    next_window_at += self.sample_rate * self.overlap_interval
+                    job = self._prepare_window()
+                    if not job: continue
+                    summary["windows"] += 1
+                    offset_s = round(self.audio_buffer.total_written / self.sample_rate, 1)
+                    in_flight.append((offset_s, job, replay_pool.submit(self._recognize_window, job)))
+                    drain(in_flight, parallelism - 1)
+
+                drain(in_flight, 0)
+                summary["files"] += 1
+                summary["audio_seconds"] += round(source.duration_s, 1)
+        finally:
+            replay_pool.shutdown(wait=True)
+            self.is_running = False
+
+        summary["elapsed_seconds"] = round(time.time() - start_time, 1)
+        print(f"🏁 [Replay] {summary['files']} file, {summary['windows']} finestre in {summary['elapsed_seconds']}s.")
+        return summary
+
     # Funzioni di supporto per pulizia e confronto titoli
     # La normalizzazione per confronto è più aggressiva, rimuove praticamente tutto tranne lettere e numeri, per massimizzare la stabilità del confronto
     def _normalize_text(self, text):
-        if not text: return ""
-        platform_patterns = r"(?i)\b(amazon\s+music|apple\s+music|spotify|deezer|youtube|vevo)\b.*"
-        text = re.sub(platform_patterns, "", text)
-        clean = re.sub(r"[\(\[].*?[\)\]]", "", text)
-        clean = re.sub(r"(?i)\b(feat\.|ft\.|remix|edit|version|karaoke|live|mixed|spanish|italian)\b.*", "", clean)
-        clean = unicodedata.normalize("NFD", clean).encode("ascii", "ignore").decode("utf-8")
-        clean = re.sub(r"[^a-zA-Z0-9\s]", "", clean)
-        return clean.strip().lower()
+        return normalize_title(text)
 
     # Versione più leggera, per confronto parziale
     def _normalize_for_match(self, text):
-        if not text: return ""
-        clean = unicodedata.normalize("NFD", text).encode("ascii", "ignore").decode("utf-8")
-        clean = re.sub(r"[^a-zA-Z0-9\s]", "", clean)
-        return clean.strip().lower()
+        return normalize_for_match(text)
 
     # La pulizia per display rimuove le parole chiave di rumore più comuni e qualsiasi cosa tra parentesi che contiene parole chiave di rumore, ma cerca di mantenere il titolo il più leggibile possibile per l'utente
     def _clean_title_for_display(self, text):
-        if not text: return ""
-        junk_keywords = [
-            "live", "remix", "edit", "club", "mix", "extended", "version", 
-            "remaster", "re-master", "feat", "ft.", "karaoke", "instrumental", 
-            "acoustic", "demo", "session", "registrazione", "mono", "stereo",
-            "amazon music", "amazon original", "apple music", "spotify singles", 
-            "spotify", "deezer", "youtube", "vevo", "presents", "exclusive"
-        ]
-        def clean_parens(match):
-            content = match.group(1).lower()
-            if any(k in content for k in junk_keywords): return "" 
-            return match.group(0)
-
-        text = re.sub(r"\s*[\(\[](.*?)[\)\]]", clean_parens, text)
-        parts = text.split(" - ")
-        if len(parts) > 1:
-            last_part = parts[-1].lower()
-            if any(k in last_part for k in junk_keywords):
-                text = " - ".join(parts[:-1])
-        return text.strip()
+        return clean_for_display(text)
 
     # Rimozione brani non latin
     def _is_mostly_latin(self, text):
@@ -430,7 +794,7 @@ class AudioManager:
     def _are_tracks_equivalent(self, t1, t2):
         tit1 = self._normalize_text(t1["title"])
         tit2 = self._normalize_text(t2["title"])
-        similarity = SequenceMatcher(None, tit1, tit2).ratio()
+        similarity = ratio(tit1, tit2, score_cutoff=0.60)
         if similarity > 0.90: return True
         
         art1 = self._normalize_text(self._get_artist_name(t1))
@@ -459,9 +823,10 @@ class AudioManager:
         return None
 
     # Chiamata all'API ACRCloud con gestione dinamica della qualità in base alla latenza di rete, e logica di boost per bias artistico, scaletta e predizione
-    def _call_acr_api(self, audio_buffer, bias_artist=None):
+    def _call_acr_api(self, payload, bias_artist=None):
         THRESHOLD_MUSIC = 72
         THRESHOLD_HUMMING = 72
+        PREDICTION_BOOST = 80   # Boost pieno per il brano più probabile, proporzionale per gli altri
 
         http_method = "POST"
         http_uri = "/v1/identify"
@@ -471,11 +836,9 @@ class AudioManager:
         string_to_sign = http_method + "\n" + http_uri + "\n" + self.access_key + "\n" + data_type + "\n" + signature_version + "\n" + timestamp
         sign = base64.b64encode(hmac.new(self.access_secret.encode("ascii"), string_to_sign.encode("ascii"), digestmod=hashlib.sha1).digest()).decode("ascii")
 
-        buffer_content = audio_buffer.getvalue()
-        files = {"sample": ("temp.wav", buffer_content, "audio/wav")}
         data = {
             "access_key": self.access_key,
-            "sample_bytes": len(buffer_content),
+            "sample_bytes": len(payload),
             "timestamp": timestamp,
             "signature": sign,
             "data_type": data_type,
@@ -483,21 +846,18 @@ class AudioManager:
         }
 
         start_time = time.time()
+        latency_recorded = False
         try:
-            response = self.session.post(f"https://{self.host}/v1/identify", files=files, data=data, timeout=12)
+            url = self.acr_endpoint or f"https://{self.host}{http_uri}"
+            # Corpo multipart in streaming direttamente dai campioni (nessuna copia dell'audio)
+            body, content_type = payload.multipart("sample", "temp.wav", fields=data)
+            response = self.http.post(url, data=body, headers={"Content-Type": content_type}, timeout=12)
             elapsed = time.time() - start_time
 
-            # Adattamento dinamico alla qualità in base alla latenza di rete
-            if elapsed > 4.5:
-                if not self.low_quality_mode:
-                    print(f"🐌 Rete lenta ({elapsed:.1f}s) -> Attivo LowQ e Rallento a 10s.")
-                    self.low_quality_mode = True
-                    self.overlap_interval = 10 
-            elif elapsed < 2.0:
-                if self.low_quality_mode:
-                    print(f"🚀 Rete veloce ({elapsed:.1f}s) -> HighQ e Accelero a 6s.")
-                    self.low_quality_mode = False
-                    self.overlap_interval = 6
+            # Adattamento dinamico alla qualità in base alla latenza di rete (applicato dal ciclo successivo).
+            # 429 e altri 4xx contano come errori: una risposta rapida ma rifiutata non deve far salire la qualità
+            self.quality.record(elapsed, ok=response.ok)
+            latency_recorded = True
 
             result = response.json()
             status_code = result.get("status", {}).get("code")
@@ -509,17 +869,14 @@ class AudioManager:
                 def norm(sc): return int(float(sc) * 100) if float(sc) <= 1.0 else int(float(sc))
                 
                 # Logica di aggregazione: se più tracce sono molto simili tra loro (es. stesso titolo e artista con piccole variazioni), le considero la stessa traccia e prendo quella con il punteggio più alto, aggiungendo un piccolo boost per evitare di perdere risultati validi a causa di variazioni minori
+                # (chiave normalizzata esatta prima, confronto fuzzy solo tra tracce con la stessa prima parola del titolo)
                 def aggregate_tracks(raw_list):
                     grouped = []
-                    for t in raw_list:
-                        merged = False
-                        for g in grouped:
-                            if self._are_tracks_equivalent(t, g):
-                                existing_score = norm(g.get("score", 0))
-                                new_score = norm(t.get("score", 0))
-                                g["score"] = max(existing_score, new_score) + 5
-                                merged = True; break
-                        if not merged: grouped.append(t)
+                    for group in group_tracks(raw_list, self.stability.track_key, self._are_tracks_equivalent):
+                        g = group[0]
+                        for t in group[1:]:
+                            g["score"] = max(norm(g.get("score", 0)), norm(t.get("score", 0))) + 5
+                        grouped.append(g)
                     return grouped
 
                 # Logica di processamento per sezione (musica e humming): applico aggregazione, normalizzazione punteggio, boost per bias artistico, scaletta e predizione, e filtro finale per soglia
@@ -572,17 +929,17 @@ class AudioManager:
                                 applied_boost_type = "Artist Match"
 
                         # === 3. BOOST PREDIZIONE ===
-                        if self.predicted_next_song:
-                             if SequenceMatcher(None, title.lower(), self.predicted_next_song.lower()).ratio() > 0.85:
-                                 boost_amount = 80 
+                        predicted_songs = self.predicted_next_songs
+                        if predicted_songs:
+                             predicted = predicted_songs.get(self.setlist_bot.transitions.resolve(title))
+                             if predicted:
+                                 predicted_title, weight = predicted
+                                 boost_amount = round(PREDICTION_BOOST * weight)
                                  final_score += boost_amount
-                                 applied_boost_type = f"PREDICTION ({self.predicted_next_song})"
+                                 applied_boost_type = f"PREDICTION ({predicted_title}, {weight:.0%})"
 
                         # 4. Penalità ID o titoli generici (evitare falsi positivi)
-                        clean_check = re.sub(r"[\(\[].*?[\)\]]", "", title)
-                        clean_check = re.sub(r"(?i)\b(feat\.|ft\.|remix|edit|version|live|mixed|vip)\b.*", "", clean_check)
-                        clean_check = re.sub(r"[^a-zA-Z0-9]", "", clean_check).lower().strip()
-                        if re.match(r"^(id|track)\d*$", clean_check):
+                        if is_placeholder_title(title):
                             final_score -= (final_score * 0.30)
 
                         if boost_amount > 0:
@@ -599,6 +956,8 @@ class AudioManager:
                                 "duration_ms": t.get("duration_ms"),
                                 "external_metadata": t.get("external_metadata", {}),
                                 "contributors": t.get("contributors", {}),
+                                "acrid": t.get("acrid"),
+                                "isrc": (t.get("external_ids") or {}).get("isrc"),
                             })
 
                 if "music" in metadata: process_section(metadata["music"], THRESHOLD_MUSIC, "Original")
@@ -617,9 +976,8 @@ class AudioManager:
                 return {"status": "not_found"}
         except Exception as e:
             print(f"❌ Errore rete ACR: {e}")
-            if not self.low_quality_mode:
-                self.low_quality_mode = True
-                self.overlap_interval = 10
+            if not latency_recorded:
+                self.quality.record(time.time() - start_time, ok=False)
             return {"status": "error"}
 
 # TEST MANUALE
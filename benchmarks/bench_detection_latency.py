@@ -0,0 +1,478 @@
+"""
+Benchmark end-to-end della latenza di rilevamento.
+
+Fa scorrere registrazioni (o un concerto sintetico) dentro AudioManager in modalità replay,
+con ACRCloud e Scribe sostituiti da stand-in HTTP locali (latenza, errori e risposte configurabili).
+Misura per ogni brano:
+  - tempo alla prima conferma (secondi di audio dall'inizio del brano alla prima callback corretta)
+  - chiamate API (ACR / Scribe) spese sul brano
+e per l'intera esecuzione: CPU per finestra, crescita della memoria, conferme errate.
+L'output è JSON (schema_version) per confrontare le release; con --baseline segnala le regressioni
+(exit code 1).
+
+Ground truth (--truth, JSON): lista di segmenti
+  {"file": "concerto.wav", "start_s": 0, "end_s": 240, "title": "...", "artist": "...",
+   "score": 90, "lyrics": "...", "acrid": "...", "isrc": "...", "acr": [voci 'music' grezze, opzionale]}
+Le conferme si confrontano con il segmento vero per acrid/ISRC (o per titolo esatto se la callback non ne ha).
+Senza --truth ogni file è un solo brano, "Artista - Titolo.wav" come per l'indice fingerprint.
+
+Uso:  python benchmarks/bench_detection_latency.py --synthetic 6 --out bench.json
+      python benchmarks/bench_detection_latency.py registrazioni/ --truth truth.json --acr-latency-ms 900
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import scipy.io.wavfile as wav
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from service_standins import ServiceStandIn, TruthRegistry, acr_responder, scribe_responder, segment_ids
+
+SCHEMA_VERSION = 1
+
+# Metriche confrontate con la baseline: (percorso nel summary, True se "più alto è meglio")
+TRACKED_METRICS = [
+    ("detection_rate", True),
+    ("time_to_first_confirmation_s.median", False),
+    ("time_to_first_confirmation_s.p95", False),
+    ("acr_calls_per_song", False),
+    ("scribe_calls_per_song", False),
+    ("cpu_ms_per_window.mean", False),
+    ("memory.rss_growth_mb", False),
+]
+
+
+# --- CONCERTO SINTETICO ---
+# Titoli sintetici (nome + aggettivo): abbastanza diversi da non fondersi nel confronto fuzzy dei titoli
+_TITLE_NOUNS = ["Aurora", "Brezza", "Cometa", "Deserto", "Estate", "Fiume", "Giardino", "Lanterna",
+                "Marea", "Notte", "Orizzonte", "Pioggia", "Quercia", "Rondine", "Sentiero", "Tempesta"]
+_TITLE_ADJECTIVES = ["", "Lontana", "di Vetro", "Senza Nome", "d'Argento", "Sospesa"]
+
+
+def _synthetic_title(i):
+    noun = _TITLE_NOUNS[i % len(_TITLE_NOUNS)]
+    return f"{noun} {_TITLE_ADJECTIVES[(i // len(_TITLE_NOUNS)) % len(_TITLE_ADJECTIVES)]}".strip()
+
+
+def _synthetic_lyrics(rng, words=120):
+    syllables = ["la", "mo", "ri", "sen", "ta", "vo", "ce", "ne", "lu", "ra", "do", "mi", "ven", "to", "ca"]
+    return " ".join("".join(rng.choice(syllables, size=rng.integers(2, 4))) for _ in range(words))
+
+
+def build_synthetic_concert(directory, songs=6, song_seconds=60, gap_seconds=4, sample_rate=44100, seed=0):
+    """
+    Genera un WAV con 'songs' melodie armoniche distinte (scala pentatonica su tonica diversa),
+    separate da brevi pause di rumore, e la relativa ground truth con testi sintetici.
+    """
+    rng = np.random.default_rng(seed)
+    pentatonic = np.array([0, 2, 4, 7, 9])
+    parts, segments, cursor = [], [], 0.0
+    path = os.path.join(directory, "synthetic_concert.wav")
+
+    for i in range(songs):
+        root = 48 + (i * 5) % 12
+        melody = root + rng.choice(pentatonic, size=16) + 12 * rng.integers(0, 2, size=16)
+        note_len = rng.uniform(0.25, 0.45)
+        t = np.arange(int(note_len * sample_rate)) / sample_rate
+        envelope = np.minimum(1.0, t / 0.02) * np.exp(-2.5 * t)
+
+        notes = []
+        for midi in melody:
+            freq = 440.0 * 2 ** ((midi - 69) / 12)
+            tone = sum(np.sin(2 * np.pi * freq * h * t) / h for h in (1, 2, 3))
+            notes.append(tone * envelope)
+        phrase = np.concatenate(notes)
+        song = np.tile(phrase, int(np.ceil(song_seconds * sample_rate / len(phrase))))[:song_seconds * sample_rate]
+        song = 0.3 * song / np.max(np.abs(song)) + 0.01 * rng.standard_normal(len(song))
+
+        gap = 0.05 * rng.standard_normal(int(gap_seconds * sample_rate))
+        parts.extend([song, gap])
+        segments.append({
+            "file": os.path.basename(path), "start_s": round(cursor, 2), "end_s": round(cursor + song_seconds, 2),
+            "title": _synthetic_title(i), "artist": "Benchmark Artist",
+            "score": int(rng.integers(80, 100)), "lyrics": _synthetic_lyrics(rng),
+        })
+        cursor += song_seconds + gap_seconds
+
+    audio = np.concatenate(parts)
+    wav.write(path, sample_rate, (np.clip(audio, -1, 1) * 32767).astype(np.int16))
+    return path, segments
+
+
+def truth_from_filenames(files):
+    from fingerprint_manager import _parse_filename
+    from replay_source import AudioFileSource
+    segments = []
+    for path in files:
+        artist, title = _parse_filename(path)
+        duration = AudioFileSource(path, target_rate=44100).duration_s
+        segments.append({"file": os.path.basename(path), "start_s": 0.0, "end_s": duration,
+                         "title": title, "artist": artist})
+    return segments
+
+
+# --- MISURE ---
+def _rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _distribution(values):
+    if not values: return {"count": 0, "mean": None, "median": None, "p95": None, "max": None}
+    arr = np.asarray(values, dtype=float)
+    return {
+        "count": len(arr), "mean": round(float(arr.mean()), 3), "median": round(float(np.median(arr)), 3),
+        "p95": round(float(np.percentile(arr, 95)), 3), "max": round(float(arr.max()), 3),
+    }
+
+
+def _segment_at(segments, file_name, start_s, end_s):
+    """Segmento con la massima sovrapposizione con l'intervallo [start_s, end_s] del file."""
+    best, best_overlap = None, 0.0
+    for seg in segments:
+        if seg["file"] != file_name: continue
+        overlap = min(end_s, seg["end_s"]) - max(start_s, seg["start_s"])
+        if overlap > best_overlap:
+            best, best_overlap = seg, overlap
+    return best
+
+
+class Instrumentation:
+    """Avvolge le fasi della pipeline di AudioManager per misurare CPU, memoria e registrare i payload."""
+    def __init__(self, bot, segments, registry):
+        self.bot = bot
+        self.segments = segments
+        self.registry = registry
+        self.current_file = None
+        self.cycles = []          # Un elemento per ogni finestra valutata (inviata o scartata dal gate)
+        self.callbacks = []
+        self.rss_samples = []
+        self._thread_cpu = {}
+
+        self._orig_prepare = bot._prepare_window
+        self._orig_arbitrate = bot._arbitrate_window
+        self._orig_acr = bot._call_acr_api
+        self._orig_scribe = bot.lyrics_bot.transcribe_and_match
+        bot._prepare_window = self._prepare
+        bot._arbitrate_window = self._arbitrate
+        bot._call_acr_api = self._timed("acr", self._orig_acr)
+        bot.lyrics_bot.transcribe_and_match = self._timed("scribe", self._orig_scribe)
+
+    def _timed(self, label, fn):
+        def wrapper(payload, *args, **kwargs):
+            cpu_start = time.thread_time()
+            result = fn(payload, *args, **kwargs)
+            self._thread_cpu.setdefault(label, []).append(time.thread_time() - cpu_start)
+            return result
+        return wrapper
+
+    def _prepare(self):
+        cpu_start = time.thread_time()
+        job = self._orig_prepare()
+        cpu_ms = (time.thread_time() - cpu_start) * 1000
+
+        bot = self.bot
+        end_s = bot.audio_buffer.total_written / bot.sample_rate
+        segment = _segment_at(self.segments, self.current_file, end_s - bot.window_duration, end_s)
+        if job and segment:
+            self.registry.register(job["payload"].tobytes(), segment)
+
+        self.cycles.append({
+            "file": self.current_file, "offset_s": round(end_s, 2), "sent": job is not None,
+            "segment_id": segment["segment_id"] if segment else None, "cpu_prepare_ms": cpu_ms,
+        })
+        self.rss_samples.append(_rss_mb())
+        return job
+
+    def _arbitrate(self, acr_result, scribe_result, window=None):
+        cpu_start = time.thread_time()
+        self._orig_arbitrate(acr_result, scribe_result, window)
+        self._thread_cpu.setdefault("arbitrate", []).append(time.thread_time() - cpu_start)
+
+    def on_result(self, data, target_artist=None):
+        self.callbacks.append({
+            "file": os.path.basename(data.get("replay_file") or ""), "offset_s": data.get("replay_offset_s"),
+            "title": data.get("title"), "artist": data.get("artist"),
+            "type": data.get("type"), "score": data.get("score"),
+            "acrid": data.get("acrid"), "isrc": data.get("isrc"),
+        })
+
+    def stage_cpu_ms(self, label):
+        return [v * 1000 for v in self._thread_cpu.get(label, [])]
+
+
+# --- ESECUZIONE ---
+def run_benchmark(args):
+    workdir = tempfile.TemporaryDirectory(prefix="kyma_bench_")
+    try:
+        if args.synthetic:
+            concert, segments = build_synthetic_concert(workdir.name, args.synthetic, args.song_seconds, seed=args.seed)
+            files = [concert]
+        else:
+            from replay_source import list_audio_files
+            files = list_audio_files(args.path)
+            if args.truth:
+                with open(args.truth, "r", encoding="utf-8") as f:
+                    segments = json.load(f)
+            else:
+                segments = truth_from_filenames(files)
+        for i, seg in enumerate(segments):
+            seg["segment_id"] = i
+
+        # 1. Stand-in locali (prima di creare AudioManager: gli endpoint si leggono dall'ambiente)
+        registry = TruthRegistry()
+        acr = ServiceStandIn(
+            "acr", "/v1/identify", "sample", registry,
+            acr_responder(segments, args.acr_miss_rate, args.acr_confusion_rate, seed=args.seed),
+            args.acr_latency_ms, args.acr_jitter_ms, args.acr_error_rate, seed=args.seed,
+        )
+        scribe = ServiceStandIn(
+            "scribe", "/v1/speech-to-text", "file", registry,
+            scribe_responder(args.scribe_word_error, seed=args.seed),
+            args.scribe_latency_ms, args.scribe_jitter_ms, args.scribe_error_rate, seed=args.seed + 1,
+        )
+        os.environ.update({
+            "ACRCLOUD_ENDPOINT": acr.start(), "ACRCLOUD_ACCESS_KEY": "bench", "ACRCLOUD_SECRET_KEY": "bench",
+            "ELEVENLABS_SCRIBE_URL": scribe.start(), "ELEVENLABS_API_KEY": "bench",
+            "LOCAL_FP_INDEX": args.fingerprint_index or os.path.join(workdir.name, "no_index"),
+            "CONTEXT_DB_PATH": os.path.join(workdir.name, "context_store.db"),
+        })
+
+        from audio_manager import AudioManager
+        bot = AudioManager()
+        # Nessuna chiamata di rete reale: niente copertine Spotify durante il benchmark
+        bot.spotify_bot = None
+
+        # 2. Contesto artista precaricato dalla ground truth (whitelist + testi per Scribe)
+        artist = None if args.no_context else (args.artist or segments[0]["artist"])
+        if artist:
+            bot.target_artist_bias = artist
+            bot.setlist_bot.cached_songs = sorted({s["title"] for s in segments})
+            bot.context_ready = True
+            lyrics = bot.lyrics_bot
+            lyrics.current_artist = artist
+            for seg in segments:
+                if seg.get("lyrics"):
+                    key = lyrics._normalize_text(seg["title"])
+                    lyrics.lyrics_cache[key] = seg["lyrics"].lower()
+                    lyrics.titles_map[key] = seg["title"]
+
+        probe = Instrumentation(bot, segments, registry)
+        if args.tracemalloc: tracemalloc.start()
+        rss_start = _rss_mb()
+        cpu_start = time.process_time()
+        wall_start = time.time()
+        audio_seconds = 0.0
+
+        # 3. Replay (un file alla volta, per sapere a quale file appartiene ogni finestra)
+        for path in files:
+            probe.current_file = os.path.basename(path)
+            summary = bot.run_offline_replay(path, probe.on_result, target_artist=artist, parallelism=args.parallel)
+            audio_seconds += (summary or {}).get("audio_seconds", 0.0)
+
+        wall_elapsed = time.time() - wall_start
+        process_cpu = time.process_time() - cpu_start
+        heap_growth_mb = None
+        if args.tracemalloc:
+            heap_growth_mb = round(tracemalloc.get_traced_memory()[0] / 2 ** 20, 2)
+            tracemalloc.stop()
+
+        acr.stop()
+        scribe.stop()
+        return _build_report(args, bot, segments, probe, acr, scribe, {
+            "audio_seconds": round(audio_seconds, 1), "wall_seconds": round(wall_elapsed, 2),
+            "process_cpu_seconds": round(process_cpu, 3), "rss_start_mb": rss_start,
+            "heap_growth_mb": heap_growth_mb,
+        })
+    finally:
+        workdir.cleanup()
+
+
+def _truth_index(segments, normalize):
+    """Indici della ground truth: id forte (acrid/ISRC) -> segment_id e titolo|artista normalizzati -> segment_id."""
+    by_id, by_name = {}, {}
+    for seg in segments:
+        ids = set(segment_ids(seg))
+        names = {(seg["title"], seg["artist"])}
+        for entry in seg.get("acr") or []:
+            ids.update(filter(None, (entry.get("acrid"), (entry.get("external_ids") or {}).get("isrc"))))
+            names.add((entry.get("title"), ((entry.get("artists") or [{}])[0]).get("name") or seg["artist"]))
+        for strong_id in ids: by_id.setdefault(str(strong_id).upper(), set()).add(seg["segment_id"])
+        for title, artist in names:
+            by_name.setdefault(f"{normalize(title)}|{normalize(artist)}", set()).add(seg["segment_id"])
+    return by_id, by_name
+
+
+def _build_report(args, bot, segments, probe, acr, scribe, run):
+    by_id, by_name = _truth_index(segments, bot._normalize_text)
+
+    # Brani della ground truth a cui corrisponde una callback: per id forte, altrimenti (Scribe) per titolo esatto
+    def resolve(callback):
+        matches = set()
+        for strong_id in (callback.get("acrid"), callback.get("isrc")):
+            if strong_id: matches |= by_id.get(str(strong_id).upper(), set())
+        if matches: return matches
+        return by_name.get(f"{bot._normalize_text(callback['title'])}|{bot._normalize_text(callback['artist'])}", set())
+
+    def same_track(callback, seg):
+        return seg["segment_id"] in resolve(callback)
+
+    songs, latencies, false_confirmations = [], [], 0
+    for cb in probe.callbacks:
+        truth = _segment_at(segments, cb["file"], cb["offset_s"] - bot.window_duration, cb["offset_s"])
+        if truth is None or not same_track(cb, truth):
+            false_confirmations += 1
+
+    for seg in segments:
+        confirmations = [
+            cb for cb in probe.callbacks
+            if cb["file"] == seg["file"] and seg["start_s"] < cb["offset_s"] <= seg["end_s"] + bot.window_duration
+            and same_track(cb, seg)
+        ]
+        first = confirmations[0]["offset_s"] if confirmations else None
+        ttfc = round(first - seg["start_s"], 2) if first is not None else None
+        if ttfc is not None: latencies.append(ttfc)
+        windows = [c for c in probe.cycles if c["segment_id"] == seg["segment_id"]]
+        songs.append({
+            "file": seg["file"], "title": seg["title"], "artist": seg["artist"],
+            "start_s": seg["start_s"], "end_s": seg["end_s"],
+            "confirmed": first is not None, "first_confirmation_s": first, "time_to_first_confirmation_s": ttfc,
+            "confirmations": len(confirmations),
+            "windows_evaluated": len(windows), "windows_sent": sum(1 for c in windows if c["sent"]),
+            "acr_calls": acr.calls_per_segment[seg["segment_id"]],
+            "scribe_calls": scribe.calls_per_segment[seg["segment_id"]],
+        })
+
+    # CPU per finestra: tutte le fasi della pipeline eseguite per quella finestra (thread_time, esclusi gli stand-in)
+    cycles = probe.cycles
+    stage_totals = {label: sum(probe.stage_cpu_ms(label)) for label in ("acr", "scribe", "arbitrate")}
+    prepare = [c["cpu_prepare_ms"] for c in cycles]
+    sent = max(1, sum(1 for c in cycles if c["sent"]))
+    per_window = [c["cpu_prepare_ms"] + (sum(stage_totals.values()) / sent if c["sent"] else 0) for c in cycles]
+    rss = probe.rss_samples or [run["rss_start_mb"]]
+    n_songs = max(1, len(segments))
+
+    summary = {
+        "songs": len(segments),
+        "confirmed": sum(1 for s in songs if s["confirmed"]),
+        "detection_rate": round(sum(1 for s in songs if s["confirmed"]) / n_songs, 3),
+        "false_confirmations": false_confirmations,
+        "time_to_first_confirmation_s": _distribution(latencies),
+        "acr_calls_per_song": round(sum(s["acr_calls"] for s in songs) / n_songs, 2),
+        "scribe_calls_per_song": round(sum(s["scribe_calls"] for s in songs) / n_songs, 2),
+        "windows_evaluated": len(cycles),
+        "windows_sent": sum(1 for c in cycles if c["sent"]),
+        "cpu_ms_per_window": _distribution(per_window),
+        "cpu_ms_by_stage": {
+            "prepare": _distribution(prepare),
+            **{label: _distribution(probe.stage_cpu_ms(label)) for label in ("acr", "scribe", "arbitrate")},
+        },
+        "process_cpu_ms_per_window": round(run["process_cpu_seconds"] * 1000 / max(1, len(cycles)), 2),
+        "memory": {
+            "rss_start_mb": round(run["rss_start_mb"], 1), "rss_end_mb": round(rss[-1], 1),
+            "rss_peak_mb": round(max(rss), 1), "rss_growth_mb": round(rss[-1] - run["rss_start_mb"], 1),
+            "heap_growth_mb": run["heap_growth_mb"],
+        },
+        "audio_seconds": run["audio_seconds"],
+        "wall_seconds": run["wall_seconds"],
+        "realtime_factor": round(run["audio_seconds"] / run["wall_seconds"], 1) if run["wall_seconds"] else None,
+    }
+
+    return {
+        "schema_version": SCHEMA_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": {"python": platform.python_version(), "platform": platform.platform(), "numpy": np.__version__},
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "baseline")},
+        "summary": summary,
+        "songs": songs,
+        "standins": {"acr": acr.stats, "scribe": scribe.stats},
+        "pipeline": bot.get_pipeline_stats(),
+    }
+
+
+# --- CONFRONTO CON BASELINE ---
+def _metric(summary, dotted):
+    value = summary
+    for part in dotted.split("."):
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+
+def compare_with_baseline(report, baseline, tolerance):
+    comparison, regressions = {}, []
+    for name, higher_is_better in TRACKED_METRICS:
+        current, previous = _metric(report["summary"], name), _metric(baseline.get("summary", {}), name)
+        if current is None or previous is None: continue
+        change = (current - previous) / abs(previous) if previous else (0.0 if current == previous else float("inf"))
+        worse = -change if higher_is_better else change
+        regression = worse > tolerance and abs(current - previous) > 1e-3
+        comparison[name] = {"baseline": previous, "current": current,
+                            "change_pct": round(change * 100, 1) if change != float("inf") else None,
+                            "regression": regression}
+        if regression: regressions.append(name)
+    return comparison, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", nargs="?", help="File audio o cartella di registrazioni")
+    parser.add_argument("--truth", help="Ground truth JSON (segmenti per file)")
+    parser.add_argument("--synthetic", type=int, default=0, help="Genera un concerto sintetico con N brani")
+    parser.add_argument("--song-seconds", type=int, default=60)
+    parser.add_argument("--artist", help="Artista target (default: quello della ground truth)")
+    parser.add_argument("--no-context", action="store_true", help="Modalità generica, senza artista né whitelist")
+    parser.add_argument("--parallel", type=int, default=1, help="Finestre con chiamate API in volo")
+    parser.add_argument("--fingerprint-index", help="Indice fingerprint locale da usare (default: nessuno)")
+    parser.add_argument("--acr-latency-ms", type=float, default=600)
+    parser.add_argument("--acr-jitter-ms", type=float, default=150)
+    parser.add_argument("--acr-error-rate", type=float, default=0.0)
+    parser.add_argument("--acr-miss-rate", type=float, default=0.1, help="Quota di risposte 'nessun risultato'")
+    parser.add_argument("--acr-confusion-rate", type=float, default=0.05, help="Quota di risposte con un brano sbagliato")
+    parser.add_argument("--scribe-latency-ms", type=float, default=1200)
+    parser.add_argument("--scribe-jitter-ms", type=float, default=300)
+    parser.add_argument("--scribe-error-rate", type=float, default=0.0)
+    parser.add_argument("--scribe-word-error", type=float, default=0.2, help="Quota di parole errate nella trascrizione")
+    parser.add_argument("--tracemalloc", action="store_true", help="Misura anche la crescita dell'heap Python")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="File JSON di output (default: stdout)")
+    parser.add_argument("--baseline", help="Report JSON di una release precedente da confrontare")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Peggioramento relativo tollerato")
+    args = parser.parse_args()
+
+    if not args.path and not args.synthetic:
+        parser.error("specificare un percorso audio oppure --synthetic N")
+
+    # I log della pipeline vanno su stderr: stdout resta JSON puro
+    with contextlib.redirect_stdout(sys.stderr):
+        report = run_benchmark(args)
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            report["comparison"], regressions = compare_with_baseline(report, json.load(f), args.tolerance)
+        if regressions:
+            print(f"📉 Regressioni rispetto alla baseline: {', '.join(regressions)}", file=sys.stderr)
+            exit_code = 1
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Micro-benchmark del ricampionamento 44.1kHz -> 8kHz usato in modalità Low Quality.
+
+Confronta:
+  - signal.resample (FFT sull'intera finestra, percorso precedente)
+  - resample_poly con coefficienti in cache (one-shot sulla finestra)
+  - StreamingResampler (solo i campioni nuovi di ogni ciclo, come in AudioManager)
+
+Uso:  python benchmarks/bench_resample.py [--window 12] [--interval 6] [--repeat 20]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from scipy import signal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from audio_dsp import StreamingResampler
+
+
+def _timeit(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return np.median(timings) * 1000, np.min(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=int, default=44100)
+    parser.add_argument("--target", type=int, default=8000)
+    parser.add_argument("--window", type=int, default=12, help="Durata finestra (s)")
+    parser.add_argument("--interval", type=int, default=6, help="Audio nuovo per ciclo (s)")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    window = rng.standard_normal((args.rate * args.window, 1)).astype(np.float32)
+    new_audio = window[-args.rate * args.interval:]
+    num_out = len(window) * args.target // args.rate
+
+    resampler = StreamingResampler(args.rate, args.target)
+    resampler.resample_window(window)  # Riscaldamento cache coefficienti
+
+    def fft_path():
+        signal.resample(window, num_out)
+
+    def poly_window_path():
+        resampler.resample_window(window)
+
+    def streaming_path():
+        resampler.process(new_audio)
+
+    results = [
+        ("signal.resample (FFT, finestra intera)", _timeit(fft_path, args.repeat)),
+        ("resample_poly (coeff. in cache, finestra)", _timeit(poly_window_path, args.repeat)),
+        (f"StreamingResampler ({args.interval}s nuovi/ciclo)", _timeit(streaming_path, args.repeat)),
+    ]
+
+    print(f"Finestra {args.window}s @ {args.rate}Hz -> {args.target}Hz, {args.repeat} ripetizioni")
+    baseline = results[0][1][0]
+    for label, (median_ms, min_ms) in results:
+        print(f"  {label:<45} mediana {median_ms:8.2f} ms  min {min_ms:8.2f} ms  (x{baseline / median_ms:.1f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Stand-in HTTP locali dei servizi di riconoscimento (ACRCloud /v1/identify ed ElevenLabs Scribe),
+usati dai benchmark al posto dei servizi reali.
+
+Ogni stand-in ha latenza (media + jitter), tasso di errore HTTP e risposte preconfezionate.
+I servizi reali riconoscono l'audio: qui invece l'harness registra in anticipo, per ogni payload WAV
+che la pipeline sta per inviare, il brano "vero" (ground truth) in quel punto della registrazione.
+Lo stand-in ritrova il brano dall'hash del payload ricevuto e risponde di conseguenza.
+"""
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import Counter
+from email import policy
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Chiave del payload (stessa per ACR e Scribe, che ricevono la stessa finestra)
+def payload_key(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+# Parsing di un corpo multipart/form-data -> {nome_campo: bytes}
+def parse_multipart(content_type, body):
+    message = BytesParser(policy=policy.default).parsebytes(
+        b"Content-Type: " + content_type.encode("latin-1") + b"\r\n\r\n" + body
+    )
+    fields = {}
+    if not message.is_multipart(): return fields
+    for part in message.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        if name: fields[name] = part.get_payload(decode=True) or b""
+    return fields
+
+
+class TruthRegistry:
+    """Associazione payload inviato -> segmento di ground truth (thread-safe)."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_key = {}
+
+    def register(self, payload, segment):
+        with self._lock:
+            self._by_key[payload_key(payload)] = segment
+
+    def lookup(self, payload):
+        with self._lock:
+            return self._by_key.get(payload_key(payload))
+
+
+class ServiceStandIn:
+    """
+    Server HTTP locale su porta effimera. 'responder(fields, segment)' restituisce (status_code, corpo_json).
+    Statistiche: richieste totali, errori iniettati e richieste per segmento (chiave 'segment_id').
+    """
+    def __init__(self, name, path, payload_field, registry, responder,
+                 latency_ms=300, jitter_ms=100, error_rate=0.0, seed=0):
+        self.name = name
+        self.path = path
+        self.payload_field = payload_field
+        self.registry = registry
+        self.responder = responder
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.url = None
+        self._server = None
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "injected_errors": 0, "unknown_payloads": 0}
+        self.calls_per_segment = Counter()
+
+    def start(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                status, payload = standin._handle(self.path, self.headers.get("Content-Type", ""), body)
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name=f"standin-{self.name}", daemon=True).start()
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}{self.path}"
+        return self.url
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def _handle(self, path, content_type, body):
+        if path != self.path:
+            return 404, {"error": "not found"}
+
+        fields = parse_multipart(content_type, body)
+        segment = self.registry.lookup(fields.get(self.payload_field, b""))
+        with self._lock:
+            self.stats["requests"] += 1
+            if segment is None: self.stats["unknown_payloads"] += 1
+            else: self.calls_per_segment[segment["segment_id"]] += 1
+            delay = max(0.0, self.rng.gauss(self.latency_ms, self.jitter_ms)) / 1000
+            inject_error = self.rng.random() < self.error_rate
+
+        time.sleep(delay)
+        if inject_error:
+            with self._lock: self.stats["injected_errors"] += 1
+            return 503, {"error": "stand-in: errore simulato"}
+        return self.responder(fields, segment)
+
+
+# --- RISPOSTE PRECONFEZIONATE ---
+# Identificativi forti (acrid, ISRC) del brano di un segmento: quelli della ground truth o derivati da segment_id
+def segment_ids(segment):
+    n = segment.get("segment_id", 0)
+    return segment.get("acrid") or f"standin{n:06d}", (segment.get("isrc") or f"ZZSTD26{n:05d}").upper()
+
+
+def acr_responder(segments, miss_rate=0.0, confusion_rate=0.0, seed=0):
+    """
+    Risposte stile ACRCloud. Un segmento può fornire la propria lista 'acr' (voci 'music' grezze),
+    altrimenti viene costruita da title/artist/score con acrid/ISRC distinti per segmento (segment_ids).
+    'confusion_rate' restituisce un altro brano.
+    """
+    rng = random.Random(seed)
+    lock = threading.Lock()
+
+    def _music_entry(segment):
+        if segment.get("acr"): return segment["acr"]
+        acrid, isrc = segment_ids(segment)
+        return [{
+            "acrid": acrid,
+            "title": segment["title"],
+            "artists": [{"name": segment["artist"]}],
+            "album": {"name": segment.get("album", "Stand-in")},
+            "score": segment.get("score", 90),
+            "duration_ms": int((segment["end_s"] - segment["start_s"]) * 1000),
+            "external_ids": {"isrc": isrc},
+            "external_metadata": {},
+        }]
+
+    def respond(fields, segment):
+        with lock:
+            roll = rng.random()
+            decoy = rng.choice(segments) if segments else None
+        if segment is None or roll < miss_rate:
+            return 200, {"status": {"code": 1001, "msg": "No result"}}
+        if roll < miss_rate + confusion_rate and decoy is not None and decoy is not segment:
+            segment = decoy
+        return 200, {"status": {"code": 0, "msg": "Success"}, "metadata": {"music": _music_entry(segment)}}
+
+    return respond
+
+
+def scribe_responder(word_error_rate=0.0, excerpt_words=16, seed=0):
+    """Risposte stile Scribe: estratto del testo del segmento con una quota di parole sbagliate."""
+    rng = random.Random(seed)
+    lock = threading.Lock()
+
+    def respond(fields, segment):
+        words = (segment or {}).get("lyrics", "").split()
+        if not words:
+            return 200, {"text": ""}
+        with lock:
+            start = rng.randrange(max(1, len(words) - excerpt_words + 1))
+            excerpt = [
+                "".join(rng.choice("aeioubcdfglmnprst") for _ in range(5)) if rng.random() < word_error_rate else w
+                for w in words[start:start + excerpt_words]
+            ]
+        return 200, {"text": " ".join(excerpt)}
+
+    return respond
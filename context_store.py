@@ -0,0 +1,124 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from text_normalize import normalize_for_match
+
+# Validità dei dati per sorgente (secondi): oltre il TTL il dato viene servito e aggiornato in background
+DEFAULT_TTLS = {
+    "setlist": 3 * 86400,     # Le scalette cambiano a ogni data del tour
+    "spotify": 7 * 86400,     # Hit e ultimo album
+    "lyrics": 30 * 86400,     # I testi non cambiano
+}
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "context_store.db")
+
+
+class ContextStore:
+    """
+    Archivio persistente (SQLite) del contesto per artista: scalette, catalogo Spotify, testi e lingua.
+    Chiave = (artista normalizzato, sorgente), valore JSON con timestamp di download.
+    Un artista già visto parte in millisecondi; i dati scaduti vengono comunque usati subito
+    e ricaricati in background (un solo aggiornamento alla volta per chiave).
+    """
+    def __init__(self, path=None, ttls=None):
+        self.path = path or os.getenv("CONTEXT_DB_PATH", DEFAULT_PATH)
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self.stats = {"hits": 0, "stale": 0, "misses": 0, "stores": 0, "refreshes": 0, "errors": 0}
+
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS artist_context ("
+            " artist TEXT NOT NULL, source TEXT NOT NULL, payload TEXT NOT NULL, fetched_at REAL NOT NULL,"
+            " PRIMARY KEY (artist, source))"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def artist_key(artist_name):
+        return " ".join(normalize_for_match(artist_name).split())
+
+    # Dato salvato: (valore, scaduto) oppure None
+    def get(self, artist_name, source):
+        key = self.artist_key(artist_name)
+        if not key: return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload, fetched_at FROM artist_context WHERE artist = ? AND source = ?", (key, source)
+            ).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            stale = time.time() - row[1] > self.ttls.get(source, 86400)
+            self.stats["stale" if stale else "hits"] += 1
+        return json.loads(row[0]), stale
+
+    def put(self, artist_name, source, value):
+        key = self.artist_key(artist_name)
+        if not key: return
+        payload = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO artist_context (artist, source, payload, fetched_at) VALUES (?, ?, ?, ?)",
+                (key, source, payload, time.time()),
+            )
+            self._conn.commit()
+            self.stats["stores"] += 1
+
+    # Lettura con ricarica: dato fresco -> subito; scaduto -> subito + refresh in background; assente -> loader()
+    def fetch(self, artist_name, source, loader):
+        cached = self.get(artist_name, source)
+        if cached is not None:
+            value, stale = cached
+            if stale: self.refresh_async(artist_name, source, loader)
+            return value
+        return self._load(artist_name, source, loader)
+
+    def _load(self, artist_name, source, loader):
+        try:
+            value = loader()
+        except Exception as e:
+            with self._lock: self.stats["errors"] += 1
+            print(f"⚠️ [Context Store] Errore caricamento {source} per '{artist_name}': {e}")
+            return None
+        # Risultati vuoti non vengono salvati (spesso sono errori temporanei delle API)
+        if value: self.put(artist_name, source, value)
+        return value
+
+    def refresh_async(self, artist_name, source, loader):
+        key = (self.artist_key(artist_name), source)
+        with self._lock:
+            if key in self._refreshing: return False
+            self._refreshing.add(key)
+            self.stats["refreshes"] += 1
+
+        def refresh():
+            try:
+                self._load(artist_name, source, loader)
+            finally:
+                with self._lock: self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, name=f"context-refresh-{source}", daemon=True).start()
+        return True
+
+    def get_stats(self):
+        with self._lock:
+            return {**self.stats, "refreshing": len(self._refreshing)}
+
+
+_shared_store = None
+_shared_lock = threading.Lock()
+
+
+# Istanza unica di processo (creata al primo utilizzo)
+def get_context_store():
+    global _shared_store
+    with _shared_lock:
+        if _shared_store is None:
+            _shared_store = ContextStore()
+        return _shared_store
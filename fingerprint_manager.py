@@ -0,0 +1,248 @@
+import os
+import sys
+import json
+import time
+import numpy as np
+import scipy.io.wavfile as wav
+from scipy import signal
+from scipy.ndimage import maximum_filter
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Parametri del fingerprint "a costellazione" (picchi dello spettrogramma -> coppie hashate)
+FP_SAMPLE_RATE = 11025
+FP_NPERSEG = 1024
+FP_HOP = 512
+PEAK_NEIGHBORHOOD = (21, 15)    # (bin di frequenza, frame) per il massimo locale
+PEAK_MIN_DB = 20.0              # Soglia minima sopra la media del brano (dB) per un picco
+FAN_OUT = 10                    # Quante coppie per ogni picco "ancora"
+MAX_DT = 63                     # Distanza massima (frame) tra ancora e target, 6 bit
+MAX_DF = 200                    # Distanza massima (bin) tra ancora e target
+
+# Soglie di confidenza del match locale
+MIN_ALIGNED_HASHES = 15
+MIN_CONFIDENCE = 0.75
+
+
+class FingerprintManager:
+    """
+    Motore di riconoscimento locale basato su landmark (stile Shazam).
+    L'indice su disco è invertito e compatto: un array ordinato di hash (uint32) con i relativi
+    id brano (uint16) e offset (uint32), caricati in memory-map. Viene consultato prima di ACRCloud:
+    per il repertorio già noto la risposta arriva in millisecondi e funziona anche offline.
+    """
+    def __init__(self, index_dir=None):
+        self.index_dir = index_dir or os.getenv("LOCAL_FP_INDEX", "fingerprint_index")
+        self.songs = []
+        self.hashes = np.zeros(0, dtype=np.uint32)
+        self.song_ids = np.zeros(0, dtype=np.uint16)
+        self.offsets = np.zeros(0, dtype=np.uint32)
+        self._load_index()
+
+    @property
+    def enabled(self):
+        return len(self.hashes) > 0
+
+    # --- INDICE SU DISCO ---
+    def _load_index(self):
+        songs_path = os.path.join(self.index_dir, "songs.json")
+        if not os.path.exists(songs_path):
+            print("⚪ [Fingerprint] Nessun indice locale trovato. Pre-filtro disattivato.")
+            return
+        try:
+            with open(songs_path, "r", encoding="utf-8") as f:
+                self.songs = json.load(f)
+            self.hashes = np.load(os.path.join(self.index_dir, "hashes.npy"), mmap_mode="r")
+            self.song_ids = np.load(os.path.join(self.index_dir, "song_ids.npy"), mmap_mode="r")
+            self.offsets = np.load(os.path.join(self.index_dir, "offsets.npy"), mmap_mode="r")
+            print(f"🗂️ [Fingerprint] Indice locale: {len(self.songs)} brani, {len(self.hashes)} hash.")
+        except Exception as e:
+            print(f"⚠️ [Fingerprint] Errore caricamento indice: {e}")
+            self.songs = []
+            self.hashes = np.zeros(0, dtype=np.uint32)
+
+    def _save_index(self, hashes, song_ids, offsets):
+        os.makedirs(self.index_dir, exist_ok=True)
+        order = np.argsort(hashes, kind="stable")
+        np.save(os.path.join(self.index_dir, "hashes.npy"), hashes[order])
+        np.save(os.path.join(self.index_dir, "song_ids.npy"), song_ids[order])
+        np.save(os.path.join(self.index_dir, "offsets.npy"), offsets[order])
+        with open(os.path.join(self.index_dir, "songs.json"), "w", encoding="utf-8") as f:
+            json.dump(self.songs, f, ensure_ascii=False, indent=1)
+
+    # Aggiunge registrazioni di riferimento all'indice (file WAV "Artista - Titolo.wav")
+    def add_recordings(self, paths):
+        # Copia in RAM dell'indice esistente (il file in memory-map verrà sovrascritto)
+        new_hashes = [np.array(self.hashes)]
+        new_ids = [np.array(self.song_ids)]
+        new_offsets = [np.array(self.offsets)]
+        self.hashes = self.song_ids = self.offsets = None
+        known_paths = {s.get("path") for s in self.songs}
+
+        for path in paths:
+            if path in known_paths: continue
+            try:
+                audio, rate = load_audio_file(path)
+            except Exception as e:
+                print(f"⚠️ [Fingerprint] File ignorato {path}: {e}")
+                continue
+
+            song_id = len(self.songs)
+            if song_id > np.iinfo(np.uint16).max:
+                print("⚠️ [Fingerprint] Indice pieno (65535 brani).")
+                break
+
+            h, t = self.fingerprint(audio, rate)
+            new_hashes.append(h)
+            new_ids.append(np.full(len(h), song_id, dtype=np.uint16))
+            new_offsets.append(t)
+
+            artist, title = _parse_filename(path)
+            self.songs.append({
+                "title": title, "artist": artist, "path": path,
+                "duration_ms": int(len(audio) / rate * 1000),
+            })
+            print(f"     ➕ [Fingerprint] {artist} - {title}: {len(h)} hash")
+
+        self._save_index(
+            np.concatenate(new_hashes).astype(np.uint32),
+            np.concatenate(new_ids).astype(np.uint16),
+            np.concatenate(new_offsets).astype(np.uint32),
+        )
+        self._load_index()
+
+    # --- FINGERPRINT ---
+    def fingerprint(self, audio, sample_rate):
+        """
+        Restituisce (hash, offset_ancora) per un segnale mono o (N, 1).
+        hash = f_ancora (10 bit) | f_target (10 bit) | dt (6 bit)
+        """
+        peaks_t, peaks_f = self._find_peaks(audio, sample_rate)
+        if len(peaks_t) < 2:
+            return np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.uint32)
+
+        hashes, anchors = [], []
+        for k in range(1, FAN_OUT + 1):
+            t1, f1 = peaks_t[:-k], peaks_f[:-k]
+            t2, f2 = peaks_t[k:], peaks_f[k:]
+            dt = t2 - t1
+            valid = (dt >= 1) & (dt <= MAX_DT) & (np.abs(f2 - f1) <= MAX_DF)
+            hashes.append((f1[valid] << 16) | (f2[valid] << 6) | dt[valid])
+            anchors.append(t1[valid])
+
+        return np.concatenate(hashes).astype(np.uint32), np.concatenate(anchors).astype(np.uint32)
+
+    def _find_peaks(self, audio, sample_rate):
+        mono = np.asarray(audio, dtype=np.float32)
+        if mono.ndim > 1: mono = mono.mean(axis=1)
+
+        if sample_rate != FP_SAMPLE_RATE:
+            mono = signal.resample_poly(mono, FP_SAMPLE_RATE, sample_rate)
+
+        _, _, spec = signal.spectrogram(
+            mono, fs=FP_SAMPLE_RATE, nperseg=FP_NPERSEG,
+            noverlap=FP_NPERSEG - FP_HOP, mode="magnitude"
+        )
+        log_spec = 20 * np.log10(spec + 1e-10)
+        local_max = maximum_filter(log_spec, size=PEAK_NEIGHBORHOOD) == log_spec
+        loud = log_spec > (log_spec.mean() + PEAK_MIN_DB)
+        freqs, times = np.nonzero(local_max & loud)
+
+        # Ordinamento temporale (necessario per formare le coppie)
+        order = np.lexsort((freqs, times))
+        return times[order].astype(np.int64), freqs[order].astype(np.int64)
+
+    # --- RICONOSCIMENTO ---
+    def identify(self, audio, sample_rate):
+        """
+        Cerca la finestra nell'indice locale. Restituisce un risultato nello stesso formato
+        di _call_acr_api ('multiple_results') solo se il match è sicuro, altrimenti None.
+        """
+        if not self.enabled: return None
+        start_time = time.time()
+
+        q_hashes, q_offsets = self.fingerprint(audio, sample_rate)
+        if len(q_hashes) == 0: return None
+
+        # Lookup vettoriale sull'array ordinato: per ogni hash della query, range [lo, hi) nell'indice
+        lo = np.searchsorted(self.hashes, q_hashes, side="left")
+        hi = np.searchsorted(self.hashes, q_hashes, side="right")
+        counts = hi - lo
+        if counts.sum() == 0: return None
+
+        hit_query = np.repeat(np.arange(len(q_hashes)), counts)
+        hit_index = np.repeat(lo - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+
+        hit_songs = np.asarray(self.song_ids)[hit_index].astype(np.int64)
+        deltas = np.asarray(self.offsets)[hit_index].astype(np.int64) - q_offsets[hit_query].astype(np.int64)
+
+        # Istogramma (brano, delta temporale): il picco indica l'allineamento
+        keys = (hit_songs << 32) | (deltas & 0xFFFFFFFF)
+        unique_keys, key_counts = np.unique(keys, return_counts=True)
+        key_songs = unique_keys >> 32
+
+        best_per_song = {}
+        for song, count in zip(key_songs.tolist(), key_counts.tolist()):
+            if count > best_per_song.get(song, 0):
+                best_per_song[song] = count
+
+        ranking = sorted(best_per_song.items(), key=lambda x: x[1], reverse=True)
+        best_song, best_count = ranking[0]
+        second_count = ranking[1][1] if len(ranking) > 1 else 0
+        confidence = best_count / (best_count + second_count)
+        elapsed_ms = (time.time() - start_time) * 1000
+
+        if best_count < MIN_ALIGNED_HASHES or confidence < MIN_CONFIDENCE:
+            return None
+
+        song = self.songs[best_song]
+        score = int(confidence * 100)
+        print(f"🗂️ [Fingerprint] Match locale: {song['title']} ({best_count} hash allineati, {score}%) in {elapsed_ms:.0f}ms")
+        return {"status": "multiple_results", "tracks": [{
+            "status": "success", "type": "Local Fingerprint",
+            "title": song["title"], "artist": song["artist"],
+            "album": song.get("album"), "cover": song.get("cover"), "score": score,
+            "duration_ms": song.get("duration_ms"),
+            "external_metadata": {}, "contributors": {},
+        }]}
+
+
+# Lettura file audio di riferimento (WAV) come float32 mono
+def load_audio_file(path):
+    rate, data = wav.read(path)
+    if np.issubdtype(data.dtype, np.integer):
+        data = data.astype(np.float32) / np.iinfo(data.dtype).max
+    else:
+        data = data.astype(np.float32)
+    if data.ndim > 1:
+        data = data.mean(axis=1)
+    return data, rate
+
+
+# "Artista - Titolo.wav" -> ("Artista", "Titolo")
+def _parse_filename(path):
+    name = os.path.splitext(os.path.basename(path))[0]
+    if " - " in name:
+        artist, title = name.split(" - ", 1)
+        return artist.strip(), title.strip()
+    return "Sconosciuto", name.strip()
+
+
+# COSTRUZIONE INDICE DA RIGA DI COMANDO
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Uso: python fingerprint_manager.py <cartella_o_file_wav> [...]")
+        sys.exit(1)
+
+    files = []
+    for arg in sys.argv[1:]:
+        if os.path.isdir(arg):
+            for root, _, names in os.walk(arg):
+                files.extend(os.path.join(root, n) for n in sorted(names) if n.lower().endswith(".wav"))
+        else:
+            files.append(arg)
+
+    bot = FingerprintManager()
+    bot.add_recordings(files)
+    print(f"✅ Indice aggiornato: {len(bot.songs)} brani.")
@@ -0,0 +1,72 @@
+from functools import lru_cache
+
+# Motore C opzionale: stessi punteggi (Indel normalizzato), calcolati in C++
+try:
+    from rapidfuzz import fuzz as _rf_fuzz
+except ImportError:
+    _rf_fuzz = None
+
+BACKEND = "rapidfuzz" if _rf_fuzz else "bitparallel"
+
+
+# Maschere di bit per carattere della stringa (bit i acceso dove s[i] == carattere)
+@lru_cache(maxsize=4096)
+def _pattern(s):
+    masks = {}
+    bit = 1
+    for ch in s:
+        masks[ch] = masks.get(ch, 0) | bit
+        bit <<= 1
+    return masks
+
+
+# Lunghezza della sottosequenza comune più lunga, bit-parallela (Hyyrö): un'operazione su interi per carattere
+def lcs_length(a, b):
+    if not a or not b: return 0
+    if len(a) < len(b): a, b = b, a
+    masks = _pattern(a)
+    full = (1 << len(a)) - 1
+    v = full
+    for ch in b:
+        u = v & masks.get(ch, 0)
+        v = ((v + u) | (v - u)) & full
+    return len(a) - bin(v).count("1")
+
+
+def _ratio(a, b, score_cutoff):
+    total = len(a) + len(b)
+    if not total: return 1.0
+    if a == b: return 1.0
+    # Limite superiore (tutta la stringa più corta in comune): uscita anticipata senza calcolo
+    if 2 * min(len(a), len(b)) / total < score_cutoff: return 0.0
+    score = 2 * lcs_length(a, b) / total
+    return score if score >= score_cutoff else 0.0
+
+
+# Similarità 0..1 (distanza Indel normalizzata, stessa scala di SequenceMatcher.ratio); 0.0 sotto score_cutoff
+def ratio(a, b, score_cutoff=0.0):
+    a, b = a or "", b or ""
+    if _rf_fuzz:
+        return _rf_fuzz.ratio(a, b, score_cutoff=score_cutoff * 100) / 100
+    return _ratio(a, b, score_cutoff)
+
+
+# Similarità sugli insiemi di parole: ordine e parole in più non penalizzano ("Rossi Mario" == "Mario Rossi")
+def token_set_ratio(a, b, score_cutoff=0.0):
+    a, b = a or "", b or ""
+    if _rf_fuzz:
+        return _rf_fuzz.token_set_ratio(a, b, score_cutoff=score_cutoff * 100) / 100
+
+    tokens_a, tokens_b = set(a.split()), set(b.split())
+    if not tokens_a or not tokens_b: return 0.0
+    common = tokens_a & tokens_b
+    only_a, only_b = tokens_a - tokens_b, tokens_b - tokens_a
+    if common and (not only_a or not only_b): return 1.0
+
+    sect = " ".join(sorted(common))
+    sect_a = " ".join(filter(None, (sect, " ".join(sorted(only_a)))))
+    sect_b = " ".join(filter(None, (sect, " ".join(sorted(only_b)))))
+    best = _ratio(sect_a, sect_b, score_cutoff)
+    if sect:
+        best = max(best, _ratio(sect, sect_a, score_cutoff), _ratio(sect, sect_b, score_cutoff))
+    return best
@@ -0,0 +1,103 @@
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Timeout di default (connessione, lettura) per chi non ne specifica uno
+DEFAULT_TIMEOUT = (3.05, 10)
+
+# Servizi contattati a ogni sessione (pre-riscaldabili)
+SPOTIFY_URLS = ("https://api.spotify.com", "https://accounts.spotify.com")
+
+
+class HttpClient:
+    """
+    Client HTTP condiviso da tutti i manager: una sola requests.Session con pool di connessioni per host
+    (keep-alive, niente DNS/TCP/TLS ripetuti a ogni chiamata), timeout coerenti e un'unica politica di retry
+    (429/5xx con backoff, anche per le POST di ACR e Scribe).
+    """
+    def __init__(self, timeout=DEFAULT_TIMEOUT, retries=2, backoff=0.5, pool_maxsize=16):
+        self.timeout = timeout
+        retry_strategy = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["GET", "HEAD", "POST"],
+        )
+        # pool_connections = numero di host tenuti in cache, pool_maxsize = connessioni per host
+        adapter = HTTPAdapter(max_retries=retry_strategy, pool_connections=32, pool_maxsize=pool_maxsize)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._lock = threading.Lock()
+        self._warm_hosts = {}
+        self.stats = {"requests": 0, "errors": 0, "prewarmed": 0}
+        self.requests_per_host = Counter()
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        with self._lock:
+            self.stats["requests"] += 1
+            self.requests_per_host[urlsplit(url).hostname] += 1
+        try:
+            return self.session.request(method, url, **kwargs)
+        except requests.RequestException:
+            with self._lock: self.stats["errors"] += 1
+            raise
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    # Apre in background una connessione verso ciascun servizio (DNS + TCP + TLS), che resta nel pool
+    def prewarm(self, urls, max_age_s=45):
+        """
+        Richiesta HEAD leggera verso la radice di ogni origine (schema://host[:porta]); la risposta
+        (anche 404) viene letta per intero così la connessione torna nel pool.
+        Origini già scaldate di recente vengono saltate.
+        """
+        now = time.monotonic()
+        targets = []
+        with self._lock:
+            for url in urls:
+                if not url: continue
+                parts = urlsplit(url if "://" in url else f"https://{url}")
+                origin = f"{parts.scheme}://{parts.netloc}"
+                if now - self._warm_hosts.get(origin, -max_age_s) < max_age_s: continue
+                self._warm_hosts[origin] = now
+                targets.append(origin)
+
+        def warm(origin):
+            try:
+                self.session.head(f"{origin}/", timeout=(3.05, 3), allow_redirects=False).close()
+                with self._lock: self.stats["prewarmed"] += 1
+            except requests.RequestException:
+                pass
+
+        for origin in targets:
+            threading.Thread(target=warm, args=(origin,), name=f"prewarm-{origin}", daemon=True).start()
+        return targets
+
+    def get_stats(self):
+        with self._lock:
+            return {**self.stats, "hosts": dict(self.requests_per_host)}
+
+
+_shared_client = None
+_shared_lock = threading.Lock()
+
+
+# Istanza unica di processo (creata al primo utilizzo)
+def get_http_client():
+    global _shared_client
+    with _shared_lock:
+        if _shared_client is None:
+            _shared_client = HttpClient()
+        return _shared_client
@@ -0,0 +1,266 @@
+import os
+import sys
+import json
+import time
+import zlib
+from functools import lru_cache
+
+import numpy as np
+
+from lyrics_index import LyricsIndex, tokenize
+from text_normalize import normalize_for_match
+from fingerprint_manager import _parse_filename
+
+# Parametri MinHash / LSH
+NUM_PERM = 96                   # Permutazioni (lunghezza della firma)
+BANDS = 48                      # Bande LSH da NUM_PERM // BANDS righe: candidato se una banda coincide
+WINDOW_WORDS = 16               # Finestre di testo indicizzate (una trascrizione copre ~10-30 parole)
+WINDOW_STEP = 8
+HASH_SEED = 20240601
+HASH_PRIME = 4294967291         # Primo < 2^32: firme in uint32
+
+# Soglie della ricerca
+MIN_QUERY_WORDS = 6
+RERANK_TOP = 5
+MIN_CONFIDENCE = 0.65
+MIN_PAIR_COVERAGE = 0.45        # Coppie di parole adiacenti ritrovate: le sole parole frequenti non bastano
+
+
+# Hash stabile (tra processi) di uno shingle
+@lru_cache(maxsize=65536)
+def _shingle_hash(shingle):
+    return zlib.crc32(shingle.encode("utf-8"))
+
+
+# Shingle di una sequenza di parole: coppie adiacenti (le parole singole frequenti renderebbero simili testi qualsiasi)
+def _shingle_hashes(tokens):
+    shingles = {f"{a} {b}" for a, b in zip(tokens, tokens[1:])} or set(tokens)
+    return np.fromiter((_shingle_hash(s) for s in shingles), dtype=np.uint64, count=len(shingles))
+
+
+# Finestre sovrapposte di parole di un testo
+def _windows(tokens):
+    if len(tokens) <= WINDOW_WORDS: return [tokens] if tokens else []
+    starts = range(0, len(tokens) - WINDOW_WORDS + WINDOW_STEP, WINDOW_STEP)
+    return [tokens[s:s + WINDOW_WORDS] for s in starts]
+
+
+class LyricsCatalog:
+    """
+    Catalogo locale di testi (decine di migliaia di brani) per il riconoscimento testuale senza artista target.
+    Ogni testo è diviso in finestre sovrapposte di parole; per ogni finestra si salva una firma MinHash
+    e, per ogni banda LSH, la chiave del bucket in un array ordinato. Tutto su disco in memory-map
+    (come l'indice fingerprint): una ricerca calcola la firma della trascrizione, legge con searchsorted
+    i bucket delle sue bande, stima la somiglianza dei candidati dalle firme e riordina i migliori
+    brani leggendo solo i loro testi (BM25 + copertura, come la cache dei testi dell'artista).
+    """
+    def __init__(self, index_dir=None):
+        self.index_dir = index_dir or os.getenv("LYRICS_CATALOG_INDEX", "lyrics_catalog_index")
+        self.songs = []
+        self.signatures = np.zeros((0, NUM_PERM), dtype=np.uint32)
+        self.window_songs = np.zeros(0, dtype=np.uint32)
+        self.band_keys = np.zeros((BANDS, 0), dtype=np.uint64)
+        self.band_windows = np.zeros((BANDS, 0), dtype=np.uint32)
+        self.text_offsets = np.zeros(1, dtype=np.uint64)
+        self.texts = np.zeros(0, dtype=np.uint8)
+        self.stats = {"queries": 0, "candidates": 0, "matches": 0, "last_ms": 0.0}
+
+        rng = np.random.default_rng(HASH_SEED)
+        self._hash_a = rng.integers(1, 1 << 31, size=NUM_PERM, dtype=np.uint64)
+        self._hash_b = rng.integers(0, 1 << 31, size=NUM_PERM, dtype=np.uint64)
+        self._band_mix = rng.integers(1, 1 << 63, size=NUM_PERM // BANDS, dtype=np.uint64) | np.uint64(1)
+        self._load_index()
+
+    @property
+    def enabled(self):
+        return len(self.songs) > 0
+
+    # --- INDICE SU DISCO ---
+    def _path(self, name):
+        return os.path.join(self.index_dir, name)
+
+    def _load_index(self):
+        if not os.path.exists(self._path("songs.json")):
+            print("⚪ [Lyrics Catalog] Nessun catalogo testi locale. Ricerca testuale generica disattivata.")
+            return
+        try:
+            with open(self._path("meta.json"), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if (meta.get("num_perm"), meta.get("bands"), meta.get("seed")) != (NUM_PERM, BANDS, HASH_SEED):
+                print("⚠️ [Lyrics Catalog] Catalogo creato con parametri diversi: va ricostruito.")
+                return
+            with open(self._path("songs.json"), "r", encoding="utf-8") as f:
+                self.songs = json.load(f)
+            self.signatures = np.load(self._path("signatures.npy"), mmap_mode="r")
+            self.window_songs = np.load(self._path("window_songs.npy"), mmap_mode="r")
+            self.band_keys = np.load(self._path("band_keys.npy"), mmap_mode="r")
+            self.band_windows = np.load(self._path("band_windows.npy"), mmap_mode="r")
+            self.text_offsets = np.load(self._path("text_offsets.npy"), mmap_mode="r")
+            self.texts = np.memmap(self._path("texts.bin"), dtype=np.uint8, mode="r") \
+                if self.text_offsets[-1] else np.zeros(0, dtype=np.uint8)
+            print(f"📚 [Lyrics Catalog] Catalogo testi: {len(self.songs)} brani, {len(self.window_songs)} finestre.")
+        except Exception as e:
+            print(f"⚠️ [Lyrics Catalog] Errore caricamento catalogo: {e}")
+            self.songs = []
+
+    def _save_index(self, signatures, window_songs, texts, text_offsets):
+        os.makedirs(self.index_dir, exist_ok=True)
+        band_keys = self._band_keys(signatures)
+        order = np.argsort(band_keys, axis=1, kind="stable")
+        np.save(self._path("signatures.npy"), signatures)
+        np.save(self._path("window_songs.npy"), window_songs)
+        np.save(self._path("band_keys.npy"), np.take_along_axis(band_keys, order, axis=1))
+        np.save(self._path("band_windows.npy"), order.astype(np.uint32))
+        np.save(self._path("text_offsets.npy"), text_offsets)
+        with open(self._path("texts.bin"), "wb") as f:
+            f.write(texts)
+        with open(self._path("meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"num_perm": NUM_PERM, "bands": BANDS, "seed": HASH_SEED,
+                       "window_words": WINDOW_WORDS, "window_step": WINDOW_STEP}, f)
+        with open(self._path("songs.json"), "w", encoding="utf-8") as f:
+            json.dump(self.songs, f, ensure_ascii=False, indent=1)
+
+    # Aggiunge testi al catalogo: iterabile di (artista, titolo, testo)
+    def add_lyrics(self, entries):
+        # Copia in RAM del catalogo esistente (i file in memory-map verranno sovrascritti)
+        new_signatures = [np.array(self.signatures)]
+        new_window_songs = [np.array(self.window_songs)]
+        texts = bytearray(np.asarray(self.texts).tobytes())
+        offsets = [int(o) for o in self.text_offsets]
+        self.signatures = self.window_songs = self.band_keys = self.band_windows = None
+        self.texts = self.text_offsets = None
+        known = {(normalize_for_match(s["artist"]), normalize_for_match(s["title"])) for s in self.songs}
+
+        for artist, title, lyrics in entries:
+            key = (normalize_for_match(artist), normalize_for_match(title))
+            windows = _windows(tokenize(lyrics or ""))
+            if key in known or not windows: continue
+            known.add(key)
+
+            song_id = len(self.songs)
+            new_signatures.append(self._minhash([_shingle_hashes(w) for w in windows]))
+            new_window_songs.append(np.full(len(windows), song_id, dtype=np.uint32))
+            texts.extend(lyrics.lower().encode("utf-8"))
+            offsets.append(len(texts))
+            self.songs.append({"artist": artist, "title": title})
+
+        self._save_index(
+            np.concatenate(new_signatures).astype(np.uint32),
+            np.concatenate(new_window_songs).astype(np.uint32),
+            bytes(texts),
+            np.array(offsets, dtype=np.uint64),
+        )
+        self._load_index()
+
+    # --- MINHASH / LSH ---
+    def _minhash(self, shingle_sets):
+        """Firme (finestre x NUM_PERM): minimo di (a*x + b) mod p su ogni insieme di shingle, in un solo passaggio vettoriale."""
+        lengths = np.array([len(s) for s in shingle_sets])
+        values = np.concatenate(shingle_sets)
+        hashed = (self._hash_a[:, None] * values[None, :] + self._hash_b[:, None]) % np.uint64(HASH_PRIME)
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        return np.minimum.reduceat(hashed, starts, axis=1).T.astype(np.uint32)
+
+    def _band_keys(self, signatures):
+        """Chiavi dei bucket (BANDS x finestre): combinazione delle righe di ogni banda in un uint64."""
+        rows = NUM_PERM // BANDS
+        bands = np.asarray(signatures, dtype=np.uint64).reshape(len(signatures), BANDS, rows)
+        return (bands * self._band_mix).sum(axis=2, dtype=np.uint64).T
+
+    def _text(self, song_id):
+        start, end = int(self.text_offsets[song_id]), int(self.text_offsets[song_id + 1])
+        return bytes(self.texts[start:end]).decode("utf-8")
+
+    # --- RICERCA ---
+    def search(self, transcript, top_k=RERANK_TOP):
+        """
+        Brano del catalogo che contiene un testo simile alla trascrizione.
+        Restituisce {"artist", "title", "confidence", ...} oppure None (catalogo vuoto, trascrizione corta, nessun candidato).
+        """
+        if not self.enabled: return None
+        tokens = tokenize(transcript)
+        if len(tokens) < MIN_QUERY_WORDS: return None
+        start_time = time.time()
+
+        signature = self._minhash([_shingle_hashes(tokens)])
+        keys = self._band_keys(signature)[:, 0]
+
+        # Bucket delle bande: range [lo, hi) negli array ordinati
+        candidates = []
+        for band, key in enumerate(keys):
+            row = self.band_keys[band]
+            lo, hi = np.searchsorted(row, key, side="left"), np.searchsorted(row, key, side="right")
+            if hi > lo: candidates.append(np.asarray(self.band_windows[band, lo:hi]))
+        self.stats["queries"] += 1
+        if not candidates: return None
+
+        windows = np.unique(np.concatenate(candidates))
+        similarity = (np.asarray(self.signatures[windows]) == signature[0]).mean(axis=1)
+        songs = np.asarray(self.window_songs[windows])
+
+        # Somiglianza stimata migliore per brano, poi i top_k brani
+        order = np.argsort(-similarity, kind="stable")
+        best_songs, first = np.unique(songs[order], return_index=True)
+        best_similarity = similarity[order][first]
+        shortlist = best_songs[np.argsort(-best_similarity, kind="stable")[:top_k]]
+
+        # Riordino sui testi completi dei soli candidati
+        rerank = LyricsIndex({int(s): self._text(int(s)) for s in shortlist})
+        match = rerank.search(transcript)
+        elapsed_ms = (time.time() - start_time) * 1000
+        self.stats["candidates"] += len(windows)
+        self.stats["last_ms"] = round(elapsed_ms, 2)
+        if match is None: return None
+
+        song_id, confidence, details = match
+        song = self.songs[song_id]
+        return {
+            "artist": song["artist"], "title": song["title"], "confidence": confidence,
+            "jaccard": round(float(best_similarity[best_songs == song_id][0]), 3),
+            "candidate_windows": len(windows), "elapsed_ms": round(elapsed_ms, 2), **details,
+        }
+
+    # Come search, ma solo se confidenza e coppie ritrovate superano le soglie del catalogo
+    def identify(self, transcript):
+        result = self.search(transcript)
+        if not result or result["confidence"] < MIN_CONFIDENCE: return None
+        if result["pair_coverage"] < MIN_PAIR_COVERAGE: return None
+        self.stats["matches"] += 1
+        return result
+
+    def get_stats(self):
+        return {**self.stats, "songs": len(self.songs),
+                "windows": 0 if self.window_songs is None else len(self.window_songs)}
+
+
+# File di testo "Artista - Titolo.txt" o righe JSON {"artist", "title", "lyrics"}
+def _read_entries(path):
+    if path.lower().endswith(".jsonl"):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip(): continue
+                item = json.loads(line)
+                yield item["artist"], item["title"], item["lyrics"]
+    else:
+        artist, title = _parse_filename(path)
+        with open(path, "r", encoding="utf-8") as f:
+            yield artist, title, f.read()
+
+
+# COSTRUZIONE CATALOGO DA RIGA DI COMANDO
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Uso: python lyrics_catalog.py <cartella_txt | file.txt | file.jsonl> [...]")
+        sys.exit(1)
+
+    files = []
+    for arg in sys.argv[1:]:
+        if os.path.isdir(arg):
+            for root, _, names in os.walk(arg):
+                files.extend(os.path.join(root, n) for n in sorted(names) if n.lower().endswith((".txt", ".jsonl")))
+        else:
+            files.append(arg)
+
+    catalog = LyricsCatalog()
+    catalog.add_lyrics(entry for path in files for entry in _read_entries(path))
+    print(f"✅ Catalogo aggiornato: {len(catalog.songs)} brani, {len(catalog.window_songs)} finestre.")
@@ -0,0 +1,152 @@
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+
+from text_normalize import ascii_fold
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+# Parole del testo (minuscolo, senza accenti né punteggiatura)
+def tokenize(text):
+    return _TOKEN.findall(ascii_fold(text.lower()))
+
+
+# Coppie di parole vicine: adiacenti (distanza 1) e con una parola in mezzo (distanza 2, tollera parole perse da Scribe)
+def shingles(tokens):
+    pairs = {(tokens[i], tokens[i + 1], 1) for i in range(len(tokens) - 1)}
+    pairs.update((tokens[i], tokens[i + 2], 2) for i in range(len(tokens) - 2))
+    return pairs
+
+
+class LyricsIndex(dict):
+    """
+    Cache dei testi (chiave titolo normalizzato -> testo) con indice invertito mantenuto a ogni scrittura.
+    Ogni testo viene tokenizzato una sola volta: postings parola -> {titolo: frequenza} e
+    coppie di parole vicine -> {titoli}. La trascrizione viene valutata con BM25 sulle parole
+    più un bonus di prossimità sulle coppie (pesato per IDF), toccando solo i postings delle sue parole.
+    Le parole si confrontano intere (niente "amore" dentro "amoreggiare").
+    """
+    def __init__(self, data=None, k1=1.2, b=0.75, phrase_weight=0.5):
+        super().__init__()
+        self.k1 = k1
+        self.b = b
+        self.phrase_weight = phrase_weight
+        self._lock = threading.RLock()
+        self._docs = {}                       # titolo -> (parole distinte, coppie, lunghezza)
+        self._terms = defaultdict(dict)       # parola -> {titolo: frequenza}
+        self._pairs = defaultdict(set)        # coppia -> {titoli}
+        self._total_length = 0
+        self._idf = {}                        # IDF calcolate, azzerate a ogni modifica
+        if data: self.update(data)
+
+    # --- Scrittura (mantiene l'indice allineato) ---
+    def __setitem__(self, key, lyrics):
+        with self._lock:
+            if key in self: self._unindex(key)
+            super().__setitem__(key, lyrics)
+            tokens = tokenize(lyrics)
+            counts = Counter(tokens)
+            pairs = shingles(tokens)
+            for term, tf in counts.items(): self._terms[term][key] = tf
+            for pair in pairs: self._pairs[pair].add(key)
+            self._docs[key] = (set(counts), pairs, len(tokens))
+            self._total_length += len(tokens)
+            self._idf.clear()
+
+    def __delitem__(self, key):
+        with self._lock:
+            self._unindex(key)
+            super().__delitem__(key)
+
+    def _unindex(self, key):
+        terms, pairs, length = self._docs.pop(key)
+        for term in terms:
+            postings = self._terms[term]
+            postings.pop(key, None)
+            if not postings: del self._terms[term]
+        for pair in pairs:
+            postings = self._pairs[pair]
+            postings.discard(key)
+            if not postings: del self._pairs[pair]
+        self._total_length -= length
+        self._idf.clear()
+
+    def update(self, *args, **kwargs):
+        for key, lyrics in dict(*args, **kwargs).items():
+            self[key] = lyrics
+
+    def pop(self, key, *default):
+        with self._lock:
+            if key not in self: return super().pop(key, *default)
+            value = self[key]
+            del self[key]
+            return value
+
+    def clear(self):
+        with self._lock:
+            super().clear()
+            self._docs.clear()
+            self._terms.clear()
+            self._pairs.clear()
+            self._total_length = 0
+            self._idf.clear()
+
+    # --- Ricerca ---
+    def _idf_of(self, item, postings):
+        idf = self._idf.get(item)
+        if idf is None:
+            df = len(postings.get(item, ()))
+            idf = self._idf[item] = math.log(1 + (len(self._docs) - df + 0.5) / (df + 0.5))
+        return idf
+
+    # Miglior testo per la trascrizione: (titolo, confidenza 0..1, dettagli) oppure None
+    def search(self, transcript, min_words=3):
+        """
+        Confidenza = quota di parole significative (> 3 lettere) della trascrizione presenti nel testo,
+        o quota di coppie vicine ritrovate se più alta (trascrizione completa in ordine -> 1.0).
+        """
+        tokens = tokenize(transcript)
+        words = [w for w in tokens if len(w) > 3]
+        if len(words) < min_words: return None
+
+        with self._lock:
+            if not self._docs: return None
+            avg_length = self._total_length / len(self._docs)
+            scores = defaultdict(float)
+
+            # BM25 sulle parole (solo i documenti nei postings)
+            for term, qtf in Counter(tokens).items():
+                postings = self._terms.get(term)
+                if not postings: continue
+                idf = self._idf_of(term, self._terms)
+                for key, tf in postings.items():
+                    length = self._docs[key][2]
+                    norm = tf + self.k1 * (1 - self.b + self.b * length / avg_length)
+                    scores[key] += qtf * idf * tf * (self.k1 + 1) / norm
+
+            # Bonus di prossimità sulle coppie di parole vicine
+            query_pairs = shingles(tokens)
+            for pair in query_pairs:
+                postings = self._pairs.get(pair)
+                if not postings: continue
+                bonus = self.phrase_weight * self._idf_of(pair, self._pairs) / pair[2]
+                for key in postings: scores[key] += bonus
+
+            if not scores: return None
+            ranking = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+            best_key, best_score = ranking[0]
+            doc_terms, doc_pairs, _ = self._docs[best_key]
+
+        coverage = sum(w in doc_terms for w in words) / len(words)
+        adjacent = [p for p in query_pairs if p[2] == 1]
+        pair_coverage = sum(p in doc_pairs for p in adjacent) / len(adjacent) if adjacent else 0.0
+        details = {
+            "bm25": round(best_score, 3),
+            "runner_up": round(ranking[1][1], 3) if len(ranking) > 1 else 0.0,
+            "word_coverage": round(coverage, 3),
+            "pair_coverage": round(pair_coverage, 3),
+            "candidates": len(ranking),
+        }
+        return best_key, max(coverage, pair_coverage), details
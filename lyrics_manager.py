@@ -1,9 +1,7 @@
 import os
-import requests
 import re
 import lyricsgenius
 import io
-import unicodedata
 import time
 import random
 from concurrent.futures import ThreadPoolExecutor, as_completed
@@ -11,6 +9,12 @@ from dotenv import load_dotenv
 from collections import Counter
 from langdetect import detect, LangDetectException
 from spotify_manager import SpotifyManager
+from http_client import get_http_client
+from rate_limiter import get_rate_limiter, throttle_session
+from context_store import get_context_store
+from text_normalize import normalize_basic, strip_brackets
+from lyrics_index import LyricsIndex
+from lyrics_catalog import LyricsCatalog
 
 load_dotenv()
 
@@ -18,6 +22,11 @@ class LyricsManager:
     def __init__(self):
         self.genius_token = os.getenv("GENIUS_ACCESS_TOKEN")
         self.elevenlabs_key = os.getenv("ELEVENLABS_API_KEY")
+        self.http = get_http_client()
+        self.scribe_url = os.getenv("ELEVENLABS_SCRIBE_URL", "https://api.elevenlabs.io/v1/speech-to-text")
+
+        # Limitatore Genius (token bucket + AIMD), condiviso con MetadataManager
+        self.genius_limiter = get_rate_limiter("genius")
 
          # Rotazione tra user agents per evitare blocchi IP da Genius.
         self.user_agents = [
@@ -38,7 +47,7 @@ class LyricsManager:
                 remove_section_headers=True,
                 retries=2,
                 timeout=10,
-                sleep_time=0.1
+                sleep_time=0 # Il ritmo delle richieste lo decide il limitatore adattivo condiviso
             )
             
             # SELEZIONE RANDOM DELL'AGENTE
@@ -48,37 +57,72 @@ class LyricsManager:
             self.genius._session.headers.update({
                 "User-Agent": chosen_agent
             })
+            throttle_session(self.genius._session, self.genius_limiter)
         else:
             self.genius = None
 
         self.spotify_bot = SpotifyManager()
+        self.catalog = LyricsCatalog() # Catalogo locale dei testi per la modalità generica (senza artista target)
         self.lyrics_cache = {}
         self.titles_map = {} 
         self.current_artist = None
         self.detected_language_code = None
         
-        # 2. Limitazione a 2 thread per evitare di sovraccaricare Genius e ridurre il rischio di ban IP.
+        # 2. Thread dei flussi di download; le singole richieste Genius hanno un pool proprio,
+        # dimensionato sulla concorrenza massima: quante sono davvero in volo lo decide il limitatore
         self.executor = ThreadPoolExecutor(max_workers=2)
+        self.crawl_executor = ThreadPoolExecutor(max_workers=self.genius_limiter.max_concurrency, thread_name_prefix="genius")
+
+    # Cache dei testi sempre indicizzata: qualsiasi dizionario assegnato viene convertito in LyricsIndex
+    @property
+    def lyrics_cache(self):
+        return self._lyrics_cache
+
+    @lyrics_cache.setter
+    def lyrics_cache(self, lyrics):
+        self._lyrics_cache = lyrics if isinstance(lyrics, LyricsIndex) else LyricsIndex(lyrics)
 
-    # Costruzione contesto artista bias
-    def update_artist_context(self, artist_name):
+    # Costruzione contesto artista bias. 'songs' = catalogo Spotify già scaricato dal chiamante (None: lo scarica il flusso).
+    # Restituisce il Future del download dei testi, o None se non serve scaricare nulla.
+    def update_artist_context(self, artist_name, songs=None):
         if not artist_name or artist_name == self.current_artist:
-            return
+            return None
         
         self.current_artist = artist_name
         self.lyrics_cache = {}
         self.titles_map = {}
         self.detected_language_code = None 
-        
-        print(f"📖 [Lyrics] Analisi artista: {artist_name}...")
-        self.executor.submit(self._async_lyrics_flow_smart, artist_name)
+
+        # Archivio locale: testi già scaricati pronti subito (riscaricati in background se scaduti)
+        cached = get_context_store().get(artist_name, "lyrics")
+        if cached:
+            context, stale = cached
+            self.lyrics_cache = context["lyrics"]
+            self.titles_map = context["titles"]
+            self.detected_language_code = context.get("language")
+            print(f"📖 [Lyrics] {len(self.lyrics_cache)} testi di {artist_name} dall'archivio locale.")
+            if not stale: return None
+            print("    🔄 [Lyrics] Testi scaduti: aggiornamento in background.")
+        else:
+            print(f"📖 [Lyrics] Analisi artista: {artist_name}...")
+        return self.executor.submit(self._async_lyrics_flow_smart, artist_name, songs)
+
+    # Salvataggio dei testi nell'archivio locale (solo se l'artista non è cambiato nel frattempo)
+    def _save_context(self, artist_name):
+        if artist_name != self.current_artist or not self.lyrics_cache: return
+        get_context_store().put(artist_name, "lyrics", {
+            "lyrics": dict(self.lyrics_cache),
+            "titles": dict(self.titles_map),
+            "language": self.detected_language_code,
+        })
 
     # Download testi asincrono
-    def _async_lyrics_flow_smart(self, artist_name):
+    def _async_lyrics_flow_smart(self, artist_name, all_songs=None):
         start_time = time.time()
         try:
-            print(f"    ⏳ [00s] Contatto Spotify...")
-            all_songs = self.spotify_bot.get_artist_complete_data(artist_name)
+            if all_songs is None:
+                print(f"    ⏳ [00s] Contatto Spotify...")
+                all_songs = self.spotify_bot.get_artist_complete_data(artist_name)
             
             # 3. FILTRO INTELLIGENTE PRE-GENIUS
             # Rimuoviamo duplicati o versioni strumentali PRIMA di chiamare Genius
@@ -92,13 +136,16 @@ class LyricsManager:
             
             # Limitiamo a 30 brani "buoni" (lunghezza tipica di un live)
             target_songs = target_songs[:30]
+            if self.detected_language_code is None:
+                self.detected_language_code = self._detect_dominant_language(target_songs)
             
             spotify_time = time.time() - start_time
             total = len(target_songs)
-            print(f"    🚀 [Genius] Download SMART (2 thread) per {total} brani...")
+            print(f"    🚀 [Genius] Download SMART (limitatore adattivo) per {total} brani...")
+            crawl_start = time.time()
 
             future_to_song = {
-                self.executor.submit(self._fetch_single_lyric_smart, song, artist_name): song 
+                self.crawl_executor.submit(self._fetch_single_lyric_smart, song, artist_name): song 
                 for song in target_songs
             }
             
@@ -108,15 +155,25 @@ class LyricsManager:
                 try:
                     success = future.result()
                     if success: count += 1
-                    if i % 5 == 0: print(f"       [{i}/{total}] ...processing...") # Log indica il progresso a gruppi di 5
                 except Exception: pass
+                if i % 5 == 0 or i == total: self._log_crawl_progress(i, total, count, crawl_start) # Progresso a gruppi di 5
             
             total_time = time.time() - start_time
-            print(f"🏁 [Lyrics] FINITO in {total_time:.1f}s. Cache: {count}/{total} testi.")
+            crawl_time = time.time() - crawl_start
+            print(f"🏁 [Lyrics] FINITO in {total_time:.1f}s. Cache: {count}/{total} testi "
+                  f"({total / max(crawl_time, 1e-6):.2f} brani/s su Genius).")
+            self._save_context(artist_name)
 
         except Exception as e:
             print(f"❌ [Lyrics] Errore Flow: {e}")
 
+    # Progresso del download: brani completati, velocità e stato del limitatore Genius
+    def _log_crawl_progress(self, done, total, found, crawl_start):
+        elapsed = max(time.time() - crawl_start, 1e-6)
+        limiter = self.genius_limiter.get_stats()
+        print(f"       [{done}/{total}] {found} testi, {done / elapsed:.2f} brani/s "
+              f"(Genius: {limiter['rate']} req/s, {limiter['concurrency']} in parallelo, {limiter['throttled']} rallentamenti)")
+
     # Versione SEQUENZIALE più lenta ma più "umana" per fallback o artisti con molti brani.
     def _sync_lyrics_flow(self, artist_name):
         start_time = time.time()
@@ -153,16 +210,15 @@ class LyricsManager:
                         print(f"       [{i}/{total}] ✅ {song_title}")
                     else:
                         print(f"       [{i}/{total}] ⏩ {song_title} (No testo)")
-                    
-                    # SLEEP DINAMICO: Aspetta tra 2 e 5 secondi tra una chiamata e l'altra (per evitare ban IP)
-                    sleep_duration = random.uniform(2.0, 5.0)
-                    time.sleep(sleep_duration)
+
+                    # Nessuna pausa fissa: il ritmo delle richieste lo regola il limitatore Genius
 
                 except Exception as e:
                     print(f"       [{i}/{total}] ❌ {song_title} - {e}")
             
             total_time = time.time() - start_time
             print(f"🏁 [Lyrics] FINITO in {total_time:.1f}s. Cache: {count}/{total} testi.")
+            self._save_context(artist_name)
 
         except Exception as e:
             print(f"❌ [Lyrics] Errore Flow: {e}")
@@ -170,17 +226,18 @@ class LyricsManager:
     # Download del singolo testo con approccio "smart" (multithreaded e con filtro pre-Genius)
     def _fetch_single_lyric_smart(self, title, artist):
         if not self.genius: return False
-        
-        # 4. PAUSA CASUALE "UMANA"
-        time.sleep(random.uniform(1.0, 3.5)) 
+
+        # Artista cambiato nel frattempo: download annullato (niente quota Genius sprecata)
+        if artist != self.current_artist: return False
+        lyrics_cache, titles_map = self.lyrics_cache, self.titles_map
         
         try:
             clean_search_title = re.sub(r"\(.*?\)", "", title).strip()
             song = self.genius.search_song(clean_search_title, artist)
-            if song:
+            if song and artist == self.current_artist:
                 norm_key = self._normalize_text(song.title)
-                self.lyrics_cache[norm_key] = song.lyrics.lower()
-                self.titles_map[norm_key] = song.title
+                lyrics_cache[norm_key] = song.lyrics.lower()
+                titles_map[norm_key] = song.title
                 return True
         except Exception:
             pass
@@ -209,7 +266,7 @@ class LyricsManager:
 
         for t in titles:
             try:
-                clean = re.sub(r"[\(\[].*?[\)\]]", "", t).strip()
+                clean = strip_brackets(t).strip()
                 if len(clean) > 3:
                     lang = detect(clean)
                     detected_langs.append(lang)
@@ -236,23 +293,26 @@ class LyricsManager:
         except: pass
 
     # --- ELEVENLABS SCRIBE ---
-    # Metodo principale per trascrivere l'audio e cercare la miglior corrispondenza nei testi scaricati
-    def transcribe_and_match(self, audio_buffer):
+    # Metodo principale per trascrivere l'audio e cercare la miglior corrispondenza nei testi scaricati.
+    # Senza artista target (artist_mode=False) la trascrizione viene cercata nel catalogo locale dei testi
+    def transcribe_and_match(self, payload, artist_mode=True):
         if not self.elevenlabs_key: return None
-        transcribed_text = self._call_scribe_api(audio_buffer, lang_code=self.detected_language_code)
+        lang_code = self.detected_language_code if artist_mode else None
+        transcribed_text = self._call_scribe_api(payload, lang_code=lang_code)
         if not transcribed_text or len(transcribed_text) < 5: return None
+        if not artist_mode: return self._find_catalog_match(transcribed_text)
         return self._find_best_match(transcribed_text)
 
-    # Chiamata API Scribe
-    def _call_scribe_api(self, audio_buffer, lang_code=None):
-        url = "https://api.elevenlabs.io/v1/speech-to-text"
-        headers = {"xi-api-key": self.elevenlabs_key}
-        files = {"file": ("audio.wav", audio_buffer, "audio/wav")}
+    # Chiamata API Scribe (payload WavPayload condiviso con ACR, caricato in streaming)
+    def _call_scribe_api(self, payload, lang_code=None):
+        url = self.scribe_url
         data = {"model_id": "scribe_v1", "tag_audio_events": "false"}
         if lang_code: data["language_code"] = lang_code
+        body, content_type = payload.multipart("file", "audio.wav", fields=data)
+        headers = {"xi-api-key": self.elevenlabs_key, "Content-Type": content_type}
 
         try:
-            response = requests.post(url, headers=headers, files=files, data=data, timeout=10)
+            response = self.http.post(url, headers=headers, data=body, timeout=10)
             if response.status_code == 200:
                 return response.json().get("text", "").strip()
             else:
@@ -261,44 +321,35 @@ class LyricsManager:
             print(f"❌ [Scribe] Connection Fail: {e}")
         return None
 
-    # Ricerca miglior corrispondenza tra la trascrizione e i testi scaricati
+    # Ricerca miglior corrispondenza tra la trascrizione e i testi scaricati (BM25 + prossimità sull'indice invertito)
     def _find_best_match(self, transcript):
         if not self.lyrics_cache: return None
         transcript_clean = transcript.lower().strip()
         if len(transcript_clean) < 15: return None
-        for title_key, lyrics in self.lyrics_cache.items():
-            if transcript_clean in lyrics:
-                return self._package_result(title_key, 100)
-        transcript_words = [w for w in transcript_clean.split() if len(w) > 3]
-        if len(transcript_words) < 3: return None
-        best_ratio = 0.0
-        best_title_key = None
-        for title_key, lyrics in self.lyrics_cache.items():
-            hits = 0
-            for word in transcript_words:
-                if word in lyrics: hits += 1
-            ratio = hits / len(transcript_words)
-            if ratio > best_ratio:
-                best_ratio = ratio
-                best_title_key = title_key
-        if best_title_key and best_ratio > 0.65:
-            return self._package_result(best_title_key, int(best_ratio * 100))
+        match = self.lyrics_cache.search(transcript_clean)
+        if match is None: return None
+        title_key, confidence, _ = match
+        if confidence > 0.65:
+            return self._package_result(title_key, int(confidence * 100))
         return None
 
+    # Ricerca nel catalogo locale (MinHash/LSH su disco + riordino dei candidati)
+    def _find_catalog_match(self, transcript):
+        match = self.catalog.identify(transcript)
+        if not match: return None
+        print(f"    📚 [Lyrics Catalog] {match['candidate_windows']} finestre candidate in {match['elapsed_ms']:.1f}ms")
+        return self._package_result(None, int(match["confidence"] * 100), title=match["title"], artist=match["artist"])
+
     # Metodo per formattare il risultato finale con le informazioni del brano trovato
-    def _package_result(self, title_key, score):
-        real_title = self.titles_map[title_key]
+    def _package_result(self, title_key, score, title=None, artist=None):
+        real_title = title or self.titles_map[title_key]
         print(f"🧩 [Lyrics MATCH] Identificato: '{real_title}' (Confidence: {score}%)")
         return {
-            "status": "success", "title": real_title, "artist": self.current_artist,
+            "status": "success", "title": real_title, "artist": artist or self.current_artist,
             "score": score, "type": "Lyrics Match", "duration_ms": 0,
             "album": "Sconosciuto", "external_metadata": {}, "contributors": {}, "cover": None
         }
 
     # Normalizzazione titoli
     def _normalize_text(self, text):
-        if not text: return ""
-        text = re.sub(r"[\(\[].*?[\)\]]", "", text)
-        text = unicodedata.normalize('NFD', text).encode('ascii', 'ignore').decode("utf-8")
-        text = re.sub(r"[^a-zA-Z0-9\s]", "", text)
-        return text.strip().lower()
\ No newline at end of file
+        return normalize_basic(text)
\ No newline at end of file
@@ -1,12 +1,14 @@
 import musicbrainzngs
 import time
 import re
-import requests
 import json
-from difflib import SequenceMatcher
 import lyricsgenius
 import os
 from spotify_manager import SpotifyManager
+from http_client import get_http_client
+from rate_limiter import get_rate_limiter, throttle_session
+from fuzzy_match import ratio
+from text_normalize import alnum_lower, clean_for_search
 
 class MetadataManager:
     def __init__(self):
@@ -16,6 +18,7 @@ class MetadataManager:
         # Configurazione iTunes e Deezer
         self.itunes_url = "https://itunes.apple.com/search"
         self.deezer_search_url = "https://api.deezer.com/search"
+        self.http = get_http_client()
         
         # Configurazione Genius
         self.genius_token = os.getenv("GENIUS_ACCESS_TOKEN")
@@ -28,32 +31,14 @@ class MetadataManager:
 
     # Normalizzazione stringhe
     def _clean_string(self, text):
-        if not text: return ""
-        return re.sub(r"[^a-zA-Z0-9\s]", "", text).lower().strip()
+        return alnum_lower(text)
 
     # Pulizia titolo per ricerca (rimuove solo versioni tecniche, non featuring o remix)
     def _clean_title(self, title):
         """
         Pulisce il titolo per la ricerca, rimuovendo solo le versioni tecniche.
         """
-        if not title: return ""
-        
-        junk_keywords = [
-            "live", "remix", "edit", "version", "remaster", 
-            "feat", "ft.", "karaoke", "official"
-        ]
-
-        # Funzione per rimuovere solo le parti tra parentesi che contengono parole chiave di disturbo
-        def clean_parens(match):
-            content = match.group(1).lower()
-            if any(k in content for k in junk_keywords):
-                return ""
-            return match.group(0)
-
-        clean = re.sub(r"\s*[\(\[](.*?)[\)\]]", clean_parens, title)
-        clean = re.sub(r"(?i)\b(remaster|remastered|live at|live in)\b.*", "", clean)
-
-        return clean.strip()
+        return clean_for_search(title)
 
     # Aggiunta di nomi al set con pulizia e capitalizzazione
     def _add_to_set(self, source_set, names_str):
@@ -86,9 +71,9 @@ class MetadataManager:
             is_duplicate = False
             for existing in unique_names:
                 # Se la similarità è alta (> 0.85) o uno è contenuto nell'altro lo consideriamo duplicato
-                ratio = SequenceMatcher(None, name.lower(), existing.lower()).ratio()
+                similarity = ratio(name.lower(), existing.lower(), score_cutoff=0.85)
                 
-                if ratio > 0.85:
+                if similarity > 0.85:
                     is_duplicate = True
                     break
                 
@@ -199,9 +184,10 @@ class MetadataManager:
                 self.genius = lyricsgenius.Genius(
                     self.genius_token, 
                     verbose=False,
-                    sleep_time=0.5, # Attesa per evitare rate limit
+                    sleep_time=0, # Rate limit gestito dal limitatore Genius condiviso con LyricsManager
                     retries=3
                 ) 
+                throttle_session(self.genius._session, get_rate_limiter("genius"))
             
             clean_t = title.split("(")[0].strip()
             song = self.genius.search_song(clean_t, artist)
@@ -244,13 +230,13 @@ class MetadataManager:
                 "limit": 5,
                 "country": "IT",
             }
-            resp = requests.get(self.itunes_url, params=params, timeout=5)
+            resp = self.http.get(self.itunes_url, params=params, timeout=5)
             results = resp.json().get("results", []) if resp.status_code == 200 else []
 
             # 2. Tentativo FALLBACK (Solo Titolo - Utile se l'artista è poco riconoscibile o omonimo)
             if not results:
                 params["term"] = title
-                resp = requests.get(self.itunes_url, params=params, timeout=5)
+                resp = self.http.get(self.itunes_url, params=params, timeout=5)
                 results = resp.json().get("results", []) if resp.status_code == 200 else []
 
             target_norm = self._clean_string(artist)
@@ -260,7 +246,7 @@ class MetadataManager:
                 artist_name = res.get("artistName", "")
                 
                 # Controllo similarità titolo (>60%)
-                if SequenceMatcher(None, title.lower(), track_name.lower()).ratio() < 0.6: 
+                if ratio(title.lower(), track_name.lower(), score_cutoff=0.6) < 0.6: 
                     continue
                 
                 # Controllo presenza artista (per evitare omonimie nel fallback)
@@ -279,7 +265,7 @@ class MetadataManager:
         try:
             query = f"{title} {artist}"
             params = {"q": query, "limit": 3}
-            resp = requests.get(self.deezer_search_url, params=params, timeout=4)
+            resp = self.http.get(self.deezer_search_url, params=params, timeout=4)
             if resp.status_code != 200: return None, None
             
             data = resp.json()
@@ -288,7 +274,7 @@ class MetadataManager:
 
             for res in data.get("data", []):
                 found_title = self._clean_string(res.get("title", ""))
-                if SequenceMatcher(None, title_norm, found_title).ratio() < 0.6: continue
+                if ratio(title_norm, found_title, score_cutoff=0.6) < 0.6: continue
                 
                 found_artist = self._clean_string(res.get("artist", {}).get("name", ""))
                 if target_norm not in found_artist and found_artist not in target_norm: continue
@@ -297,7 +283,7 @@ class MetadataManager:
                 composer = None
                 
                 try:
-                    track_resp = requests.get(f"https://api.deezer.com/track/{res['id']}", timeout=3)
+                    track_resp = self.http.get(f"https://api.deezer.com/track/{res['id']}", timeout=3)
                     if track_resp.status_code == 200:
                         contributors = track_resp.json().get("contributors", [])
                         comps_list = []
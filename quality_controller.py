@@ -0,0 +1,96 @@
+import threading
+from collections import deque
+
+# Scala dei livelli di qualità: dal migliore (0) al più leggero per la rete.
+# Ogni livello fissa frequenza di invio, durata della finestra e intervallo tra due invii.
+QUALITY_LADDER = [
+    {"name": "high", "sample_rate": 44100, "window_s": 12, "interval_s": 6},
+    {"name": "medium", "sample_rate": 16000, "window_s": 12, "interval_s": 7},
+    {"name": "low", "sample_rate": 8000, "window_s": 12, "interval_s": 10},
+    {"name": "minimal", "sample_rate": 8000, "window_s": 10, "interval_s": 12},
+]
+
+
+class QualityController:
+    """
+    Controllore adattivo della qualità di invio verso ACRCloud.
+    Tiene una stima della latenza a media mobile esponenziale (EWMA) e un budget di errori
+    sulle ultime chiamate; si sposta di un livello alla volta lungo QUALITY_LADDER con isteresi:
+    - peggiora se la latenza stimata supera 'degrade_latency_s' o gli errori sforano il budget
+    - migliora solo dopo 'upgrade_after' chiamate consecutive sotto 'upgrade_latency_s' e senza errori
+    Dopo ogni cambio servono almeno 'min_dwell' chiamate prima di poterne fare un altro.
+    """
+    def __init__(self, ladder=None, alpha=0.3, degrade_latency_s=4.5, upgrade_latency_s=2.0,
+                 error_window=10, error_budget=0.3, upgrade_after=4, min_dwell=3):
+        self.ladder = ladder or QUALITY_LADDER
+        self.alpha = alpha
+        self.degrade_latency_s = degrade_latency_s
+        self.upgrade_latency_s = upgrade_latency_s
+        self.error_budget = error_budget
+        self.upgrade_after = upgrade_after
+        self.min_dwell = min_dwell
+        self._outcomes = deque(maxlen=error_window)
+        self._lock = threading.Lock()
+        self.reset()
+
+    # Ritorno al livello migliore (nuova sessione)
+    def reset(self):
+        with self._lock:
+            self.level = 0
+            self.latency_ewma = None
+            self._outcomes.clear()
+            self._good_streak = 0
+            self._since_change = 0
+            self.changes = 0
+
+    @property
+    def current(self):
+        return self.ladder[self.level]
+
+    @property
+    def error_rate(self):
+        if not self._outcomes: return 0.0
+        return self._outcomes.count(False) / len(self._outcomes)
+
+    # Registra l'esito di una chiamata. Restituisce il nuovo livello se è cambiato, altrimenti None.
+    def record(self, latency_s, ok=True):
+        with self._lock:
+            if self.latency_ewma is None: self.latency_ewma = latency_s
+            else: self.latency_ewma += self.alpha * (latency_s - self.latency_ewma)
+            self._outcomes.append(ok)
+            self._since_change += 1
+
+            good = ok and latency_s < self.upgrade_latency_s and self.latency_ewma < self.upgrade_latency_s
+            self._good_streak = self._good_streak + 1 if good else 0
+
+            if self._since_change < self.min_dwell:
+                return None
+
+            over_budget = self.error_rate > self.error_budget
+            if (over_budget or self.latency_ewma > self.degrade_latency_s) and self.level < len(self.ladder) - 1:
+                return self._move(+1, "errori" if over_budget else "latenza")
+            if self._good_streak >= self.upgrade_after and self.error_rate == 0 and self.level > 0:
+                return self._move(-1, "rete veloce")
+            return None
+
+    def _move(self, step, reason):
+        old = self.current
+        self.level += step
+        self.changes += 1
+        self._since_change = 0
+        self._good_streak = 0
+        # Il livello nuovo riparte con un budget pulito: gli errori passati sono già stati "pagati"
+        self._outcomes.clear()
+        new = self.current
+        icon = "🐌" if step > 0 else "🚀"
+        print(f"{icon} [Qualità] {old['name']} -> {new['name']} ({reason}, EWMA {self.latency_ewma:.1f}s): "
+              f"{new['sample_rate'] / 1000:g}kHz, finestra {new['window_s']}s, ogni {new['interval_s']}s")
+        return self.level
+
+    def stats(self):
+        with self._lock:
+            return {
+                "level": self.level, **self.current,
+                "latency_ewma_s": round(self.latency_ewma, 2) if self.latency_ewma is not None else None,
+                "error_rate": round(self.error_rate, 2), "changes": self.changes,
+            }
@@ -0,0 +1,182 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from requests.adapters import HTTPAdapter
+
+
+# Stati che indicano limitazione o blocco esplicito del client (Genius blocca lo scraping con 403)
+THROTTLE_STATUSES = (403, 429)
+
+
+class AdaptiveRateLimiter:
+    """
+    Limitatore per host: token bucket (richieste al secondo, con piccolo burst) più un limite di
+    richieste in volo. Entrambi si adattano in stile AIMD sulle risposte reali:
+      - successo veloce -> aumento additivo (circa +increase req/s al secondo di traffico, +1 in volo per "finestra")
+      - 429 / 403 (blocco anti-scraping) / altri 4xx tranne 404 / 5xx / errore di rete -> dimezzamento
+        di velocità e concorrenza (una volta per episodio), pausa pari a Retry-After se presente
+        (per 403 senza Retry-After: block_pause_s)
+      - successo lento (sopra latency_target_s) -> piccola riduzione della velocità
+    Così si lavora alla velocità massima che il servizio accetta invece di una pausa fissa prudente.
+    """
+    def __init__(self, name, rate=2.0, min_rate=0.2, max_rate=10.0, burst=3,
+                 concurrency=2, max_concurrency=6, latency_target_s=2.5,
+                 increase=0.5, decrease=0.5, slow_decrease=0.9, window_s=30.0, block_pause_s=5.0):
+        self.name = name
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.concurrency = float(concurrency)
+        self.max_concurrency = max_concurrency
+        self.latency_target_s = latency_target_s
+        self.increase = increase
+        self.decrease = decrease
+        self.slow_decrease = slow_decrease
+        self.window_s = window_s
+        self.block_pause_s = block_pause_s
+
+        self._cond = threading.Condition()
+        self._tokens = float(burst)
+        self._refilled_at = time.monotonic()
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._completions = deque()
+        self._latency = None
+        self.in_flight = 0
+        self.stats = {"requests": 0, "ok": 0, "throttled": 0, "errors": 0, "slow": 0, "waited_s": 0.0}
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    # Attende un token e un posto libero tra le richieste in volo (False se scade il timeout)
+    def acquire(self, timeout=None):
+        start = time.monotonic()
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self.in_flight >= int(self.concurrency):
+                    wait = None                                   # Si sblocca al prossimo release
+                elif self._tokens < 1:
+                    wait = (1 - self._tokens) / self.rate
+                else:
+                    self._tokens -= 1
+                    self.in_flight += 1
+                    self.stats["requests"] += 1
+                    self.stats["waited_s"] += now - start
+                    return True
+                if timeout is not None:
+                    remaining = timeout - (now - start)
+                    if remaining <= 0: return False
+                    wait = remaining if wait is None else min(wait, remaining)
+                self._cond.wait(wait)
+
+    # Esito di una richiesta: status HTTP (None = errore di rete), latenza, eventuale Retry-After in secondi
+    def release(self, status, latency_s, retry_after=None):
+        with self._cond:
+            now = time.monotonic()
+            self.in_flight -= 1
+            if _is_backoff_status(status):
+                self.stats["throttled" if status in THROTTLE_STATUSES else "errors"] += 1
+                # Più risposte negative dello stesso episodio (richieste già in volo) contano una volta sola
+                if now - self._last_decrease > max(latency_s, 1.0):
+                    self._last_decrease = now
+                    self.rate = max(self.min_rate, self.rate * self.decrease)
+                    self.concurrency = max(1.0, self.concurrency * self.decrease)
+                    self._tokens = min(self._tokens, 0.0)
+                if status == 403 and not retry_after: retry_after = self.block_pause_s
+                if retry_after: self._paused_until = max(self._paused_until, now + retry_after)
+            else:
+                self.stats["ok"] += 1
+                self._completions.append(now)
+                self._latency = latency_s if self._latency is None else 0.8 * self._latency + 0.2 * latency_s
+                if latency_s > self.latency_target_s:
+                    self.stats["slow"] += 1
+                    self.rate = max(self.min_rate, self.rate * self.slow_decrease)
+                else:
+                    self.rate = min(self.max_rate, self.rate + self.increase / max(self.rate, 1.0))
+                    self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self):
+        """Blocco limitato: chi lo usa scrive in outcome["status"] (e "retry_after") l'esito della richiesta."""
+        self.acquire()
+        outcome = {"status": None, "retry_after": None}
+        start = time.monotonic()
+        try:
+            yield outcome
+        finally:
+            self.release(outcome["status"], time.monotonic() - start, outcome["retry_after"])
+
+    # Risposte riuscite al secondo nell'ultima finestra
+    def throughput(self):
+        with self._cond:
+            now = time.monotonic()
+            while self._completions and now - self._completions[0] > self.window_s:
+                self._completions.popleft()
+            if not self._completions: return 0.0
+            return len(self._completions) / max(1.0, min(self.window_s, now - self._completions[0]))
+
+    def get_stats(self):
+        throughput = self.throughput()
+        with self._cond:
+            return {
+                **self.stats, "waited_s": round(self.stats["waited_s"], 2),
+                "rate": round(self.rate, 2), "concurrency": int(self.concurrency), "in_flight": self.in_flight,
+                "throughput": round(throughput, 2),
+                "latency_s": round(self._latency, 3) if self._latency is not None else None,
+            }
+
+
+# Risposta che chiede di rallentare: errore di rete, 5xx, o 4xx diverso da 404 (brano non trovato = risposta normale)
+def _is_backoff_status(status):
+    return status is None or status >= 500 or (400 <= status < 500 and status != 404)
+
+
+# Retry-After in secondi (solo forma numerica)
+def _retry_after(value):
+    try:
+        return max(0.0, float(value)) if value else None
+    except ValueError:
+        return None
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    """Adapter di requests: ogni richiesta della sessione passa dal limitatore e gli riporta status e latenza."""
+    def __init__(self, limiter, **kwargs):
+        self.limiter = limiter
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        with self.limiter.slot() as outcome:
+            response = super().send(request, **kwargs)
+            outcome["status"] = response.status_code
+            outcome["retry_after"] = _retry_after(response.headers.get("Retry-After"))
+            return response
+
+
+# Applica il limitatore a tutte le richieste di una sessione requests (es. quella interna di lyricsgenius)
+def throttle_session(session, limiter):
+    adapter = RateLimitedAdapter(limiter, pool_maxsize=limiter.max_concurrency)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+_shared_limiters = {}
+_shared_lock = threading.Lock()
+
+
+# Un limitatore per servizio, condiviso da tutti i manager del processo
+def get_rate_limiter(name, **kwargs):
+    with _shared_lock:
+        if name not in _shared_limiters:
+            _shared_limiters[name] = AdaptiveRateLimiter(name, **kwargs)
+        return _shared_limiters[name]
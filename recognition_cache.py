@@ -0,0 +1,77 @@
+import copy
+import threading
+from collections import OrderedDict
+
+
+# Distanza di Hamming tra due hash a 64 bit
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class RecognitionCache:
+    """
+    Cache dei risultati di riconoscimento (ACR e Scribe) indicizzata per hash percettivo della finestra.
+    Finestre quasi identiche (stessa sezione del brano, hash entro 'max_distance' bit) vengono servite
+    localmente senza nuove chiamate API. Scadenza a TTL e rimozione LRU oltre 'max_entries'.
+    Il tempo è passato dal chiamante ('now', in secondi): in replay si usa l'orologio dell'audio.
+    """
+    def __init__(self, ttl_s=60, max_entries=128, max_distance=3):
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self._entries = OrderedDict()   # hash -> {"created", "acr", "scribe"}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expired": 0}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    # Ricerca della voce più vicina (entro max_distance) ancora valida
+    def lookup(self, key, now):
+        if key is None: return None
+        with self._lock:
+            self._expire(now)
+            best_key, best_distance = None, self.max_distance + 1
+            for entry_key in self._entries:
+                distance = hamming(key, entry_key)
+                if distance < best_distance:
+                    best_key, best_distance = entry_key, distance
+                    if distance == 0: break
+
+            if best_key is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["hits"] += 1
+            self._entries.move_to_end(best_key)
+            # Copia profonda: l'arbitraggio arricchisce i risultati in place
+            return copy.deepcopy(self._entries[best_key])
+
+    # Salva (o completa) i risultati di una finestra. Si memorizzano solo risposte positive.
+    def store(self, key, now, acr_result=None, scribe_result=None):
+        if key is None: return
+        acr_ok = acr_result is not None and acr_result.get("status") == "multiple_results"
+        if not acr_ok and not scribe_result: return
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = {"created": now, "acr": None, "scribe": None}
+            if acr_ok: entry["acr"] = acr_result
+            if scribe_result: entry["scribe"] = scribe_result
+            self._entries.move_to_end(key)
+            self.stats["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def _expire(self, now):
+        expired = [k for k, e in self._entries.items() if now - e["created"] > self.ttl_s]
+        for k in expired:
+            del self._entries[k]
+        self.stats["expired"] += len(expired)
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {**self.stats, "size": len(self._entries),
+                    "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0}
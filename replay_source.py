@@ -0,0 +1,108 @@
+import os
+import sys
+import json
+import argparse
+import numpy as np
+import scipy.io.wavfile as wav
+
+from audio_dsp import StreamingResampler
+
+# Lettura FLAC (e altri formati) opzionale
+try:
+    import soundfile as sf
+except ImportError:
+    sf = None
+
+AUDIO_EXTENSIONS = (".wav", ".flac", ".ogg", ".aiff", ".aif")
+
+
+# Elenco dei file audio da analizzare (file singolo o cartella, in ordine alfabetico)
+def list_audio_files(path):
+    if os.path.isdir(path):
+        files = []
+        for root, _, names in os.walk(path):
+            files.extend(os.path.join(root, n) for n in names if n.lower().endswith(AUDIO_EXTENSIONS))
+        return sorted(files)
+    return [path]
+
+
+class AudioFileSource:
+    """
+    Sorgente audio da file per la modalità replay: legge a blocchi (senza caricare l'intero concerto in RAM),
+    converte in float32 mono (N, 1) e ricampiona alla frequenza della pipeline se necessario.
+    Produce blocchi nello stesso formato del callback di sounddevice.
+    """
+    def __init__(self, path, target_rate, block_size=4096):
+        self.path = path
+        self.target_rate = target_rate
+        self.block_size = block_size
+        self.sample_rate = None
+        self.duration_s = None
+        self._open()
+
+    def _open(self):
+        if self.path.lower().endswith(".wav"):
+            try:
+                self.sample_rate, self._data = wav.read(self.path, mmap=True)
+            except ValueError:
+                # Alcuni formati (es. 24 bit) non supportano il memory-map
+                self.sample_rate, self._data = wav.read(self.path)
+            self._reader = self._wav_blocks
+            self.duration_s = len(self._data) / self.sample_rate
+        else:
+            if sf is None:
+                raise RuntimeError(f"Formato non supportato senza 'soundfile' installato: {self.path}")
+            info = sf.info(self.path)
+            self.sample_rate = info.samplerate
+            self.duration_s = info.duration
+            self._reader = self._soundfile_blocks
+
+        self._resampler = None
+        if self.sample_rate != self.target_rate:
+            self._resampler = StreamingResampler(self.sample_rate, self.target_rate)
+
+    def _wav_blocks(self):
+        data = self._data
+        scale = float(np.iinfo(data.dtype).max) if np.issubdtype(data.dtype, np.integer) else 1.0
+        for start in range(0, len(data), self.block_size):
+            chunk = np.asarray(data[start:start + self.block_size], dtype=np.float32)
+            if scale != 1.0: chunk /= scale
+            yield chunk
+
+    def _soundfile_blocks(self):
+        for chunk in sf.blocks(self.path, blocksize=self.block_size, dtype="float32", always_2d=True):
+            yield chunk
+
+    def __iter__(self):
+        for chunk in self._reader():
+            if chunk.ndim > 1:
+                chunk = chunk.mean(axis=1)
+            chunk = chunk.reshape(-1, 1)
+            if self._resampler:
+                chunk = self._resampler.process(chunk)
+                if len(chunk) == 0: continue
+            yield chunk
+
+
+# ESECUZIONE DA RIGA DI COMANDO (batch di registrazioni)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analisi offline di registrazioni (WAV/FLAC) con la pipeline di riconoscimento.")
+    parser.add_argument("path", help="File audio o cartella di registrazioni")
+    parser.add_argument("--artist", default=None, help="Artista target (bias)")
+    parser.add_argument("--parallel", type=int, default=2, help="Finestre analizzate in parallelo")
+    parser.add_argument("--out", default=None, help="File JSONL di output (default: stdout)")
+    args = parser.parse_args()
+
+    from audio_manager import AudioManager
+
+    out = open(args.out, "w", encoding="utf-8") if args.out else sys.stdout
+
+    def write_result(data, target_artist=None):
+        row = {k: data.get(k) for k in ("replay_file", "replay_offset_s", "title", "artist", "score", "type")}
+        out.write(json.dumps(row, ensure_ascii=False) + "\n")
+        out.flush()
+
+    bot = AudioManager()
+    summary = bot.run_offline_replay(args.path, write_result, target_artist=args.artist, parallelism=args.parallel)
+    print(f"🏁 Replay completato: {json.dumps(summary)}", file=sys.stderr)
+    if args.out: out.close()
@@ -0,0 +1,87 @@
+import os
+import threading
+from collections import Counter
+
+
+class ScribeScheduler:
+    """
+    Decide finestra per finestra se vale la pena trascrivere con Scribe, in base all'incertezza di ACR:
+    - ACR non trova nulla (o va in errore)
+    - margine ridotto tra i primi due candidati
+    - sezione riconosciuta come humming/cover
+    - storico recente in conflitto (brani diversi nelle ultime rilevazioni)
+    Con ACR sicuro Scribe non viene chiamato. Un budget per sessione (chiamate e secondi di audio)
+    e una pausa minima tra due trascrizioni limitano il costo.
+    """
+    def __init__(self, max_calls=None, max_seconds=None, margin=10, min_gap_s=10):
+        self.max_calls = max_calls if max_calls is not None else int(os.getenv("SCRIBE_MAX_CALLS", 120))
+        self.max_seconds = max_seconds if max_seconds is not None else float(os.getenv("SCRIBE_MAX_SECONDS", 1200))
+        self.margin = margin
+        self.min_gap_s = min_gap_s
+        self._lock = threading.Lock()
+        self.reset()
+
+    # Nuova sessione: budget pieno
+    def reset(self):
+        with self._lock:
+            self.calls = 0
+            self.seconds = 0.0
+            self._last_call_clock = None
+            self._last_reason = None
+            self.reasons = Counter()
+            self.skipped = Counter()
+
+    # Motivo di incertezza della risposta ACR (None se ACR è sicuro)
+    def uncertainty(self, acr_result):
+        if not acr_result: return "acr_missing"
+        status = acr_result.get("status")
+        if status == "error": return "acr_error"
+        if status != "multiple_results": return "acr_not_found"
+
+        tracks = acr_result["tracks"]
+        if tracks[0].get("type") == "Cover/Humming": return "humming"
+        if len(tracks) > 1:
+            top, second = tracks[0], tracks[1]
+            different = (top.get("title") or "").lower() != (second.get("title") or "").lower()
+            if different and top.get("score", 0) - second.get("score", 0) < self.margin:
+                return "low_margin"
+        return None
+
+    # Registra l'esito ACR della finestra (usato per anticipare Scribe sulla successiva)
+    def observe(self, acr_result):
+        reason = self.uncertainty(acr_result)
+        with self._lock: self._last_reason = reason
+        return reason
+
+    # Prima di ACR: Scribe in parallelo se la finestra precedente era incerta o lo storico è in conflitto
+    def plan(self, history_conflict=False):
+        if history_conflict: return "history_conflict"
+        with self._lock:
+            return f"previous_{self._last_reason}" if self._last_reason else None
+
+    # Prenota una trascrizione nel budget della sessione ('clock' = secondi di audio)
+    def acquire(self, clock, seconds, reason):
+        with self._lock:
+            if self.calls >= self.max_calls or self.seconds + seconds > self.max_seconds:
+                self.skipped["budget"] += 1
+                return False
+            if self._last_call_clock is not None and clock - self._last_call_clock < self.min_gap_s:
+                self.skipped["cooldown"] += 1
+                return False
+            self.calls += 1
+            self.seconds += seconds
+            self._last_call_clock = clock
+            self.reasons[reason] += 1
+            return True
+
+    # Finestra in cui ACR era sicuro: Scribe non serve
+    def skip_confident(self):
+        with self._lock: self.skipped["confident"] += 1
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "calls": self.calls, "seconds": round(self.seconds, 1),
+                "max_calls": self.max_calls, "max_seconds": self.max_seconds,
+                "reasons": dict(self.reasons), "skipped": dict(self.skipped),
+            }
@@ -1,12 +1,11 @@
 import threading
 import time
-import re
-import unicodedata
 from datetime import datetime
 from threading import Lock
 from metadata_manager import MetadataManager
 from spotify_manager import SpotifyManager
-from difflib import SequenceMatcher
+from fuzzy_match import ratio
+from text_normalize import normalize_key, base_title
 from werkzeug.security import generate_password_hash, check_password_hash
 
 # Collegamento a Firestore
@@ -262,15 +261,7 @@ class SessionManager:
 
     # Normalizzazione stringhe per confronto
     def _normalize_string(self, text):
-        if not text: return ""
-        text = re.sub(r"(?i)\b(amazon\s+music|apple\s+music|spotify|deezer|youtube|vevo)\b.*", "", text)
-        text = re.sub(r"[\(\[\{].*?[\)\]\}]", "", text)
-        text = re.sub(r"(?i)\b(live\s+(at|in|from|on))\b.*", "", text)
-        text = re.sub(r"(?i)\s-\s.*live.*", "", text)
-        text = re.sub(r"(?i)\b(feat\.|ft\.|remix|edit|version|karaoke|performed by|originally by)\b.*", "", text)
-        text = unicodedata.normalize('NFD', text).encode('ascii', 'ignore').decode("utf-8")
-        clean = re.sub(r"[^a-zA-Z0-9\s]", "", text) 
-        return clean.strip().lower()
+        return normalize_key(text)
 
     # Confronto fuzzy tra canzoni per evitare duplicati simili
     def _are_songs_equivalent(self, new_s, existing_s):
@@ -279,10 +270,10 @@ class SessionManager:
         tit_ex = self._normalize_string(existing_s['title'])
         art_new = self._normalize_string(new_s['artist'])
         art_ex = self._normalize_string(existing_s['artist'])
-        title_similarity = SequenceMatcher(None, tit_new, tit_ex).ratio()
+        title_similarity = ratio(tit_new, tit_ex, score_cutoff=0.80)
         if title_similarity > 0.90:
             if art_new == art_ex or art_new in art_ex or art_ex in art_new: return True
-            art_similarity = SequenceMatcher(None, art_new, art_ex).ratio()
+            art_similarity = ratio(art_new, art_ex, score_cutoff=0.60)
             if art_similarity > 0.60: return True
             return False
         if title_similarity > 0.80:
@@ -310,10 +301,7 @@ class SessionManager:
 
             if self.spotify_bot:
                 try:
-                    clean_title_base = re.sub(r"[\(\[].*?[\)\]]", "", title).strip()
-                    clean_title_base = re.sub(r"(?i)\b(live\s+(at|in|from|on))\b.*", "", clean_title_base)
-                    clean_title_base = re.sub(r"(?i)\s-\s.*live.*", "", clean_title_base)
-                    clean_title_base = re.sub(r"(?i)\b(feat\.|ft\.|remix|edit|version)\b.*", "", clean_title_base).strip()
+                    clean_title_base = base_title(title)
 
                     bias_resolved = False
                     if target_artist:
@@ -1,36 +1,168 @@
-import requests
 import os
 import json
 import re
-from difflib import SequenceMatcher
-from collections import Counter
+from collections import Counter, defaultdict
+from http_client import get_http_client
+from fuzzy_match import ratio
+from text_normalize import alnum_lower, strip_noise_words
+from setlist_model import TransitionModel
+from context_store import get_context_store
+
+
+class WhitelistIndex:
+    """
+    Indice dei brani delle scalette, compilato una volta quando il contesto viene caricato.
+    Ogni titolo è pulito (punteggiatura, parole di rumore) una sola volta; una ricerca tocca solo:
+    - l'insieme dei titoli puliti (match esatto, O(1))
+    - i titoli che condividono abbastanza trigrammi da poter superare la soglia fuzzy (indice invertito)
+    - i titoli corti (< 5 caratteri) indicizzati per prima parola, cercati come parole intere
+    Stesse decisioni del confronto esaustivo: la soglia sui trigrammi è il limite del q-gram lemma.
+    """
+    def __init__(self, titles=(), threshold=0.92, q=3, memo_size=4096):
+        self.threshold = threshold
+        self.q = q
+        self.memo_size = memo_size
+        self._memo = {}
+        self.exact = set()
+        self.entries = []                   # titoli puliti (id = posizione)
+        self.grams = defaultdict(dict)      # trigramma -> {id: occorrenze}
+        self.short = defaultdict(list)      # prima parola -> [(titolo corto, pattern)]
+        self.stats = {"lookups": 0, "memo_hits": 0, "exact": 0, "fuzzy_checks": 0, "short_checks": 0}
+
+        for title in titles:
+            clean = self._clean(title)
+            # Un titolo vuoto dopo la pulizia (es. solo "Live") non deve validare qualunque cosa
+            if not clean or clean in self.exact: continue
+            self.exact.add(clean)
+            entry_id = len(self.entries)
+            self.entries.append(clean)
+            for gram, count in self._grams(clean).items():
+                self.grams[gram][entry_id] = count
+            if len(clean) < 5:
+                self.short[clean.split()[0]].append((clean, re.compile(r"\b" + re.escape(clean) + r"\b")))
+
+    @staticmethod
+    def _clean(title):
+        return strip_noise_words(alnum_lower(title))
+
+    def _grams(self, text):
+        q = self.q
+        if len(text) < q: return Counter([text])
+        return Counter(text[i:i + q] for i in range(len(text) - q + 1))
+
+    # Trigrammi condivisi minimi per poter superare la soglia (q-gram lemma, con distanza Indel massima)
+    def _min_shared(self, len_a, len_b):
+        max_distance = int((1 - self.threshold) * (len_a + len_b))
+        return max(len_a, len_b) - self.q + 1 - self.q * max_distance
+
+    # Esito memorizzato per titolo: gli stessi candidati ACR tornano a ogni finestra
+    def contains(self, title):
+        self.stats["lookups"] += 1
+        found = self._memo.get(title)
+        if found is None:
+            if len(self._memo) >= self.memo_size: self._memo.clear()
+            found = self._memo[title] = self._contains(title)
+        else:
+            self.stats["memo_hits"] += 1
+        return found
+
+    def _contains(self, title):
+        raw_clean = alnum_lower(title)
+        clean = strip_noise_words(raw_clean)
+        if not clean: return False
+
+        # --- CASO 1: Match Esatto (Dopo la pulizia) ---
+        if clean in self.exact:
+            self.stats["exact"] += 1
+            return True
+
+        # --- CASO 2: Fuzzy Match (per piccoli errori di battitura), solo sui candidati dell'indice ---
+        shared = Counter()
+        for gram, count in self._grams(clean).items():
+            for entry_id, entry_count in self.grams.get(gram, {}).items():
+                shared[entry_id] += min(count, entry_count)
+        for entry_id, common in shared.items():
+            candidate = self.entries[entry_id]
+            if common < self._min_shared(len(clean), len(candidate)): continue
+            self.stats["fuzzy_checks"] += 1
+            if ratio(clean, candidate, score_cutoff=self.threshold) > self.threshold:
+                return True
+
+        # --- CASO 3: Titoli Corti (< 5 char): parola intera esatta nel titolo pulito ---
+        for word in set(raw_clean.split()):
+            for candidate, pattern in self.short.get(word, ()):
+                self.stats["short_checks"] += 1
+                if pattern.search(raw_clean): return True
+        return False
+
 
 class SetlistManager:
     def __init__(self):
         self.api_key = os.getenv("SETLIST_FM_KEY")
         self.base_url = "https://api.setlist.fm/rest/1.0"
+        self.http = get_http_client()
         self.headers = {
             "x-api-key": self.api_key,
             "Accept": "application/json"
         }
         # Salviamo sia l'insieme piatto (per la whitelist) sia le sequenze ordinate
-        self.cached_songs = []       # Lista semplice per i controlli rapidi
+        self.cached_songs = []       # Lista semplice per i controlli rapidi (assegnarla ricompila l'indice)
         self.concert_sequences = []  # Lista di liste (ogni lista è un concerto ordinato)
 
+    # Whitelist: a ogni assegnazione viene compilato l'indice usato da check_is_likely
+    @property
+    def cached_songs(self):
+        return self._cached_songs
+
+    @cached_songs.setter
+    def cached_songs(self, songs):
+        self._cached_songs = list(songs)
+        self.whitelist = WhitelistIndex(self._cached_songs)
+
+    # Sequenze dei concerti: a ogni assegnazione viene ricostruito il modello delle transizioni
+    @property
+    def concert_sequences(self):
+        return self._concert_sequences
+
+    @concert_sequences.setter
+    def concert_sequences(self, sequences):
+        self._concert_sequences = list(sequences)
+        self.transitions = TransitionModel(self._concert_sequences)
+
     # Recupera la lista delle canzoni più probabili per un artista, basandosi sulle scalette recenti.
     def get_likely_songs(self, artist_name):
         """
-        Scarica le scalette e prepara sia la cache piatta che le sequenze per la predizione.
+        Prepara sia la cache piatta che le sequenze per la predizione.
+        """
+        context = self.fetch_context(artist_name)
+        if not context:
+            return []
+
+        self.cached_songs = context["songs"]
+        self.concert_sequences = context["sequences"]
+        return list(context["songs"])
+
+    # Scalette dell'artista senza modificare lo stato: {"songs": [...], "sequences": [[...], ...]} o None
+    def fetch_context(self, artist_name):
+        """
+        Le scalette vengono dall'archivio locale se già scaricate (ricaricate in background se scadute).
         """
         if not self.api_key:
             print("⚠️ [Setlist] Nessuna API Key trovata nel file .env")
-            return []
+            return None
 
+        context = get_context_store().fetch(artist_name, "setlist", lambda: self._download_setlists(artist_name))
+        if context:
+            print(f"     ✅ [Setlist] {len(context['songs'])} brani e {len(context['sequences'])} concerti pronti.")
+        return context
+
+    # Scarica le scalette del primo candidato che ne ha: {"songs": [...], "sequences": [[...], ...]}
+    def _download_setlists(self, artist_name):
         print(f"📊 [Setlist] Cerco scalette e sequenze per: '{artist_name}'...")
         
         candidates = self._search_artist_candidates(artist_name)
         if not candidates:
-            return []
+            return None
 
         for candidate in candidates:
             mbid = candidate['mbid']
@@ -38,98 +170,77 @@ class SetlistManager:
             
             print(f"     🔍 Analisi candidato: {name_found}...")
             
-            # Scarica e salva le sequenze ordinate
+            # Scarica le sequenze ordinate
             unique_songs, sequences = self._fetch_last_setlists_ordered(mbid)
             
             if unique_songs:
-                self.cached_songs = list(unique_songs)
-                self.concert_sequences = sequences
-                print(f"     ✅ Trovato! Caricati {len(unique_songs)} brani e {len(sequences)} concerti completi.")
-                return list(unique_songs)
+                print(f"     ✅ Trovato! Scaricati {len(unique_songs)} brani e {len(sequences)} concerti completi.")
+                return {"songs": sorted(unique_songs), "sequences": sequences}
             
-        return []
+        return None
 
-    # Predice la prossima canzone basandosi su cosa viene suonato di solito DOPO la canzone corrente nei concerti memorizzati.
-    def predict_next(self, current_title):
+    # Predice le prossime canzoni basandosi su cosa viene suonato di solito DOPO la canzone corrente (e la precedente) nei concerti memorizzati.
+    def predict_next(self, current_title, previous_title=None, k=3):
         """
-        Data la canzone corrente, guarda nello storico cosa viene suonato di solito DOPO.
-        Restituisce il titolo più probabile o None.
+        Data la canzone corrente (ed eventualmente la precedente), consulta il modello delle transizioni.
+        Restituisce i k titoli più probabili come lista di (titolo, id canonico, probabilità), o lista vuota.
         """
-        if not self.concert_sequences or not current_title:
-            return None
-        
-        current_clean = current_title.lower().strip()
-        candidates = []
-
-        # Scorre tutti i concerti memorizzati
-        for concert in self.concert_sequences:
-            for i, song in enumerate(concert):
-                # Se trova la canzone corrente e NON è l'ultima del concerto
-                # (Usiamo ratio > 0.9 per essere sicuri di non rilevare falsi positivi)
-                if SequenceMatcher(None, current_clean, song.lower()).ratio() > 0.9:
-                    if i + 1 < len(concert):
-                        next_song = concert[i + 1]
-                        candidates.append(next_song)
-
-        if not candidates:
-            return None
+        if not self.transitions or not current_title:
+            return []
 
-        # Trova la canzone più frequente tra i candidati successivi
-        most_common = Counter(candidates).most_common(1)
-        if most_common:
-            prediction = most_common[0][0]
-            confidence = most_common[0][1] # Quante volte appare
-            print(f"🔮 [PREDICTION] Dopo '{current_title}' c'è spesso: '{prediction}' (Visto {confidence} volte)")
-            return prediction
-        
-        return None
+        predictions = self.transitions.predict(current_title, previous_title, k=k)
+        if predictions:
+            summary = ", ".join(f"'{title}' ({p:.0%})" for title, _, p in predictions)
+            print(f"🔮 [PREDICTION] Dopo '{current_title}' c'è spesso: {summary}")
+        return predictions
 
     # Tiene conto dell'ordine delle canzoni
-    def _fetch_last_setlists_ordered(self, mbid):
+    def _fetch_last_setlists_ordered(self, mbid, whitelist_concerts=5, max_concerts=30, max_pages=3):
         """
         Versione avanzata che restituisce anche l'ordine delle canzoni.
+        La whitelist usa solo gli ultimi 'whitelist_concerts' concerti; il modello delle transizioni
+        usa fino a 'max_concerts' concerti (più pagine di setlist.fm, 20 scalette per pagina).
         """
         url = f"{self.base_url}/artist/{mbid}/setlists"
+        unique_songs = set()
+        sequences = []
         try:
-            res = requests.get(url, headers=self.headers)
-            if res.status_code == 200:
-                data = res.json()
-                unique_songs = set()
-                sequences = []
-                
-                setlists = data.get("setlist", [])
-                valid_found = 0
-                
+            for page in range(1, max_pages + 1):
+                res = self.http.get(url, headers=self.headers, params={"p": page})
+                if res.status_code != 200: break
+                setlists = res.json().get("setlist", [])
+
                 for concert in setlists:
                     sets = concert.get("sets", {}).get("set", [])
                     if not sets: continue
-                    
+
                     concert_song_list = []
-                    
+
                     for set_section in sets:
                         for song in set_section.get("song", []):
                             if "name" in song:
-                                s_name = song["name"].strip()
-                                unique_songs.add(s_name.lower())
-                                concert_song_list.append(s_name)
-                    
+                                concert_song_list.append(song["name"].strip())
+
                     if concert_song_list:
+                        # Whitelist solo dai concerti più recenti
+                        if len(sequences) < whitelist_concerts:
+                            unique_songs.update(name.lower() for name in concert_song_list)
                         sequences.append(concert_song_list)
-                        valid_found += 1
-                    
-                    if valid_found >= 5: break # Analizziamo gli ultimi 5 concerti
-                
-                return unique_songs, sequences
+
+                    if len(sequences) >= max_concerts: return unique_songs, sequences
+
+                if len(setlists) < 20: break # Ultima pagina
+            return unique_songs, sequences
         except Exception as e:
             print(f"❌ Errore download setlist: {e}")
-        return set(), []
+        return unique_songs, sequences
 
     # Cerca i candidati per l'artista basandosi sul nome (con ricerca fuzzy) e restituisce i primi 3 risultati più rilevanti.
     def _search_artist_candidates(self, name):
         url = f"{self.base_url}/search/artists"
         params = {"artistName": name, "sort": "relevance"}
         try:
-            res = requests.get(url, headers=self.headers, params=params)
+            res = self.http.get(url, headers=self.headers, params=params)
             if res.status_code == 200:
                 return res.json().get("artist", [])[:3]
         except: pass
@@ -138,64 +249,4 @@ class SetlistManager:
     # Controlla se un titolo è "probabilmente" presente nelle scalette memorizzate, usando una logica più intelligente che tiene conto di parole comuni da ignorare e di fuzzy matching.
     def check_is_likely(self, title):
         if not self.cached_songs: return False
-        
-        # 1. Pulizia base (caratteri speciali)
-        raw_clean_input = re.sub(r"[^a-zA-Z0-9\s]", "", title).lower().strip()
-        
-        # 2. Pulizia avanzata (rimozione "Live", "Remaster", ecc.)
-        smart_clean_input = self._clean_noise_words(raw_clean_input)
-        
-        if not smart_clean_input: return False
-
-        for likely in self.cached_songs:
-            # Puliamo anche il titolo della scaletta per sicurezza
-            raw_clean_likely = re.sub(r"[^a-zA-Z0-9\s]", "", likely).lower().strip()
-            # Di solito nelle scalette non c'è "Live", ma per sicurezza lo rimuoviamo:
-            clean_likely = self._clean_noise_words(raw_clean_likely) 
-
-            # --- CASO 1: Match Esatto (Dopo la pulizia) ---
-            if smart_clean_input == clean_likely:
-                return True
-                
-            # --- CASO 2: Fuzzy Match (per piccoli errori di battitura) ---
-            # Alziamo leggermente la soglia o usiamo ratio su stringhe pulite
-            similarity = SequenceMatcher(None, smart_clean_input, clean_likely).ratio()
-            
-            # Soglia alta (0.90 o 0.95)
-            if similarity > 0.92:
-                return True
-            
-            # --- CASO 3: Gestione Titoli Corti (< 5 char) ---
-            # I titoli corti non devono MAI usare fuzzy match lasco.
-            # Devono essere identici (già coperto dal CASO 1) o parole isolate.
-            if len(clean_likely) < 5:
-                # Cerca parola intera esatta nel testo originale pulito
-                pattern = r"\b" + re.escape(clean_likely) + r"\b"
-                if re.search(pattern, raw_clean_input): 
-                    # Verifica che non sia parte di una frase molto più lunga
-                    return True
-
-        return False
-    
-    # Metodo per rimuovere parole comuni che non influenzano l'identità della canzone, come "live", "remaster", ecc.
-    def _clean_noise_words(self, text):
-        """
-        Rimuove parole comuni che non cambiano l'identità della canzone
-        ma solo la versione (live, remaster, ecc.).
-        """
-        # Lista di parole da ignorare
-        stop_words = [
-            "live", "remaster", "remastered", "mix", "version", 
-            "edit", "feat", "ft", "studio", "session", "acoustic", 
-            "demo", "official", "video", "lyrics"
-        ]
-        
-        # Crea pattern per rimuovere queste parole (es. " live " o " live" a fine stringa)
-        clean_text = text
-        for word in stop_words:
-            # Rimuove la parola se è isolata (\b)
-            pattern = r"\b" + re.escape(word) + r"\b"
-            clean_text = re.sub(pattern, "", clean_text)
-            
-        # Rimuove spazi doppi creati dalla rimozione
-        return re.sub(r"\s+", " ", clean_text).strip()
\ No newline at end of file
+        return self.whitelist.contains(title)
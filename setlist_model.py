@@ -0,0 +1,93 @@
+from collections import Counter, defaultdict
+
+from fuzzy_match import ratio
+from text_normalize import normalize_title, strip_noise_words
+
+
+# Identificativo canonico di un brano (stesso id per "Titolo", "Titolo (Live)", "Títolo - Remastered")
+def song_id(title):
+    return strip_noise_words(normalize_title(title))
+
+
+class TransitionModel:
+    """
+    Modello di Markov delle scalette, costruito una volta al caricamento dei concerti.
+    Conteggi delle transizioni di primo ordine (brano -> successivo) e di secondo ordine
+    (coppia di brani -> successivo) per id canonico. Le probabilità sono lisciate (add-alpha sul
+    vocabolario) e il secondo ordine, quando il contesto è stato visto, viene interpolato col primo
+    con un peso che cresce con le osservazioni (n / (n + k)).
+    La predizione è una ricerca in dizionario; solo il titolo in ingresso, se non è già noto,
+    viene risolto una volta con un confronto fuzzy e poi memorizzato.
+    """
+    def __init__(self, sequences=(), alpha=0.5, backoff_k=2.0, fuzzy_threshold=0.9):
+        self.alpha = alpha
+        self.backoff_k = backoff_k
+        self.fuzzy_threshold = fuzzy_threshold
+        self.first = defaultdict(Counter)     # id -> Counter(id successivo)
+        self.second = defaultdict(Counter)    # (id precedente, id) -> Counter(id successivo)
+        self._spellings = defaultdict(Counter)
+        self._resolved = {}
+        self.concerts = 0
+
+        for concert in sequences:
+            ids = []
+            for title in concert:
+                sid = song_id(title)
+                if not sid: continue
+                self._spellings[sid][title] += 1
+                ids.append(sid)
+            if len(ids) < 2: continue
+            self.concerts += 1
+            for i in range(1, len(ids)):
+                self.first[ids[i - 1]][ids[i]] += 1
+                if i >= 2: self.second[(ids[i - 2], ids[i - 1])][ids[i]] += 1
+
+        self.vocabulary = len(self._spellings)
+        # Titolo mostrato: la grafia più frequente nelle scalette
+        self.titles = {sid: spellings.most_common(1)[0][0] for sid, spellings in self._spellings.items()}
+
+    def __bool__(self):
+        return bool(self.first)
+
+    # Id canonico di un titolo rilevato (esatto, altrimenti il più simile tra quelli noti)
+    def resolve(self, title):
+        sid = song_id(title)
+        if not sid: return None
+        if sid in self.titles: return sid
+        if sid not in self._resolved:
+            best, best_score = None, self.fuzzy_threshold
+            for known in self.titles:
+                score = ratio(sid, known, score_cutoff=best_score)
+                if score > best_score: best, best_score = known, score
+            self._resolved[sid] = best
+        return self._resolved[sid]
+
+    def _smoothed(self, counts, candidate):
+        return (counts[candidate] + self.alpha) / (sum(counts.values()) + self.alpha * self.vocabulary)
+
+    # Probabilità dei brani successivi: [(id, probabilità)] ordinati, solo transizioni osservate
+    def next_probabilities(self, current_id, previous_id=None):
+        first = self.first.get(current_id)
+        if not first: return []
+        second = self.second.get((previous_id, current_id)) if previous_id else None
+
+        weight = 0.0
+        if second:
+            seen = sum(second.values())
+            weight = seen / (seen + self.backoff_k)
+
+        candidates = set(first) | set(second or ())
+        probabilities = {}
+        for candidate in candidates:
+            p = (1 - weight) * self._smoothed(first, candidate)
+            if weight: p += weight * self._smoothed(second, candidate)
+            probabilities[candidate] = p
+        return sorted(probabilities.items(), key=lambda kv: kv[1], reverse=True)
+
+    # Top-k dei brani successivi a partire da titoli rilevati: [(titolo, id, probabilità)]
+    def predict(self, current_title, previous_title=None, k=3):
+        current_id = self.resolve(current_title)
+        if current_id is None: return []
+        previous_id = self.resolve(previous_title) if previous_title else None
+        return [(self.titles[sid], sid, round(p, 4))
+                for sid, p in self.next_probabilities(current_id, previous_id)[:k]]
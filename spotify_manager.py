@@ -1,8 +1,11 @@
 import spotipy
 from spotipy.oauth2 import SpotifyClientCredentials
 import os
-import re
 from dotenv import load_dotenv
+from http_client import get_http_client
+import fuzzy_match
+from context_store import get_context_store
+from text_normalize import search_title, core_title, strip_title_suffixes
 
 load_dotenv()
 
@@ -14,16 +17,24 @@ class SpotifyManager:
         self.sp = None
         if client_id and client_secret:
             try:
-                auth_manager = SpotifyClientCredentials(client_id=client_id, client_secret=client_secret)
-                self.sp = spotipy.Spotify(auth_manager=auth_manager)
+                # Sessione HTTP condivisa: token e ricerche riusano le connessioni già aperte
+                session = get_http_client().session
+                auth_manager = SpotifyClientCredentials(client_id=client_id, client_secret=client_secret, requests_session=session)
+                self.sp = spotipy.Spotify(auth_manager=auth_manager, requests_session=session)
                 print("✅ [Spotify] API Connessa.")
             except Exception as e:
                 print(f"⚠️ [Spotify] Errore Auth: {e}")
         else:
             print("⚠️ [Spotify] Credenziali mancanti nel .env")
 
-    # Scarica canzoni più famose e ultimo album
+    # Canzoni più famose e ultimo album, dall'archivio locale se già scaricate (ricaricate in background se scadute)
     def get_artist_complete_data(self, artist_name):
+        if not self.sp: return []
+        songs = get_context_store().fetch(artist_name, "spotify", lambda: self._download_artist_tracks(artist_name))
+        return list(songs or [])
+
+    # Scarica canzoni più famose e ultimo album
+    def _download_artist_tracks(self, artist_name):
         """
         Scarica un pacchetto completo di canzoni probabili:
         - Top 10 Tracks (Le Hit assolute)
@@ -62,7 +73,7 @@ class SpotifyManager:
 
             count = len(collected_songs)
             print(f"     📥 [Spotify] Aggiunti {count} brani (Hit + New Album).")
-            return list(collected_songs)
+            return sorted(collected_songs)
 
         except Exception as e:
             print(f"❌ Errore Spotify: {e}")
@@ -76,15 +87,12 @@ class SpotifyManager:
         if not self.sp: return None
         
         # Pulizia titolo
-        clean_title = re.sub(r"[\(\[].*?[\)\]]", "", title)
-        clean_title = re.sub(r"(?i)\b(feat\.|ft\.|remix|edit|version|live|remastered|remaster)\b.*", "", clean_title)
-        clean_title = re.sub(r"\s-\s.*", "", clean_title)
-        clean_title = clean_title.strip()
+        clean_title = search_title(title)
 
         # Se la pulizia ha svuotato troppo la stringa, usa l'originale per sicurezza
-        search_title = clean_title if len(clean_title) > 1 else title
+        query_title = clean_title if len(clean_title) > 1 else title
 
-        query = f"track:{search_title} artist:{artist}"
+        query = f"track:{query_title} artist:{artist}"
         try:
             results = self.sp.search(q=query, type='track', limit=1)
             items = results['tracks']['items']
@@ -103,16 +111,8 @@ class SpotifyManager:
         """
         if not self.sp: return None
         
-        import re
-        from difflib import SequenceMatcher
-
-        # Funzione helper interna per pulire i titoli per il confronto
-        def clean_spotify_title(t):
-            # Rimuove parentesi e contenuto
-            t = re.sub(r"[\(\[].*?[\)\]]", "", t)
-            # Rimuove trattini seguiti da qualsiasi cosa (es. " - Remaster 2012")
-            t = re.sub(r"\s-\s.*", "", t)
-            return t.strip().lower()
+        # Pulizia dei titoli per il confronto: parentesi e trattini seguiti da qualsiasi cosa (es. " - Remaster 2012")
+        clean_spotify_title = strip_title_suffixes
 
         clean_search_title = clean_spotify_title(title)
         if len(clean_search_title) < 2: return None
@@ -129,7 +129,7 @@ class SpotifyManager:
             for t in tracks:
                 found_clean = clean_spotify_title(t['name'])
                 # Ratio > 0.85 significa che i titoli devono essere quasi identici
-                if SequenceMatcher(None, clean_search_title, found_clean).ratio() > 0.85:
+                if fuzzy_match.ratio(clean_search_title, found_clean, score_cutoff=0.85) > 0.85:
                     valid_tracks.append(t)
             
             if not valid_tracks:
@@ -173,7 +173,7 @@ class SpotifyManager:
             # 3. Calcolo Somiglianza Titoli
             # Puliamo ANCHE il titolo trovato su Spotify prima del confronto
             best_match_clean_title = clean_spotify_title(best_match['name'])
-            ratio = SequenceMatcher(None, clean_search_title, best_match_clean_title).ratio()
+            ratio = fuzzy_match.ratio(clean_search_title, best_match_clean_title)
 
             # 4. Calcolo Differenza Popolarità
             pop_diff = best_popularity - current_popularity
@@ -202,13 +202,9 @@ class SpotifyManager:
         """
         if not self.sp: return None
         
-        import re
-        from difflib import SequenceMatcher
-
         # 1. Pulizia titolo cercato (quello che arriva da ACRCloud)
         # Rimuove parentesi e diciture comuni
-        clean_search = re.sub(r"[\(\[].*?[\)\]]", "", title)
-        clean_search = re.sub(r"(?i)\b(feat\.|ft\.|remix|edit|version|live)\b.*", "", clean_search).strip().lower()
+        clean_search = core_title(title)
         
         # Query: cerchiamo titolo e artista
         query = f"track:{clean_search} artist:{target_artist}"
@@ -224,14 +220,11 @@ class SpotifyManager:
                 # 2. Pulizia titolo TROVATO su Spotify
                 found_name = track['name']
                 
-                # Rimuove tutto ciò che è tra parentesi
-                found_clean = re.sub(r"[\(\[].*?[\)\]]", "", found_name)
-                # Rimuove trattini seguiti da 'Remaster', 'Live', '2009', ecc.
-                found_clean = re.sub(r"\s-\s.*", "", found_clean) 
-                found_clean = found_clean.strip().lower()
+                # Rimuove parentesi e trattini seguiti da 'Remaster', 'Live', '2009', ecc.
+                found_clean = strip_title_suffixes(found_name)
 
                 # 3. Confronto di Somiglianza
-                similarity = SequenceMatcher(None, clean_search, found_clean).ratio()
+                similarity = fuzzy_match.ratio(clean_search, found_clean)
                 
                 # Soglia: Se il titolo pulito è identico o molto simile (>0.85)
                 # Oppure se uno è contenuto interamente nell'altro
@@ -0,0 +1,157 @@
+from collections import defaultdict, deque
+
+
+# Identificativi forti di una traccia ACR (ISRC / acrid), se presenti
+def track_ids(track):
+    ids = []
+    isrc = track.get("isrc") or (track.get("external_ids") or {}).get("isrc")
+    if isrc: ids.append(f"isrc:{isrc.upper()}")
+    if track.get("acrid"): ids.append(f"acr:{track['acrid']}")
+    return ids
+
+
+# Raggruppa tracce equivalenti: chiave esatta prima, confronto fuzzy solo tra chiavi dello stesso bucket
+def group_tracks(tracks, key_fn, equivalent):
+    groups, by_key, buckets = [], {}, defaultdict(list)
+    for track in tracks:
+        key, bucket = key_fn(track)
+        group = by_key.get(key)
+        if group is None:
+            group = next((g for g in buckets[bucket] if equivalent(track, g[0])), None)
+        if group is None:
+            group = []
+            groups.append(group)
+            buckets[bucket].append(group)
+        by_key[key] = group
+        group.append(track)
+    return groups
+
+
+class StabilityTracker:
+    """
+    Conferma di stabilità dei brani rilevati, a voti decrescenti per chiave canonica.
+    La chiave (titolo|artista normalizzati, o l'alias registrato per ISRC/acrid) si calcola una volta per candidato;
+    ogni rilevazione aggiunge 1 voto, e i voti perdono un fattore 'decay' a ogni nuova rilevazione.
+    Un brano è stabile quando il suo punteggio raggiunge 'threshold' (con 0.93 e 1.5: due rilevazioni
+    entro le ultime 10, come il vecchio history_buffer). Il confronto fuzzy ('equivalent') si usa solo
+    se la chiave è nuova e nel suo bucket (prima parola del titolo) ci sono altre chiavi.
+    """
+    def __init__(self, normalize, equivalent, threshold=1.5, decay=0.93, max_keys=64, recent=4):
+        self.normalize = normalize
+        self.equivalent = equivalent
+        self.threshold = threshold
+        self.decay = decay
+        self.max_keys = max_keys
+        self._recent = deque(maxlen=recent)
+        self.reset()
+
+    def reset(self):
+        self._step = 0
+        self._votes = {}                    # chiave -> {"score", "step", "count", "track"}
+        self._aliases = {}                  # chiave grezza / id forte -> chiave canonica
+        self._buckets = defaultdict(set)    # prima parola del titolo -> chiavi canoniche
+        self._strong = defaultdict(set)     # chiave canonica -> id forti (isrc:/acr:) visti per quella chiave
+        self._recent.clear()
+        self.stats = {"lookups": 0, "exact": 0, "fuzzy_checks": 0, "fuzzy_merges": 0}
+
+    # (chiave, bucket) di una traccia: base per il voto e per il raggruppamento delle risposte ACR
+    def track_key(self, track):
+        title = self.normalize(track.get("title"))
+        artist = track.get("artist") or ((track.get("artists") or [{}])[0].get("name") or "")
+        artist = self.normalize(artist)
+        return f"{title}|{artist}", (title.split() or [""])[0]
+
+    # Id forti dello stesso tipo presenti da entrambe le parti e tutti diversi: brani distinti, niente fuzzy
+    def _ids_conflict(self, ids, canonical):
+        known = self._strong.get(canonical)
+        if not ids or not known: return False
+        for kind in ("isrc:", "acr:"):
+            mine = {i for i in ids if i.startswith(kind)}
+            theirs = {i for i in known if i.startswith(kind)}
+            if mine and theirs and not mine & theirs: return True
+        return False
+
+    # Chiave canonica: alias già noto (id forte o chiave grezza) oppure risoluzione nel bucket.
+    # Il confronto fuzzy è solo un ripiego: non unisce mai tracce con ISRC (o acrid) diversi
+    def canonical_key(self, track):
+        self.stats["lookups"] += 1
+        ids = track_ids(track)
+        key, bucket = self.track_key(track)
+        for alias in ids + [key]:
+            if alias in self._aliases:
+                self.stats["exact"] += 1
+                return self._aliases[alias]
+
+        canonical = key
+        for candidate in self._buckets.get(bucket, ()):
+            entry = self._votes.get(candidate)
+            if entry is None or self._ids_conflict(ids, candidate): continue
+            self.stats["fuzzy_checks"] += 1
+            if self.equivalent(track, entry["track"]):
+                self.stats["fuzzy_merges"] += 1
+                canonical = candidate
+                break
+
+        for alias in ids + [key]:
+            self._aliases[alias] = canonical
+        self._strong[canonical].update(ids)
+        self._buckets[bucket].add(canonical)
+        return canonical
+
+    def _effective(self, entry):
+        return entry["score"] * self.decay ** (self._step - entry["step"])
+
+    # Nuova rilevazione: restituisce (chiave, punteggio aggiornato)
+    def add(self, track):
+        self._step += 1
+        key = self.canonical_key(track)
+        entry = self._votes.get(key)
+        score = (self._effective(entry) if entry else 0.0) + 1.0
+        self._votes[key] = {"score": score, "step": self._step,
+                            "count": (entry["count"] if entry else 0) + 1, "track": track}
+        self._recent.append(key)
+        if len(self._votes) > self.max_keys: self._prune()
+        return key, score
+
+    # Correzione di una rilevazione già contata: il suo voto (residuo) passa dalla vecchia chiave alla nuova traccia.
+    # Nessun passo in più: la stessa finestra non vota due volte
+    def move_vote(self, old_key, step, track):
+        weight = self.decay ** max(0, self._step - step)
+        old = self._votes.get(old_key)
+        if old:
+            old["score"] = max(0.0, self._effective(old) - weight)
+            old["step"] = self._step
+        key = self.canonical_key(track)
+        entry = self._votes.get(key)
+        score = (self._effective(entry) if entry else 0.0) + weight
+        self._votes[key] = {"score": score, "step": self._step,
+                            "count": (entry["count"] if entry else 0) + 1, "track": track}
+        if len(self._votes) > self.max_keys: self._prune()
+        return key, score
+
+    @property
+    def step(self):
+        return self._step
+
+    def is_stable(self, score):
+        return score >= self.threshold
+
+    # Rilevazioni recenti in conflitto (brani diversi)
+    def has_conflict(self):
+        return len(set(self._recent)) > 1
+
+    # Rimozione delle chiavi con meno voti residui (solo oltre max_keys)
+    def _prune(self):
+        weakest = sorted(self._votes, key=lambda k: self._effective(self._votes[k]))[:len(self._votes) - self.max_keys]
+        for key in weakest:
+            del self._votes[key]
+        gone = set(weakest)
+        self._aliases = {a: k for a, k in self._aliases.items() if k not in gone}
+        for key in gone: self._strong.pop(key, None)
+        for bucket in self._buckets.values():
+            bucket.difference_update(gone)
+
+    # Stato leggibile dei voti (per debug e statistiche)
+    def explain(self, top=5):
+        ranking = sorted(self._votes.items(), key=lambda kv: self._effective(kv[1]), reverse=True)[:top]
+        return [{"key": k, "score": round(self._effective(v), 2), "detections": v["count"]} for k, v in ranking]
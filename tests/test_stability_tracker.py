@@ -0,0 +1,50 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fuzzy_match import ratio
+from stability_tracker import StabilityTracker
+from text_normalize import normalize_title
+
+
+# Equivalenza fuzzy sul titolo|artista normalizzato, come il confronto titoli di AudioManager
+def _equivalent(a, b):
+    key = lambda t: f"{normalize_title(t.get('title'))}|{normalize_title(t.get('artist'))}"
+    return ratio(key(a), key(b)) >= 0.9
+
+
+def _tracker():
+    return StabilityTracker(normalize_title, _equivalent)
+
+
+def test_different_isrc_near_identical_titles_stay_separate():
+    tracker = _tracker()
+    first = {"title": "Synthetic Song 1", "artist": "Bench Band", "isrc": "ITAAA2400001"}
+    second = {"title": "Synthetic Song 2", "artist": "Bench Band", "isrc": "ITAAA2400002"}
+    assert _equivalent(first, second)
+
+    key_a, score_a = tracker.add(first)
+    key_b, score_b = tracker.add(second)
+
+    assert key_a != key_b
+    assert score_a == score_b == 1.0
+    assert tracker.stats["fuzzy_merges"] == 0
+    assert tracker.canonical_key(dict(second)) == key_b
+    assert {e["key"]: e["detections"] for e in tracker.explain()} == {key_a: 1, key_b: 1}
+
+
+def test_different_acrid_near_identical_titles_stay_separate():
+    tracker = _tracker()
+    key_a, _ = tracker.add({"title": "Synthetic Song 1", "artist": "Bench Band", "acrid": "a1"})
+    key_b, _ = tracker.add({"title": "Synthetic Song 2", "artist": "Bench Band", "acrid": "b2"})
+    assert key_a != key_b
+
+
+def test_same_isrc_or_missing_ids_still_merge():
+    tracker = _tracker()
+    key, _ = tracker.add({"title": "Canzone d'amore", "artist": "Bench Band", "isrc": "ITAAA2400001"})
+    same_id, score = tracker.add({"title": "Canzone d'amore (Live)", "artist": "Bench Band", "isrc": "itaaa2400001"})
+    no_id, score = tracker.add({"title": "Canzone d'amore!", "artist": "Bench Band"})
+    assert same_id == no_id == key
+    assert tracker.is_stable(score)
@@ -0,0 +1,203 @@
+import re
+import unicodedata
+from functools import lru_cache
+
+# Dimensione delle cache LRU (titoli e artisti distinti visti in una sessione)
+CACHE_SIZE = 8192
+
+# --- PATTERN PRECOMPILATI ---
+_BRACKETS = re.compile(r"[\(\[].*?[\)\]]")
+_BRACKETS_CURLY = re.compile(r"[\(\[\{].*?[\)\]\}]")
+_BRACKETS_SPACED = re.compile(r"\s*[\(\[](.*?)[\)\]]")
+_NON_ALNUM = re.compile(r"[^a-zA-Z0-9\s]")
+_SPACES = re.compile(r"\s+")
+_DASH_SUFFIX = re.compile(r"\s-\s.*")
+_DASH_LIVE = re.compile(r"(?i)\s-\s.*live.*")
+_LIVE_AT = re.compile(r"(?i)\b(live\s+(at|in|from|on))\b.*")
+_PLATFORMS = re.compile(r"(?i)\b(amazon\s+music|apple\s+music|spotify|deezer|youtube|vevo)\b.*")
+
+
+# Taglia tutto da una delle parole indicate in poi (es. "Titolo feat. X" -> "Titolo ")
+def _suffix_pattern(*words):
+    return re.compile(r"(?i)\b(" + "|".join(words) + r")\b.*")
+
+
+_VERSION_MATCH = _suffix_pattern(r"feat\.", r"ft\.", "remix", "edit", "version", "karaoke", "live", "mixed", "spanish", "italian")
+_VERSION_KEY = _suffix_pattern(r"feat\.", r"ft\.", "remix", "edit", "version", "karaoke", "performed by", "originally by")
+_VERSION_SEARCH = _suffix_pattern(r"feat\.", r"ft\.", "remix", "edit", "version", "live", "remastered", "remaster")
+_VERSION_CORE = _suffix_pattern(r"feat\.", r"ft\.", "remix", "edit", "version", "live")
+_VERSION_BASE = _suffix_pattern(r"feat\.", r"ft\.", "remix", "edit", "version")
+_REMASTER_LIVE = _suffix_pattern("remaster", "remastered", "live at", "live in")
+_VERSION_ID = _suffix_pattern(r"feat\.", r"ft\.", "remix", "edit", "version", "live", "mixed", "vip")
+_NON_ALNUM_STRICT = re.compile(r"[^a-zA-Z0-9]")
+_PLACEHOLDER = re.compile(r"^(id|track)\d*$")
+
+# Parole che cambiano solo la versione del brano (un'unica regex al posto di un passaggio per parola)
+NOISE_WORDS = (
+    "live", "remaster", "remastered", "mix", "version",
+    "edit", "feat", "ft", "studio", "session", "acoustic",
+    "demo", "official", "video", "lyrics",
+)
+_NOISE = re.compile(r"\b(?:" + "|".join(map(re.escape, NOISE_WORDS)) + r")\b")
+
+# Parole chiave di rumore per la pulizia "leggibile" (cercate come sottostringa, in minuscolo)
+DISPLAY_JUNK = (
+    "live", "remix", "edit", "club", "mix", "extended", "version",
+    "remaster", "re-master", "feat", "ft.", "karaoke", "instrumental",
+    "acoustic", "demo", "session", "registrazione", "mono", "stereo",
+    "amazon music", "amazon original", "apple music", "spotify singles",
+    "spotify", "deezer", "youtube", "vevo", "presents", "exclusive",
+)
+SEARCH_JUNK = ("live", "remix", "edit", "version", "remaster", "feat", "ft.", "karaoke", "official")
+_DISPLAY_JUNK = re.compile("|".join(map(re.escape, DISPLAY_JUNK)))
+_SEARCH_JUNK = re.compile("|".join(map(re.escape, SEARCH_JUNK)))
+
+
+class _FoldTable(dict):
+    """Tabella per str.translate: ogni carattere non ASCII viene decomposto (NFD) una sola volta e memorizzato."""
+    def __missing__(self, codepoint):
+        folded = unicodedata.normalize("NFD", chr(codepoint)).encode("ascii", "ignore").decode("ascii")
+        self[codepoint] = folded
+        return folded
+
+
+_FOLD_TABLE = _FoldTable()
+
+
+# Rimozione di accenti e caratteri non ASCII (equivalente a NFD + encode ascii/ignore)
+def ascii_fold(text):
+    return text if text.isascii() else text.translate(_FOLD_TABLE)
+
+
+def _alnum(text):
+    return _NON_ALNUM.sub("", ascii_fold(text)).strip().lower()
+
+
+# Rimuove parentesi (tonde o quadre) e il loro contenuto
+@lru_cache(maxsize=CACHE_SIZE)
+def strip_brackets(text):
+    if not text: return ""
+    return _BRACKETS.sub("", text)
+
+
+# Solo caratteri alfanumerici, minuscolo (nessuna rimozione di accenti)
+@lru_cache(maxsize=CACHE_SIZE)
+def alnum_lower(text):
+    if not text: return ""
+    return _NON_ALNUM.sub("", text).lower().strip()
+
+
+# Normalizzazione per il confronto tra titoli riconosciuti (piattaforme, parentesi, versioni, accenti)
+@lru_cache(maxsize=CACHE_SIZE)
+def normalize_title(text):
+    if not text: return ""
+    text = _PLATFORMS.sub("", text)
+    text = _BRACKETS.sub("", text)
+    text = _VERSION_MATCH.sub("", text)
+    return _alnum(text)
+
+
+# Versione più leggera, per confronto parziale (solo accenti e punteggiatura)
+@lru_cache(maxsize=CACHE_SIZE)
+def normalize_for_match(text):
+    if not text: return ""
+    return _alnum(text)
+
+
+# Chiave dei testi: parentesi, accenti e punteggiatura
+@lru_cache(maxsize=CACHE_SIZE)
+def normalize_basic(text):
+    if not text: return ""
+    return _alnum(_BRACKETS.sub("", text))
+
+
+# Chiave di sessione/archivio (anche parentesi graffe, "live at", crediti di interpretazione)
+@lru_cache(maxsize=CACHE_SIZE)
+def normalize_key(text):
+    if not text: return ""
+    text = _PLATFORMS.sub("", text)
+    text = _BRACKETS_CURLY.sub("", text)
+    text = _LIVE_AT.sub("", text)
+    text = _DASH_LIVE.sub("", text)
+    text = _VERSION_KEY.sub("", text)
+    return _alnum(text)
+
+
+# Rimozione delle parole di rumore da un testo già pulito (minuscolo, senza punteggiatura)
+@lru_cache(maxsize=CACHE_SIZE)
+def strip_noise_words(text):
+    if not text: return ""
+    return _SPACES.sub(" ", _NOISE.sub("", text)).strip()
+
+
+# Pulizia per display: rimuove solo parentesi e suffissi " - ..." che contengono parole di rumore
+@lru_cache(maxsize=CACHE_SIZE)
+def clean_for_display(text):
+    if not text: return ""
+    text = _BRACKETS_SPACED.sub(lambda m: "" if _DISPLAY_JUNK.search(m.group(1).lower()) else m.group(0), text)
+    parts = text.split(" - ")
+    if len(parts) > 1 and _DISPLAY_JUNK.search(parts[-1].lower()):
+        text = " - ".join(parts[:-1])
+    return text.strip()
+
+
+# Pulizia per ricerca nei cataloghi: rimuove solo le versioni tecniche (parentesi con parole di rumore, remaster, live at)
+@lru_cache(maxsize=CACHE_SIZE)
+def clean_for_search(text):
+    if not text: return ""
+    text = _BRACKETS_SPACED.sub(lambda m: "" if _SEARCH_JUNK.search(m.group(1).lower()) else m.group(0), text)
+    return _REMASTER_LIVE.sub("", text).strip()
+
+
+# Titolo per query di ricerca: senza parentesi, versioni e suffissi " - ..." (mantiene maiuscole e accenti)
+@lru_cache(maxsize=CACHE_SIZE)
+def search_title(text):
+    if not text: return ""
+    text = _VERSION_SEARCH.sub("", _BRACKETS.sub("", text))
+    return _DASH_SUFFIX.sub("", text).strip()
+
+
+# Titolo di base di una sessione: senza parentesi, "live at", featuring e versioni
+@lru_cache(maxsize=CACHE_SIZE)
+def base_title(text):
+    if not text: return ""
+    text = _BRACKETS.sub("", text).strip()
+    text = _LIVE_AT.sub("", text)
+    text = _DASH_LIVE.sub("", text)
+    return _VERSION_BASE.sub("", text).strip()
+
+
+# Titolo essenziale in minuscolo: senza parentesi e featuring/versioni
+@lru_cache(maxsize=CACHE_SIZE)
+def core_title(text):
+    if not text: return ""
+    return _VERSION_CORE.sub("", _BRACKETS.sub("", text)).strip().lower()
+
+
+# Titolo senza parentesi né suffissi " - ..." (es. " - Remaster 2012"), in minuscolo
+@lru_cache(maxsize=CACHE_SIZE)
+def strip_title_suffixes(text):
+    if not text: return ""
+    return _DASH_SUFFIX.sub("", _BRACKETS.sub("", text)).strip().lower()
+
+
+# Titoli segnaposto ("ID", "Track 3", "ID (Remix)"): usati per penalizzare i falsi positivi
+@lru_cache(maxsize=CACHE_SIZE)
+def is_placeholder_title(text):
+    if not text: return False
+    text = _VERSION_ID.sub("", _BRACKETS.sub("", text))
+    return bool(_PLACEHOLDER.match(_NON_ALNUM_STRICT.sub("", text).lower().strip()))
+
+
+_CACHED = (strip_brackets, alnum_lower, normalize_title, normalize_for_match, normalize_basic, normalize_key,
+           strip_noise_words, clean_for_display, clean_for_search, search_title, base_title, core_title,
+           strip_title_suffixes, is_placeholder_title)
+
+
+# Statistiche delle cache (hit/miss per funzione)
+def cache_stats():
+    stats = {}
+    for fn in _CACHED:
+        info = fn.cache_info()
+        stats[fn.__name__] = {"hits": info.hits, "misses": info.misses, "size": info.currsize}
+    return stats
@@ -0,0 +1,103 @@
+import struct
+import uuid
+from functools import lru_cache
+
+import numpy as np
+
+
+# Header WAV PCM 16 bit (44 byte), in cache: la finestra ha sempre la stessa durata per una data frequenza
+@lru_cache(maxsize=16)
+def wav_header(sample_rate, channels, num_frames):
+    data_size = num_frames * channels * 2
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + data_size, b"WAVE",
+        b"fmt ", 16, 1, channels, sample_rate, sample_rate * channels * 2, channels * 2, 16,
+        b"data", data_size,
+    )
+
+
+class WavPayload:
+    """
+    Finestra audio pronta per l'upload, immutabile e condivisa tra ACRCloud e Scribe.
+    Header precalcolato + campioni int16 esposti come memoryview: nessuna copia del ~1 MB di audio.
+    Ogni uploader apre il proprio stream (posizione di lettura indipendente) sugli stessi byte.
+    """
+    def __init__(self, samples, sample_rate):
+        samples = np.ascontiguousarray(samples, dtype="<i2")
+        samples.flags.writeable = False
+        channels = samples.shape[1] if samples.ndim > 1 else 1
+
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.samples = samples
+        self.header = wav_header(sample_rate, channels, len(samples))
+        self.data = memoryview(samples).cast("B")
+
+    def __len__(self):
+        return len(self.header) + len(self.data)
+
+    @property
+    def duration_s(self):
+        return len(self.samples) / self.sample_rate
+
+    # Copia completa in bytes (solo per usi diagnostici, es. benchmark)
+    def tobytes(self):
+        return self.header + self.data.tobytes()
+
+    # Stream del solo file WAV
+    def open(self):
+        return ChunkStream([self.header, self.data])
+
+    # Corpo multipart/form-data in streaming: (stream, content_type)
+    def multipart(self, file_field, filename, fields=None):
+        boundary = uuid.uuid4().hex
+        preamble = "".join(
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"{name}\"\r\n\r\n{value}\r\n"
+            for name, value in (fields or {}).items()
+        )
+        preamble += (
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"{file_field}\"; filename=\"{filename}\"\r\n"
+            f"Content-Type: audio/wav\r\n\r\n"
+        )
+        epilogue = f"\r\n--{boundary}--\r\n"
+        stream = ChunkStream([preamble.encode("utf-8"), self.header, self.data, epilogue.encode("utf-8")])
+        return stream, f"multipart/form-data; boundary={boundary}"
+
+
+class ChunkStream:
+    """
+    File-like in sola lettura su una sequenza di buffer (bytes/memoryview), senza concatenarli.
+    Espone len/tell/seek: requests imposta il Content-Length e urllib3 può riavvolgere per i retry.
+    """
+    def __init__(self, chunks):
+        self._chunks = [memoryview(c) for c in chunks]
+        self._length = sum(len(c) for c in self._chunks)
+        self._pos = 0
+
+    def __len__(self):
+        return self._length
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=0):
+        if whence == 1: offset += self._pos
+        elif whence == 2: offset += self._length
+        self._pos = min(max(0, offset), self._length)
+        return self._pos
+
+    def read(self, size=-1):
+        if size is None or size < 0: size = self._length - self._pos
+        out = []
+        start = 0
+        for chunk in self._chunks:
+            end = start + len(chunk)
+            if self._pos < end and size > 0:
+                offset = self._pos - start
+                piece = chunk[offset:offset + size]
+                out.append(piece)
+                self._pos += len(piece)
+                size -= len(piece)
+            start = end
+        return b"".join(out)
@@ -0,0 +1,94 @@
+import threading
+import time
+from collections import deque
+
+
+class WindowScheduler:
+    """
+    Dispatcher unico per l'analisi delle finestre audio.
+    Un solo thread di lunga durata consuma una coda limitata di richieste:
+    - coda piena -> si scarta la richiesta più vecchia (drop-oldest)
+    - più richieste in attesa -> vengono fuse in una sola (la finestra letta è comunque la più recente)
+    - richiesta non partita entro la sua scadenza -> annullata perché ormai superata
+    Ogni start() apre una nuova generazione: un thread di una generazione precedente (ancora dentro
+    process_fn dopo uno stop) termina senza prendere altre richieste dalla coda, e il nuovo thread
+    ne attende la fine prima di analizzare: mai due finestre in elaborazione insieme.
+    """
+    def __init__(self, process_fn, max_pending=2, name="window-dispatcher"):
+        self.process_fn = process_fn
+        self.max_pending = max_pending
+        self.name = name
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+        self._generation = 0
+        self.stats = {
+            "submitted": 0, "processed": 0, "coalesced": 0,
+            "dropped": 0, "expired": 0, "errors": 0,
+            "last_queue_delay_ms": 0, "last_processing_ms": 0,
+        }
+
+    # Avvio del thread dispatcher
+    def start(self):
+        with self._cond:
+            if self._running: return
+            self._running = True
+            self._generation += 1
+            generation = self._generation
+            self._pending.clear()
+        previous = self._thread
+        self._thread = threading.Thread(target=self._dispatch_loop, args=(generation, previous), name=self.name, daemon=True)
+        self._thread.start()
+
+    # Stop: le richieste in coda vengono abbandonate, quella in corso termina normalmente
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._pending.clear()
+            self._cond.notify_all()
+
+    @property
+    def is_running(self):
+        return self._running
+
+    # Accoda una nuova finestra da analizzare, con scadenza relativa in secondi
+    def submit(self, deadline_s):
+        now = time.monotonic()
+        with self._cond:
+            if not self._running: return False
+            if len(self._pending) >= self.max_pending:
+                self._pending.popleft()
+                self.stats["dropped"] += 1
+            self._pending.append((now, now + deadline_s))
+            self.stats["submitted"] += 1
+            self._cond.notify()
+        return True
+
+    def _dispatch_loop(self, generation, previous=None):
+        # Il thread della generazione precedente può essere ancora dentro process_fn: si attende che esca
+        if previous is not None and previous is not threading.current_thread(): previous.join()
+        while True:
+            with self._cond:
+                while self._running and self._generation == generation and not self._pending:
+                    self._cond.wait()
+                if not self._running or self._generation != generation: return
+
+                # Coalescenza: teniamo solo la richiesta più recente
+                created_at, deadline = self._pending.pop()
+                self.stats["coalesced"] += len(self._pending)
+                self._pending.clear()
+
+            started_at = time.monotonic()
+            if started_at > deadline:
+                self.stats["expired"] += 1
+                continue
+
+            self.stats["last_queue_delay_ms"] = int((started_at - created_at) * 1000)
+            try:
+                self.process_fn()
+                self.stats["processed"] += 1
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"❌ [Scheduler] Errore elaborazione finestra: {e}")
+            self.stats["last_processing_ms"] = int((time.monotonic() - started_at) * 1000)